@@ -0,0 +1,99 @@
+import asyncio
+import itertools
+import json
+import socket
+import time
+from threading import Lock, Thread
+from typing import Any
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+class mock_llm_server:
+    """A local OpenAI compatible chat completions server for benchmarking.
+    Streams scripted replies word by word with a configurable time to first token and tokens per second,
+    so the latency of Mantella itself can be measured without depending on a real LLM service
+    """
+    def __init__(self, replies: list[str], summary: str, time_to_first_token: float = 0.3, tokens_per_second: float = 40.0, port: int | None = None) -> None:
+        self.__replies = itertools.cycle(replies)
+        self.__summary: str = summary
+        self.__time_to_first_token: float = time_to_first_token
+        self.__tokens_per_second: float = tokens_per_second
+        self.__port: int = port if port else self.__get_free_port()
+        self.__lock: Lock = Lock()
+        self.__request_count: int = 0
+        self.__streamed_request_count: int = 0
+        self.__server: uvicorn.Server | None = None
+        self.__thread: Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.__port}/v1"
+
+    @property
+    def request_count(self) -> int:
+        return self.__request_count
+
+    @property
+    def streamed_request_count(self) -> int:
+        return self.__streamed_request_count
+
+    def start(self):
+        """Starts the server on a background thread and waits until it accepts connections
+        """
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body: dict[str, Any] = await request.json()
+            with self.__lock:
+                self.__request_count += 1
+                if body.get("stream"):
+                    self.__streamed_request_count += 1
+            if body.get("stream"):
+                with self.__lock:
+                    reply = next(self.__replies)
+                return StreamingResponse(self.__stream_reply(reply, body.get("model", "")), media_type="text/event-stream")
+            # requests that are not streamed are summaries
+            await asyncio.sleep(self.__time_to_first_token)
+            return JSONResponse(self.__get_completion(self.__summary, body.get("model", "")))
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.__port, log_level="error")
+        self.__server = uvicorn.Server(config)
+        self.__thread = Thread(target=self.__server.run, name="mock_llm_server", daemon=True)
+        self.__thread.start()
+        while not self.__server.started:
+            time.sleep(0.01)
+
+    def stop(self):
+        if self.__server:
+            self.__server.should_exit = True
+        if self.__thread:
+            self.__thread.join(timeout=5)
+
+    async def __stream_reply(self, reply: str, model: str):
+        await asyncio.sleep(self.__time_to_first_token)
+        created = int(time.time())
+        # every word (with its leading space) counts as one token
+        tokens = [word if i == 0 else " " + word for i, word in enumerate(reply.split(" "))]
+        for token in tokens:
+            chunk = {"id": "chatcmpl-benchmark", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(1 / self.__tokens_per_second)
+        chunk = {"id": "chatcmpl-benchmark", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @staticmethod
+    def __get_completion(text: str, model: str) -> dict[str, Any]:
+        return {"id": "chatcmpl-benchmark", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+
+    @staticmethod
+    def __get_free_port() -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
@@ -0,0 +1,35 @@
+import time
+import wave
+from src.config.config_loader import ConfigLoader
+from src.games.gameable import gameable
+from src.tts.ttsable import ttsable
+from src.tts.synthesization_options import SynthesizationOptions
+
+class mock_tts(ttsable):
+    """A TTS service for benchmarking. Writes silent voicelines whose length depends on the length of the text,
+    after waiting a fixed time per voiceline to stand in for the synthesis
+    """
+    SYNTHESIS_DELAY: float = 0.05 # seconds per voiceline
+    SECONDS_PER_CHARACTER: float = 0.01 # length of the written voiceline per character of text
+    SAMPLE_RATE: int = 22050
+
+    def __init__(self, config: ConfigLoader, game: gameable) -> None:
+        super().__init__(config)
+        self.__synthesized_count: int = 0
+
+    @property
+    def synthesized_count(self) -> int:
+        return self.__synthesized_count
+
+    def change_voice(self, voice: str, in_game_voice: str | None = None, csv_in_game_voice: str | None = None, advanced_voice_model: str | None = None, voice_accent: str | None = None, voice_gender: int | None = None, voice_race: str | None = None):
+        self._last_voice = voice
+
+    def tts_synthesize(self, voiceline: str, final_voiceline_file: str, synth_options: SynthesizationOptions):
+        time.sleep(self.SYNTHESIS_DELAY)
+        frame_count = int(len(voiceline) * self.SECONDS_PER_CHARACTER * self.SAMPLE_RATE)
+        with wave.open(final_voiceline_file, 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.SAMPLE_RATE)
+            wf.writeframes(b'\x00\x00' * frame_count)
+        self.__synthesized_count += 1
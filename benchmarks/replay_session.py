@@ -0,0 +1,157 @@
+"""Replays a session that was recorded with the 'record_sessions' setting.
+
+Sends the recorded requests of the game to a fresh `/mantella` route, in the same order and optionally with the same timing,
+against a local mock LLM server and mock TTS. The mock LLM answers with the lines the NPCs spoke in the recording.
+Writes a JSON report that compares the time Mantella took to reply to each request in the recording and in the replay,
+and whether the replay sent the same prompts to the LLM and the same voicelines to the TTS as the recording.
+
+Run from the root of the repository:
+    python -m benchmarks.replay_session path/to/session_20240101_120000.jsonl --speed 1.0 --output replay_report.json
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any
+from fastapi.testclient import TestClient
+from src.http.communication_constants import communication_constants as comm_consts
+import src.http.routes.mantella_route as mantella_route_module
+from src.http.session_recorder import session_recorder
+from benchmarks.mock_llm_server import mock_llm_server
+from benchmarks.mock_tts import mock_tts
+from benchmarks.run_benchmark import create_config, create_server, summarize
+
+REPLAY_SUMMARY = "The player and the NPCs had a conversation."
+
+def load_session(session_file: str) -> list[dict[str, Any]]:
+    records: list[dict[str, Any]] = []
+    with open(session_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    if len(records) == 0 or records[0].get("type") != "session":
+        raise ValueError(f"{session_file} is not a Mantella session file")
+    if records[0].get("version") != session_recorder.SESSION_FILE_VERSION:
+        raise ValueError(f"{session_file} was recorded with session file version {records[0].get('version')}, expected {session_recorder.SESSION_FILE_VERSION}")
+    return records
+
+def get_llm_replies(exchanges: list[dict[str, Any]]) -> list[str]:
+    """Rebuilds the replies of the LLM from the lines the NPCs spoke in the recording, so the replay voices the same lines.
+    A new reply starts with every request that makes the LLM respond. Speakers are named if more than one NPC spoke in a reply
+    """
+    replies: list[list[tuple[str, str]]] = []
+    for exchange in exchanges:
+        request_type = (exchange["request"] or {}).get(comm_consts.KEY_REQUESTTYPE)
+        if request_type in (comm_consts.KEY_REQUESTTYPE_STARTCONVERSATION, comm_consts.KEY_REQUESTTYPE_PLAYERINPUT) or len(replies) == 0:
+            replies.append([])
+        npc_talk: dict[str, Any] | None = exchange["reply"].get(comm_consts.KEY_REPLYTYPE_NPCTALK)
+        if npc_talk and npc_talk.get(comm_consts.KEY_ACTOR_LINETOSPEAK):
+            replies[-1].append((npc_talk.get(comm_consts.KEY_ACTOR_SPEAKER, ""), npc_talk[comm_consts.KEY_ACTOR_LINETOSPEAK]))
+
+    reply_texts: list[str] = []
+    for lines in replies:
+        if len(lines) == 0:
+            continue
+        name_speakers = len({speaker for speaker, _ in lines}) > 1
+        text = ""
+        previous_speaker = None
+        for speaker, line in lines:
+            if name_speakers and speaker != previous_speaker:
+                text += f" {speaker}: "
+            text += f" {line}"
+            previous_speaker = speaker
+        reply_texts.append(" ".join(text.split()))
+    return reply_texts if len(reply_texts) > 0 else [""]
+
+def compare_interactions(kind: str, recorded: list[dict[str, Any]], replayed: list[dict[str, Any]]) -> dict[str, Any]:
+    """Compares the hashes of the LLM or TTS calls of the recording and the replay, in order
+    """
+    recorded_hashes = [r["input_hash"] for r in recorded if r["type"] == kind]
+    replayed_hashes = [r["input_hash"] for r in replayed if r["type"] == kind]
+    matching = sum(1 for a, b in zip(recorded_hashes, replayed_hashes) if a == b)
+    first_mismatch = next((i for i, (a, b) in enumerate(zip(recorded_hashes, replayed_hashes)) if a != b), None)
+    if first_mismatch is None and len(recorded_hashes) != len(replayed_hashes):
+        first_mismatch = min(len(recorded_hashes), len(replayed_hashes))
+    return {
+        "recorded": len(recorded_hashes),
+        "replayed": len(replayed_hashes),
+        "matching": matching,
+        "first_mismatch": first_mismatch
+    }
+
+def replay_session(session_file: str, speed: float, time_to_first_token: float, tokens_per_second: float) -> dict[str, Any]:
+    records = load_session(session_file)
+    exchanges = [r for r in records if r["type"] == "exchange"]
+    llm_server = mock_llm_server(get_llm_replies(exchanges), REPLAY_SUMMARY, time_to_first_token, tokens_per_second)
+    llm_server.start()
+    mantella_route_module.piper = mock_tts # the route creates the TTS it is configured with, so the configured one is swapped for the mock
+
+    replayed_exchanges: list[dict[str, Any]] = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="mantella_replay_") as save_folder:
+            config = create_config(save_folder + os.sep, llm_server.url, {"record_sessions": "True"})
+            server = create_server(config, save_folder)
+            with TestClient(server.app) as client:
+                replay_start = time.perf_counter()
+                for exchange in exchanges:
+                    if speed > 0:
+                        wait = exchange["time"] / speed - (time.perf_counter() - replay_start)
+                        if wait > 0:
+                            time.sleep(wait)
+                    sent_at = time.perf_counter()
+                    reply: dict[str, Any] = client.post("/mantella", json=exchange["request"]).json()
+                    replayed_exchanges.append({
+                        "request_type": (exchange["request"] or {}).get(comm_consts.KEY_REQUESTTYPE),
+                        "recorded_duration": exchange["duration"],
+                        "replayed_duration": time.perf_counter() - sent_at,
+                        "recorded_reply_type": exchange["reply"].get(comm_consts.KEY_REPLYTYPE),
+                        "replayed_reply_type": reply.get(comm_consts.KEY_REPLYTYPE)
+                    })
+            session_recorder.stop()
+            replay_files = glob.glob(os.path.join(save_folder, "data", session_recorder.SESSION_FOLDER_NAME, "*.jsonl"))
+            replayed_records = load_session(replay_files[0]) if len(replay_files) > 0 else []
+    finally:
+        llm_server.stop()
+
+    request_types = sorted({e["request_type"] for e in replayed_exchanges if e["request_type"]})
+    return {
+        "session_file": session_file,
+        "speed": speed,
+        "summary": {
+            "requests": len(replayed_exchanges),
+            "reply_type_mismatches": sum(1 for e in replayed_exchanges if e["recorded_reply_type"] != e["replayed_reply_type"]),
+            "durations": {request_type: {
+                "recorded": summarize([e["recorded_duration"] for e in replayed_exchanges if e["request_type"] == request_type]),
+                "replayed": summarize([e["replayed_duration"] for e in replayed_exchanges if e["request_type"] == request_type])
+            } for request_type in request_types},
+            "llm": compare_interactions("llm", records, replayed_records),
+            "tts": compare_interactions("tts", records, replayed_records),
+            "llm_requests": llm_server.request_count
+        },
+        "exchanges": replayed_exchanges
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a recorded Mantella session against a mock LLM and TTS")
+    parser.add_argument("session_file", help="the session file to replay, from the data/sessions folder of Mantella's save folder")
+    parser.add_argument("--speed", type=float, default=0.0, help="1.0 sends the requests with the recorded timing, 2.0 twice as fast. 0 does not wait between requests")
+    parser.add_argument("--time-to-first-token", type=float, default=0.3, help="seconds until the mock LLM sends the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="speed of the mock LLM")
+    parser.add_argument("--output", help="file to write the JSON report to. Printed if not set")
+    parser.add_argument("--verbose", action="store_true", help="show the log of Mantella")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s: %(message)s')
+    report = replay_session(args.session_file, args.speed, args.time_to_first_token, args.tokens_per_second)
+    report_text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report_text)
+    else:
+        print(report_text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""End-to-end latency benchmark for Mantella conversations.
+
+Starts a local mock LLM server and replaces the TTS with a mock, then plays conversations through the real `/mantella` route
+(start, continue, player_input and end requests) and writes a JSON report with the time to the first voiceline,
+the gaps between voicelines, CPU time and memory allocations.
+
+Run from the root of the repository:
+    python -m benchmarks.run_benchmark --output benchmark_report.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+from fastapi.testclient import TestClient
+import pandas as pd
+from src.config.config_loader import ConfigLoader
+from src.http.http_server import http_server
+from src.http.communication_constants import communication_constants as comm_consts
+import src.http.routes.mantella_route as mantella_route_module
+from src.http.routes.mantella_route import mantella_route
+from benchmarks.mock_llm_server import mock_llm_server
+from benchmarks.mock_tts import mock_tts
+
+DEFAULT_SCENARIO: dict[str, Any] = {
+    "repeats": 3, # conversations that are measured
+    "warmup": 1, # conversations that are played before measuring, eg to load the character database
+    "playback_speed": 0.0, # wait for voicelines to "play" before asking for the next one. 1.0 is real time, 0 does not wait
+    "llm": {
+        "time_to_first_token": 0.3,
+        "tokens_per_second": 40.0,
+        "replies": [
+            "Greetings, my Thane. It is good to see you again. What brings you to Whiterun today?",
+            "I have heard rumours of a dragon near the western watchtower. The guards are nervous, and the Jarl has doubled the patrols. We should be careful on the road.",
+            "As you wish. I am sworn to carry your burdens, and I will follow you wherever you go.",
+            "Of course. Lead the way, my Thane."
+        ],
+        "summary": "Lydia and the player talked about the dragon near the western watchtower. Lydia promised to follow the player."
+    },
+    "tts": {
+        "synthesis_delay": 0.05,
+        "seconds_per_character": 0.01
+    },
+    "location": "Whiterun",
+    "player_inputs": [
+        "Hello Lydia, any news from the city?",
+        "Then we should go and take a look. Follow me."
+    ],
+    "actors": [
+        {
+            comm_consts.KEY_ACTOR_BASEID: 7,
+            comm_consts.KEY_ACTOR_REFID: 20,
+            comm_consts.KEY_ACTOR_NAME: "Prisoner",
+            comm_consts.KEY_ACTOR_GENDER: 0,
+            comm_consts.KEY_ACTOR_RACE: "<NordRace (00013746)>",
+            comm_consts.KEY_ACTOR_ISPLAYER: True,
+            comm_consts.KEY_ACTOR_RELATIONSHIPRANK: 0,
+            comm_consts.KEY_ACTOR_VOICETYPE: "<MaleEvenToned (00013AD2)>",
+            comm_consts.KEY_ACTOR_ISINCOMBAT: False,
+            comm_consts.KEY_ACTOR_ISENEMY: False
+        },
+        {
+            comm_consts.KEY_ACTOR_BASEID: 0x0A2C8E,
+            comm_consts.KEY_ACTOR_REFID: 0x0A2C94,
+            comm_consts.KEY_ACTOR_NAME: "Lydia",
+            comm_consts.KEY_ACTOR_GENDER: 1,
+            comm_consts.KEY_ACTOR_RACE: "<NordRace (00013746)>",
+            comm_consts.KEY_ACTOR_ISPLAYER: False,
+            comm_consts.KEY_ACTOR_RELATIONSHIPRANK: 0,
+            comm_consts.KEY_ACTOR_VOICETYPE: "<FemaleEvenToned (00013ADD)>",
+            comm_consts.KEY_ACTOR_ISINCOMBAT: False,
+            comm_consts.KEY_ACTOR_ISENEMY: False
+        }
+    ]
+}
+
+def load_scenario(scenario_file: str | None) -> dict[str, Any]:
+    """Returns the default scenario, with the values of the scenario file replacing the default ones
+    """
+    scenario = json.loads(json.dumps(DEFAULT_SCENARIO))
+    if scenario_file:
+        with open(scenario_file, 'r', encoding='utf-8') as f:
+            custom_scenario: dict[str, Any] = json.load(f)
+        for key, value in custom_scenario.items():
+            if isinstance(value, dict) and isinstance(scenario.get(key), dict):
+                scenario[key].update(value)
+            else:
+                scenario[key] = value
+    return scenario
+
+def create_config(save_folder: str, llm_url: str, extra_values: dict[str, str] | None = None) -> ConfigLoader:
+    """Creates a config.ini in the save folder that points Mantella to the mock LLM server and a mock mod folder
+    """
+    mod_folder = os.path.join(save_folder, "mod")
+    os.makedirs(os.path.join(mod_folder, "Sound", "Voice", "Mantella.esp"), exist_ok=True)
+    # every section of config.ini is read the same way, so the values can be put into a single one
+    config_values = {
+        "game": "Skyrim",
+        "skyrim_mod_folder": mod_folder,
+        "tts_service": "Piper",
+        "lip_generation": "Disabled",
+        "llm_api": llm_url,
+        "model": "benchmark",
+        "custom_token_count": "8192",
+        "automatic_greeting": "True",
+        "auto_launch_ui": "False",
+    }
+    if extra_values:
+        config_values.update(extra_values)
+    with open(os.path.join(save_folder, "config.ini"), 'w', encoding='utf-8') as f:
+        f.write("[Benchmark]\n")
+        for key, value in config_values.items():
+            f.write(f"{key} = {value}\n")
+    config = ConfigLoader(save_folder, "config.ini")
+    if not config.have_all_config_values_loaded_correctly:
+        raise RuntimeError(f"Benchmark config is invalid: {config.definitions.constraint_violations}")
+    return config
+
+def create_server(config: ConfigLoader, save_folder: str) -> http_server:
+    """Creates an HTTP server with a fresh `/mantella` route, the same way main.py does
+    """
+    language_df = pd.read_csv(os.path.join("data", "language_support.csv"))
+    language_info = language_df.loc[language_df['alpha2'] == config.language].to_dict('records')[0]
+    secret_key_file = os.path.join(save_folder, "GPT_SECRET_KEY.txt")
+    route = mantella_route(config, secret_key_file, secret_key_file, secret_key_file, language_info)
+    server = http_server()
+    route.add_route_to_server(server.app)
+    return server
+
+def post(client: TestClient, request_json: dict[str, Any]) -> dict[str, Any]:
+    reply: dict[str, Any] = client.post("/mantella", json=request_json).json()
+    if reply.get(comm_consts.KEY_REPLYTYPE) == "error":
+        raise RuntimeError(f"Mantella returned an error: {reply.get('mantella_message')}")
+    return reply
+
+def collect_voicelines(client: TestClient, started_at: float, scenario: dict[str, Any]) -> dict[str, Any]:
+    """Asks for voicelines until the NPC has finished its response
+
+    Args:
+        client (TestClient): the client to send the requests with
+        started_at (float): when the request that triggered the response was sent
+        scenario (dict[str, Any]): the benchmark scenario
+
+    Returns:
+        dict[str, Any]: the timings of the response
+    """
+    time_to_first_voiceline: float | None = None
+    gaps: list[float] = []
+    voicelines = 0
+    while True:
+        requested_at = time.perf_counter()
+        reply = post(client, {comm_consts.KEY_REQUESTTYPE: comm_consts.KEY_REQUESTTYPE_CONTINUECONVERSATION})
+        received_at = time.perf_counter()
+        if reply[comm_consts.KEY_REPLYTYPE] != comm_consts.KEY_REPLYTYPE_NPCTALK or comm_consts.KEY_REPLYTYPE_NPCTALK not in reply:
+            break
+        voicelines += 1
+        if time_to_first_voiceline is None:
+            time_to_first_voiceline = received_at - started_at
+        else:
+            gaps.append(received_at - requested_at)
+        duration: float = reply[comm_consts.KEY_REPLYTYPE_NPCTALK][comm_consts.KEY_ACTOR_DURATION]
+        if scenario["playback_speed"] > 0:
+            time.sleep(duration * scenario["playback_speed"])
+    return {
+        "time_to_first_voiceline": time_to_first_voiceline,
+        "inter_sentence_gaps": gaps,
+        "voicelines": voicelines,
+        "response_seconds": time.perf_counter() - started_at
+    }
+
+def run_conversation(client: TestClient, scenario: dict[str, Any]) -> dict[str, Any]:
+    """Plays a single conversation: a greeting by the NPC, one response per player input and the end of the conversation
+    """
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    context = {comm_consts.KEY_CONTEXT_LOCATION: scenario["location"], comm_consts.KEY_CONTEXT_TIME: 12}
+
+    exchanges: list[dict[str, Any]] = []
+    started_at = time.perf_counter()
+    post(client, {
+        comm_consts.KEY_REQUESTTYPE: comm_consts.KEY_REQUESTTYPE_STARTCONVERSATION,
+        comm_consts.KEY_STARTCONVERSATION_WORLDID: "Benchmark",
+        comm_consts.KEY_INPUTTYPE: comm_consts.KEY_INPUTTYPE_TEXT,
+        comm_consts.KEY_ACTORS: scenario["actors"],
+        comm_consts.KEY_CONTEXT: context
+    })
+    exchanges.append(collect_voicelines(client, started_at, scenario))
+
+    for player_text in scenario["player_inputs"]:
+        started_at = time.perf_counter()
+        post(client, {
+            comm_consts.KEY_REQUESTTYPE: comm_consts.KEY_REQUESTTYPE_PLAYERINPUT,
+            comm_consts.KEY_REQUESTTYPE_PLAYERINPUT: player_text,
+            comm_consts.KEY_CONTEXT: context
+        })
+        exchanges.append(collect_voicelines(client, started_at, scenario))
+
+    end_started_at = time.perf_counter()
+    post(client, {comm_consts.KEY_REQUESTTYPE: comm_consts.KEY_REQUESTTYPE_ENDCONVERSATION})
+    end_conversation_seconds = time.perf_counter() - end_started_at
+
+    return {
+        "exchanges": exchanges,
+        "end_conversation_seconds": end_conversation_seconds,
+        "wall_seconds": time.perf_counter() - wall_start,
+        "cpu_seconds": time.process_time() - cpu_start
+    }
+
+def summarize(values: list[float]) -> dict[str, float] | None:
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    return {
+        "mean": statistics.fmean(ordered),
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "max": ordered[-1],
+        "count": len(ordered)
+    }
+
+def run_benchmark(scenario: dict[str, Any], trace_allocations: bool) -> dict[str, Any]:
+    llm_server = mock_llm_server(scenario["llm"]["replies"], scenario["llm"]["summary"], scenario["llm"]["time_to_first_token"], scenario["llm"]["tokens_per_second"])
+    llm_server.start()
+    mock_tts.SYNTHESIS_DELAY = scenario["tts"]["synthesis_delay"]
+    mock_tts.SECONDS_PER_CHARACTER = scenario["tts"]["seconds_per_character"]
+    mantella_route_module.piper = mock_tts # the route creates the TTS it is configured with, so the configured one is swapped for the mock
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="mantella_benchmark_") as save_folder:
+            config = create_config(save_folder + os.sep, llm_server.url)
+            server = create_server(config, save_folder)
+
+            with TestClient(server.app) as client:
+                post(client, {comm_consts.KEY_REQUESTTYPE: comm_consts.KEY_REQUESTTYPE_INIT})
+                for _ in range(scenario["warmup"]):
+                    run_conversation(client, scenario)
+
+                if trace_allocations:
+                    tracemalloc.start()
+                cpu_start = time.process_time()
+                conversations = [run_conversation(client, scenario) for _ in range(scenario["repeats"])]
+                cpu_seconds = time.process_time() - cpu_start
+                allocations: dict[str, Any] | None = None
+                if trace_allocations:
+                    current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+                    top_statistics = tracemalloc.take_snapshot().statistics('lineno')[:10]
+                    tracemalloc.stop()
+                    allocations = {
+                        "current_bytes": current_bytes,
+                        "peak_bytes": peak_bytes,
+                        "top_sites": [{"site": str(stat.traceback), "bytes": stat.size, "blocks": stat.count} for stat in top_statistics]
+                    }
+    finally:
+        llm_server.stop()
+
+    exchanges = [exchange for conversation in conversations for exchange in conversation["exchanges"]]
+    return {
+        "scenario": scenario,
+        "summary": {
+            "time_to_first_voiceline": summarize([e["time_to_first_voiceline"] for e in exchanges if e["time_to_first_voiceline"] is not None]),
+            "inter_sentence_gap": summarize([gap for e in exchanges for gap in e["inter_sentence_gaps"]]),
+            "end_conversation_seconds": summarize([c["end_conversation_seconds"] for c in conversations]),
+            "cpu_seconds": cpu_seconds,
+            "cpu_seconds_per_conversation": cpu_seconds / max(1, len(conversations)),
+            "allocations": allocations,
+            "llm_requests": llm_server.request_count,
+            "llm_streamed_requests": llm_server.streamed_request_count
+        },
+        "conversations": conversations
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the latency of Mantella conversations against a mock LLM and TTS")
+    parser.add_argument("--scenario", help="JSON file with values that replace the ones of the default scenario")
+    parser.add_argument("--output", help="file to write the JSON report to. Printed if not set")
+    parser.add_argument("--no-allocations", action="store_true", help="do not trace memory allocations, they slow down the benchmark")
+    parser.add_argument("--verbose", action="store_true", help="show the log of Mantella")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s: %(message)s')
+    report = run_benchmark(load_scenario(args.scenario), not args.no_allocations)
+    report_text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report_text)
+    else:
+        print(report_text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Microbenchmark of the sentence segmentation of the LLM stream.
+
+Feeds synthetic replies token by token to `sentence_segmenter` and to the segmentation Mantella did before it,
+which rescanned the whole buffer for every token, and prints the time per token of both.
+The replies get longer sentences and more narration in asterisks, which is where rescanning the buffer gets slow.
+
+Run from the root of the repository:
+    python -m benchmarks.segmenter_benchmark --repeats 5
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any
+from src.llm.sentence_segmenter import sentence_segmenter
+
+WORDS: list[str] = ["the", "dragon", "Whiterun", "my", "Thane", "guards", "road", "sword", "careful", "Jarl", "3.5", "Mr.", "septims", "north", "tonight"]
+
+def rescan_segment(tokens: list[str]) -> list[str]:
+    """The segmentation of the LLM stream before sentence_segmenter, which rescanned the whole buffer for every token
+    """
+    sentences: list[str] = []
+    buffer = ''
+    for token in tokens:
+        buffer += token
+        last_punctuation = max(buffer.rfind(char, 0, sentence_segmenter.MAX_SENTENCE_LENGTH) for char in sentence_segmenter.END_OF_SENTENCE_CHARS)
+        if last_punctuation != -1 and buffer.count('*') % 2 == 0:
+            remaining_content = buffer[last_punctuation + 1:]
+            if remaining_content.strip() in sentence_segmenter.CLOSING_CHARS:
+                sentences.append(buffer)
+                remaining_content = ''
+            else:
+                sentences.append(buffer[:last_punctuation + 1])
+            buffer = remaining_content
+    return sentences
+
+def segment(tokens: list[str]) -> list[str]:
+    segmenter = sentence_segmenter()
+    sentences: list[str] = []
+    for token in tokens:
+        sentence = segmenter.feed(token)
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def create_tokens(sentence_words: int, narration_pct: float, token_count: int, seed: int = 1) -> list[str]:
+    """Creates a stream of word tokens with a period every `sentence_words` words. Sentences are narration in asterisks with a probability of `narration_pct`
+    """
+    rng = random.Random(seed)
+    tokens: list[str] = []
+    while len(tokens) < token_count:
+        is_narration = rng.random() < narration_pct
+        words = [f" {rng.choice(WORDS)}" for _ in range(sentence_words)]
+        if is_narration:
+            words[0] = f" *{words[0].strip()}"
+        tokens.extend(words)
+        tokens.append(".*" if is_narration else ".")
+    return tokens[:token_count]
+
+def measure(function, tokens: list[str], repeats: int) -> dict[str, float]:
+    durations: list[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(tokens)
+        durations.append(time.perf_counter() - start)
+    return {
+        "median_us_per_token": statistics.median(durations) / len(tokens) * 1e6,
+        "min_us_per_token": min(durations) / len(tokens) * 1e6
+    }
+
+def run_benchmark(repeats: int, token_count: int) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+    for sentence_words in [5, 20, 60]:
+        for narration_pct in [0.0, 0.5]:
+            tokens = create_tokens(sentence_words, narration_pct, token_count)
+            results.append({
+                "sentence_words": sentence_words,
+                "narration_pct": narration_pct,
+                "tokens": len(tokens),
+                "sentence_segmenter": measure(segment, tokens, repeats),
+                "rescan": measure(rescan_segment, tokens, repeats)
+            })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the time sentence_segmenter takes per token of the LLM stream")
+    parser.add_argument("--repeats", type=int, default=5, help="number of times every stream is segmented")
+    parser.add_argument("--tokens", type=int, default=20000, help="number of tokens of every stream")
+    args = parser.parse_args()
+
+    print(json.dumps(run_benchmark(args.repeats, args.tokens), indent=4))
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,10 @@ import traceback
 from src.http.routes.routeable import routeable
 from src.http.routes.mantella_route import mantella_route
 from src.http.routes.stt_route import stt_route
+from src.http.routes.metrics_route import metrics_route
 import logging
 import src.setup as setup
+from src.profiler import profiler
 from src.ui.start_ui import StartUI
 
 def main():
@@ -17,13 +19,17 @@ def main():
         mantella_version = '0.13 Preview 2'
         logging.log(24, f'\nMantella v{mantella_version}')
 
+        if config.enable_profiler:
+            profiler.enable()
+
         mantella_http_server = http_server()
 
         should_debug_http = config.show_http_debug_messages
         conversation = mantella_route(config, 'STT_SECRET_KEY.txt', 'IMAGE_SECRET_KEY.txt', 'GPT_SECRET_KEY.txt', language_info, should_debug_http)
         stt = stt_route(config, 'STT_SECRET_KEY.txt', 'GPT_SECRET_KEY.txt', should_debug_http)
         ui = StartUI(config)
-        routes: list[routeable] = [conversation, stt, ui]
+        metrics_endpoint = metrics_route(config, should_debug_http)
+        routes: list[routeable] = [conversation, stt, ui, metrics_endpoint]
         
         mantella_http_server.start(int(config.port), routes, should_debug_http)
 
@@ -221,6 +221,8 @@ class ConfigLoader:
                 logging.error(f"""Error in parsing LLM parameter list: {e}
 LLM parameter list must follow the Python dictionary format: https://www.w3schools.com/python/python_dictionaries.asp""")
                 self.llm_params = None
+            self.llm_connection_pool_size = self.__definitions.get_int_value("llm_connection_pool_size")
+            self.llm_connection_idle_timeout = self.__definitions.get_float_value("llm_connection_idle_timeout")
 
             # self.stop_llm_generation_on_assist_keyword: bool = self.__definitions.get_bool_value("stop_llm_generation_on_assist_keyword")
             self.try_filter_narration: bool = self.__definitions.get_bool_value("try_filter_narration")
@@ -243,6 +245,7 @@ LLM parameter list must follow the Python dictionary format: https://www.w3schoo
             self.automatic_greeting = self.__definitions.get_bool_value("automatic_greeting")
             self.max_count_events = self.__definitions.get_int_value("max_count_events")
             self.hourly_time = self.__definitions.get_bool_value("hourly_time")
+            self.memory_type = self.__definitions.get_string_value("memory_type")
             self.player_character_description: str = self.__definitions.get_string_value("player_character_description")
             self.voice_player_input: bool = self.__definitions.get_bool_value("voice_player_input")
             self.player_voice_model: str = self.__definitions.get_string_value("player_voice_model")
@@ -250,6 +253,9 @@ LLM parameter list must follow the Python dictionary format: https://www.w3schoo
             #HTTP
             self.port = self.__definitions.get_int_value("port")
             self.show_http_debug_messages: bool = self.__definitions.get_bool_value("show_http_debug_messages")
+            self.record_sessions: bool = self.__definitions.get_bool_value("record_sessions")
+            self.enable_profiler: bool = self.__definitions.get_bool_value("enable_profiler")
+            self.export_conversation_traces: bool = self.__definitions.get_bool_value("export_conversation_traces")
 
             #new separate prompts for Fallout 4 have been added 
             if self.game == "Fallout4" or self.game == "Fallout4VR":
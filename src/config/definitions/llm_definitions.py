@@ -67,6 +67,18 @@ class LLMDefinitions:
                         Note that available parameters can vary per LLM provider."""
         return ConfigValueString("llm_params", "Parameters", description, value, tags=[ConfigValueTag.advanced])
 
+    @staticmethod
+    def get_connection_pool_size_config_value() -> ConfigValue:
+        description = """The maximum number of connections Mantella keeps open to the LLM service.
+                        Connections are kept alive between requests so that replies do not have to wait for a new connection to be set up every time."""
+        return ConfigValueInt("llm_connection_pool_size","Connection Pool Size",description, 10, 1, 100, tags=[ConfigValueTag.advanced,ConfigValueTag.share_row])
+
+    @staticmethod
+    def get_connection_idle_timeout_config_value() -> ConfigValue:
+        description = """Time (in seconds) an unused connection to the LLM service is kept open before it is closed.
+                        If you are noticing connection errors with your LLM service, try lowering this value."""
+        return ConfigValueFloat("llm_connection_idle_timeout","Connection Idle Timeout",description, 30.0, 1.0, 600.0, tags=[ConfigValueTag.advanced,ConfigValueTag.share_row])
+
     # @staticmethod
     # def get_stop_llm_generation_on_assist_keyword() -> ConfigValue:
     #     stop_llm_generation_on_assist_keyword_description = """Should the generation of the LLM be stopped if the word 'assist' is found?
@@ -4,6 +4,7 @@ from src.config.types.config_value_bool import ConfigValueBool
 from src.config.types.config_value_int import ConfigValueInt
 from src.config.types.config_value_string import ConfigValueString
 from src.config.types.config_value_multi_selection import ConfigValueMultiSelection
+from src.config.types.config_value_selection import ConfigValueSelection
 
 
 class OtherDefinitions:
@@ -54,6 +55,14 @@ class OtherDefinitions:
                         To remove mentions of the hour entirely, prompts also need to be edited from 'The time is {time} {time_group}.' to 'The conversation takes place {time_group}.'"""
         return ConfigValueBool("hourly_time","Report In-Game Time Hourly",description,False,tags=[ConfigValueTag.advanced,ConfigValueTag.share_row])
     
+    @staticmethod
+    def get_memory_type_config_value() -> ConfigValue:
+        description = """How NPCs remember previous conversations.
+                        - Summaries: The summaries of all previous conversations with the NPCs are added to the prompt.
+                        - Relevant Memories: Only the parts of previous conversations (summaries and spoken lines) that are most relevant to the location, the NPCs and what the player last said are added to the prompt.
+                        Conversations are summarized in both cases."""
+        return ConfigValueSelection("memory_type","Memory",description,"Summaries",["Summaries","Relevant Memories"],tags=[ConfigValueTag.advanced])
+    
     #Player Character
     @staticmethod
     def get_player_character_description() -> ConfigValue:
@@ -83,6 +92,18 @@ class OtherDefinitions:
     @staticmethod
     def get_show_http_debug_messages_config_value() -> ConfigValue:
         return ConfigValueBool("show_http_debug_messages","Show HTTP Debug Messages","Display the JSON going in and out of the server in Mantella.exe's log.", False, tags=[ConfigValueTag.advanced,ConfigValueTag.share_row])
+
+    @staticmethod
+    def get_record_sessions_config_value() -> ConfigValue:
+        return ConfigValueBool("record_sessions","Record Sessions","Save every request of the game and the reply to it to a session file in the data/sessions folder of Mantella's save folder.\nThe session can be replayed offline against a mock LLM and TTS with benchmarks/replay_session.py to investigate latency problems.", False, tags=[ConfigValueTag.advanced,ConfigValueTag.share_row])
+    
+    @staticmethod
+    def get_enable_profiler_config_value() -> ConfigValue:
+        return ConfigValueBool("enable_profiler","Enable Profiler","Measure how often Mantella's functions are called and how long they take.\nAfter every conversation, a summary table and a trace that can be opened in chrome://tracing or ui.perfetto.dev are saved to the data/profiles folder of Mantella's save folder.\nSlows Mantella down slightly. Requires a restart of Mantella.", False, tags=[ConfigValueTag.advanced])
+    
+    @staticmethod
+    def get_export_conversation_traces_config_value() -> ConfigValue:
+        return ConfigValueBool("export_conversation_traces","Export Conversation Traces","Save a timeline of every conversation to the data/traces folder of Mantella's save folder when the conversation ends.\nThe timeline shows when requests arrive, when the LLM starts and finishes responding, when each sentence is voiced and when it is sent to the game.\nOpen the files in chrome://tracing or ui.perfetto.dev to find out where the gaps between voicelines come from.", False, tags=[ConfigValueTag.advanced])
     
     #Debugging
     @staticmethod
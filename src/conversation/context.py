@@ -1,23 +1,42 @@
+from dataclasses import dataclass
 import logging
-from typing import Any, Hashable, Callable
+from typing import Any, Hashable
 from src.conversation.action import action
 from src.http.communication_constants import communication_constants
 from src.conversation.conversation_log import conversation_log
 from src.characters_manager import Characters
 from src.remember.remembering import remembering
+from src.conversation.prompt_assembler import prompt_assembler
 from src import utils
 from src.utils import get_time_group
 from src.character_manager import Character
 from src.config.config_loader import ConfigLoader
 from src.llm.llm_client import LLMClient
 
+@dataclass
+class character_prompt_fragments:
+    """The parts of the prompt that describe a single NPC, with their number of tokens
+    """
+    state: tuple # the values of the NPC the fragments were created from
+    bio: str
+    bio_token_count: int
+    trust: str
+    equipment: str
+    equipment_token_count: int
+
 class context:
     """Holds the context of a conversation
     """
     TOKEN_LIMIT_PERCENT: float = 0.45
+    # priorities of the variable parts of the prompt, higher priorities are kept first when the prompt is too long
+    ACTIONS_PRIORITY: int = 4
+    TRUST_PRIORITY: int = 3
+    EQUIPMENT_PRIORITY: int = 2
+    BIOS_PRIORITY: int = 1
+    SUMMARIES_PRIORITY: int = 0
 
     @utils.time_it
-    def __init__(self, world_id: str, config: ConfigLoader, client: LLMClient, rememberer: remembering, language: dict[Hashable, str], is_prompt_too_long: Callable[[str, float], bool]) -> None:
+    def __init__(self, world_id: str, config: ConfigLoader, client: LLMClient, rememberer: remembering, language: dict[Hashable, str]) -> None:
         self.__world_id = world_id
         self.__hourly_time = config.hourly_time
         self.__prev_game_time: tuple[str | None, str] | None = None
@@ -26,12 +45,13 @@ class context:
         self.__client: LLMClient = client
         self.__rememberer: remembering = rememberer
         self.__language: dict[Hashable, str] = language
-        self.__is_prompt_too_long: Callable[[str, float], bool] = is_prompt_too_long
         self.__weather: str = ""
         self.__custom_context_values: dict[str, Any] = {}
         self.__ingame_time: int = 12
         self.__ingame_events: list[str] = []
         self.__vision_hints: str = ''
+        self.__latest_player_input: str = ""
+        self.__character_fragments: dict[str, character_prompt_fragments] = {} # per ref_id
         self.__have_actors_changed: bool = False
         self.__game = config.game
 
@@ -69,6 +89,16 @@ class context:
     def location(self, value: str):
         self.__location = value
 
+    @property
+    def latest_player_input(self) -> str:
+        """The latest text the player said in the conversation. Used to pick the memories that are relevant to the conversation
+        """
+        return self.__latest_player_input
+
+    @latest_player_input.setter
+    def latest_player_input(self, value: str):
+        self.__latest_player_input = value
+
     @property
     def ingame_time(self) -> int:
         return self.__ingame_time
@@ -150,6 +180,7 @@ class context:
     @utils.time_it
     def __remove_character(self, npc: Character):
         self.__npcs_in_conversation.remove_character(npc)
+        self.__character_fragments.pop(npc.ref_id, None)
         self.__ingame_events.append(f"{npc.name} has left the conversation.")
         self.__have_actors_changed = True
 
@@ -295,20 +326,10 @@ class context:
     def __get_trusts(self) -> str:
         """Calculates the trust towards the player for all NPCs in the conversation
 
-        Args:
-            player_name (str, optional): _description_. Defaults to "". The name of the player, if empty string treated as if the player is not in the conversation
-
         Returns:
             str: A combined natural text describing their relationship towards the player, empty if there is no player 
         """
-        # if player_name == "" or len(self.__npcs_in_conversation) < 1:
-        #     return ""
-        
-        relationships = []
-        for npc in self.get_characters_excluding_player().get_all_characters():
-            trust = self.__get_trust(npc)
-            relationships.append(f"{trust} to {npc.name}")
-        
+        relationships = [self.__get_character_fragments(npc).trust for npc in self.get_characters_excluding_player().get_all_characters()]
         return context.format_listing(relationships)
        
     @utils.time_it
@@ -329,31 +350,51 @@ class context:
         return context.format_listing(keys)
     
     @utils.time_it
-    def __get_bios_text(self) -> str:
+    def __get_bios_text(self) -> tuple[str, int]:
         """Gets the bios of all characters in the conversation
 
         Returns:
-            str: the bios concatenated together into a single string
+            tuple[str, int]: the bios concatenated together into a single string and the number of tokens of it
         """
-        bio_descriptions = []
-        for character in self.get_characters_excluding_player().get_all_characters():
-            if len(self.__npcs_in_conversation) == 1:
-                bio_descriptions.append(character.bio)
-            else:
-                bio_descriptions.append(f"{character.name}: {character.bio}")
-        return "\n".join(bio_descriptions)
+        fragments = [self.__get_character_fragments(character) for character in self.get_characters_excluding_player().get_all_characters()]
+        bio_token_count = sum(fragment.bio_token_count for fragment in fragments) + max(0, len(fragments) - 1) # +1 for every line break
+        return "\n".join(fragment.bio for fragment in fragments), bio_token_count
     
     @utils.time_it
-    def __get_npc_equipment_text(self) -> str:
+    def __get_npc_equipment_text(self) -> tuple[str, int]:
         """Gets the equipment description of all npcs in the conversation
 
         Returns:
-            str: the equipment descriptions concatenated together into a single string
+            tuple[str, int]: the equipment descriptions concatenated together into a single string and the number of tokens of it
+        """
+        fragments = [self.__get_character_fragments(character) for character in self.get_characters_excluding_player().get_all_characters()]
+        equipment_token_count = sum(fragment.equipment_token_count for fragment in fragments)
+        return " ".join(fragment.equipment for fragment in fragments), equipment_token_count
+
+    @utils.time_it
+    def __get_character_fragments(self, character: Character) -> character_prompt_fragments:
+        """Gets the parts of the prompt that describe a single NPC. They are only created and tokenized again if the state of the NPC they are made from has changed,
+        so an NPC joining or leaving the conversation does not affect the fragments of the other NPCs.
+        The equipment and the conversation log are part of the state by their version counters, so checking the state does not describe the equipment or look up the log length
+
+        Args:
+            character (Character): the NPC to get the fragments for
+
+        Returns:
+            character_prompt_fragments: the bio, trust and equipment texts of the NPC
         """
-        equipment_descriptions = []
-        for character in self.get_characters_excluding_player().get_all_characters():
-                equipment_descriptions.append(character.equipment.get_equipment_description(character.name))
-        return " ".join(equipment_descriptions)
+        is_single_character = len(self.__npcs_in_conversation) == 1
+        state = (character.name, character.bio, character.relationship_rank, conversation_log.get_version(), character.equipment.version, is_single_character)
+        fragments = self.__character_fragments.get(character.ref_id)
+        if fragments and fragments.state == state:
+            return fragments
+
+        equipment = character.equipment.get_equipment_description(character.name)
+        bio = character.bio if is_single_character else f"{character.name}: {character.bio}"
+        trust = f"{self.__get_trust(character)} to {character.name}"
+        fragments = character_prompt_fragments(state, bio, self.__client.calculate_tokens_from_text(bio), trust, equipment, self.__client.calculate_tokens_from_text(equipment))
+        self.__character_fragments[character.ref_id] = fragments
+        return fragments
     
     @utils.time_it
     def __get_action_texts(self, actions: list[action]) -> str:
@@ -395,9 +436,9 @@ class context:
             name: str = self.npcs_in_conversation.last_added_character.name
         names = self.get_character_names_as_text(False)
         names_w_player = self.get_character_names_as_text(True)
-        bios = self.__get_bios_text()
+        bios, bios_token_count = self.__get_bios_text()
         trusts = self.__get_trusts()
-        equipment = self.__get_npc_equipment_text()
+        equipment, equipment_token_count = self.__get_npc_equipment_text()
         location = self.__location
         self.__prev_location = location
         weather = self.__weather
@@ -407,47 +448,43 @@ class context:
             self.__prev_game_time = str(time), time_group
         else:
             self.__prev_game_time = None, time_group
-        conversation_summaries = self.__rememberer.get_prompt_text(self.get_characters_excluding_player(), self.__world_id)
+        conversation_summaries = self.__rememberer.get_prompt_text(self.get_characters_excluding_player(), self.__world_id, location, self.__latest_player_input)
         actions = self.__get_action_texts(actions_for_prompt)
 
-        removal_content: list[tuple[str, str]] = [(bios, conversation_summaries),(bios,""),("","")]
-        have_bios_been_dropped = False
-        have_summaries_been_dropped = False
-        logging.log(23, f'Maximum size of prompt is {self.__client.token_limit} x {self.TOKEN_LIMIT_PERCENT} = {int(round(self.__client.token_limit * self.TOKEN_LIMIT_PERCENT, 0))} tokens.')
-        for content in removal_content:
-            result = prompt.format(
-                player_name = player_name,
-                player_description = player_description,
-                player_equipment = player_equipment,
-                name=name,
-                names=names,
-                names_w_player = names_w_player,
-                bio=content[0],
-                bios=content[0], 
-                trust=trusts,
-                equipment = equipment,
-                location=location,
-                weather = weather,
-                time=time, 
-                time_group=time_group, 
-                language=self.__language['language'], 
-                conversation_summary=content[1],
-                conversation_summaries=content[1],
-                actions = actions
-                )
-            if self.__is_prompt_too_long(result, self.TOKEN_LIMIT_PERCENT):
-                if content[0] != "":
-                    have_summaries_been_dropped = True
-                else:
-                    have_bios_been_dropped = True
-            else:
-                break
+        token_limit = int(round(self.__client.token_limit * self.TOKEN_LIMIT_PERCENT, 0))
+        logging.log(23, f'Maximum size of prompt is {self.__client.token_limit} x {self.TOKEN_LIMIT_PERCENT} = {token_limit} tokens.')
+        assembler = prompt_assembler(prompt, self.__client.calculate_tokens_from_text)
+        # sections are given their share of the token limit in order of priority, the summaries get what is left
+        action_section = assembler.add_section(["actions"], actions, self.ACTIONS_PRIORITY)
+        trust_section = assembler.add_section(["trust"], trusts, self.TRUST_PRIORITY)
+        equipment_section = assembler.add_section(["equipment"], equipment, self.EQUIPMENT_PRIORITY, token_count=equipment_token_count)
+        bio_section = assembler.add_section(["bio", "bios"], bios, self.BIOS_PRIORITY, token_count=bios_token_count)
+        summary_section = assembler.add_section(["conversation_summary", "conversation_summaries"], conversation_summaries, self.SUMMARIES_PRIORITY, split_paragraphs=True)
+        result, prompt_tokens = assembler.assemble(
+            token_limit,
+            player_name = player_name,
+            player_description = player_description,
+            player_equipment = player_equipment,
+            name=name,
+            names=names,
+            names_w_player = names_w_player,
+            location=location,
+            weather = weather,
+            time=time, 
+            time_group=time_group, 
+            language=self.__language['language']
+            )
         
-        logging.log(23, f'Prompt sent to LLM ({self.__client.calculate_tokens_from_text(result)} tokens): {result.strip()}')
-        if have_summaries_been_dropped and have_bios_been_dropped:
-            logging.log(logging.WARNING, f'Both the bios and summaries of the NPCs selected could not fit into the maximum prompt size of {int(round(self.__client.token_limit * self.TOKEN_LIMIT_PERCENT, 0))} tokens. NPCs will not remember previous conversations and will have limited knowledge of who they are.')
-        elif have_summaries_been_dropped:
-            logging.log(logging.WARNING, f'The summaries of the NPCs selected could not fit into the maximum prompt size of {int(round(self.__client.token_limit * self.TOKEN_LIMIT_PERCENT, 0))} tokens. NPCs will not remember previous conversations.')
+        logging.log(23, f'Prompt sent to LLM (~{prompt_tokens} tokens): {result.strip()}')
+        if summary_section.is_dropped and bio_section.is_dropped:
+            logging.log(logging.WARNING, f'Both the bios and summaries of the NPCs selected could not fit into the maximum prompt size of {token_limit} tokens. NPCs will not remember previous conversations and will have limited knowledge of who they are.')
+        elif summary_section.is_dropped:
+            logging.log(logging.WARNING, f'The summaries of the NPCs selected could not fit into the maximum prompt size of {token_limit} tokens. NPCs will not remember previous conversations.')
+        elif summary_section.is_truncated:
+            logging.log(logging.WARNING, f'The summaries of the NPCs selected have been shortened to fit into the maximum prompt size of {token_limit} tokens. NPCs will only remember some of their previous conversations.')
+        for dropped_section, section_name in [(action_section, 'actions'), (trust_section, 'trust'), (equipment_section, 'equipment')]:
+            if dropped_section.is_dropped:
+                logging.log(logging.WARNING, f'The {section_name} of the prompt could not fit into the maximum prompt size of {token_limit} tokens and has been left out.')
         return result
     
     @utils.time_it
@@ -1,6 +1,6 @@
 from enum import Enum
 import logging
-from threading import Thread, Lock
+from threading import Lock
 import time
 from typing import Any
 from src.llm.llm_client import LLMClient
@@ -13,6 +13,7 @@ from src.remember.remembering import remembering
 from src.output_manager import ChatManager
 from src.llm.messages import assistant_message, system_message, user_message
 from src.conversation.context import context
+from src.conversation.conversation_timeline import conversation_timeline
 from src.llm.message_thread import message_thread
 from src.conversation.conversation_type import conversation_type, multi_npc, pc_to_npc, radiant
 from src.character_manager import Character
@@ -46,8 +47,8 @@ class conversation:
         self.__openai_client = openai_client
         self.__has_already_ended: bool = False        
         self.__sentences: sentence_queue = sentence_queue()
-        self.__generation_thread: Thread | None = None
         self.__generation_start_lock: Lock = Lock()
+        self.__timeline: conversation_timeline = conversation_timeline(context_for_conversation.config.export_conversation_traces)
         # self.__actions: list[action] = actions
         self.last_sentence_audio_length = 0
         self.last_sentence_start_time = time.time()
@@ -72,6 +73,10 @@ class conversation:
     def stt(self) -> Transcriber:
         return self.__stt
     
+    @property
+    def timeline(self) -> conversation_timeline:
+        return self.__timeline
+    
     @utils.time_it
     def add_or_update_character(self, new_character: list[Character]):
         """Adds or updates a character in the conversation.
@@ -193,6 +198,10 @@ class conversation:
                     player__character_voiced_sentence = sentence(player_character, player_text, "" , 2.0, False)
                 self.__sentences.put(player__character_voiced_sentence)
             text = new_message.text
+            self.__context.latest_player_input = player_text
+            if self.__rememberer.uses_player_input:
+                # the memories in the prompt are picked by what the player said, so they are picked again for every input
+                self.__messages.set_system_prompt(self.__conversation_type.generate_prompt(self.__context))
             logging.log(23, f"Text passed to NPC: {text}")
 
         ejected_npc = self.__does_dismiss_npc_from_conversation(text)
@@ -245,7 +254,7 @@ class conversation:
                 self.__messages: message_thread = message_thread(new_prompt)
             else:
                 self.__conversation_type.adjust_existing_message_thread(self.__messages, self.__context)
-                self.__messages.reload_message_thread(new_prompt, self.__openai_client.calculate_tokens_from_text, int(self.__openai_client.token_limit * self.TOKEN_LIMIT_RELOAD_MESSAGES))
+                self.__messages.reload_message_thread(new_prompt, self.__openai_client.num_tokens_from_openai_message, int(self.__openai_client.token_limit * self.TOKEN_LIMIT_RELOAD_MESSAGES))
 
     @utils.time_it
     def update_game_events(self, message: user_message) -> user_message:
@@ -270,9 +279,12 @@ class conversation:
         Returns:
             sentence | None: The next sentence from the queue or None if the queue is empty
         """
+        wait_start = self.__timeline.now()
         next_sentence: sentence | None = self.__sentences.get_next_sentence() #This is a blocking call. Execution will wait here until queue is filled again
         if not next_sentence:
             return None
+        self.__timeline.add_span("Wait for sentence", "queue", wait_start, sentence=next_sentence.sentence)
+        self.__timeline.add_event("Sentence dequeued", "queue", sentence=next_sentence.sentence, speaker=next_sentence.speaker.name)
         
         if not next_sentence.is_system_generated_sentence and not next_sentence.speaker.is_player_character:
             last_message = self.__messages.get_last_message()
@@ -321,23 +333,20 @@ class conversation:
         self.__stop_generation()
         self.__sentences.clear()        
         self.__save_conversation(is_reload=False)
+        self.__timeline.export(self.__context.config.save_folder)
     
     @utils.time_it
     def __start_generating_npc_sentences(self):
-        """Starts a background Thread to generate sentences into the sentence_queue"""    
+        """Starts generating sentences into the sentence_queue in the background"""    
         with self.__generation_start_lock:
-            if not self.__generation_thread:
-                self.__sentences.is_more_to_come = True
-                self.__generation_thread = Thread(None, self.__output_manager.generate_response, None, [self.__messages, self.__context.npcs_in_conversation, self.__sentences, self.context.config.actions]).start()   
+            self.__sentences.is_more_to_come = True
+            self.__output_manager.generate_response(self.__messages, self.__context.npcs_in_conversation, self.__sentences, self.context.config.actions, self.__timeline)
 
     @utils.time_it
     def __stop_generation(self):
         """Stops the current generation of sentences if there is one
         """
         self.__output_manager.stop_generation()
-        while self.__generation_thread and self.__generation_thread.is_alive():
-            time.sleep(0.1)
-        self.__generation_thread = None
 
     @utils.time_it
     def __prepare_eject_npc_from_conversation(self, npc: Character):
@@ -386,7 +395,7 @@ class conversation:
         self.__save_conversation(is_reload=True)
         # Reload
         new_prompt = self.__conversation_type.generate_prompt(self.__context)
-        self.__messages.reload_message_thread(new_prompt, self.__openai_client.calculate_tokens_from_text, int(self.__openai_client.token_limit * self.TOKEN_LIMIT_RELOAD_MESSAGES))
+        self.__messages.reload_message_thread(new_prompt, self.__openai_client.num_tokens_from_openai_message, int(self.__openai_client.token_limit * self.TOKEN_LIMIT_RELOAD_MESSAGES))
 
     @utils.time_it
     def __has_conversation_ended(self, last_user_text: str) -> bool:
@@ -3,12 +3,20 @@ import logging
 import os
 from pathlib import Path
 import sys
+from threading import Lock
+from typing import Any
 import src.utils as utils
 from src.character_manager import Character
 from openai.types.chat import ChatCompletionMessageParam
 
 class conversation_log:
     game_path: str = "" # <- This gets set in the __init__ of gameable. Not clean but cleaner than other options
+    INDEX_FILE_NAME: str = "conversation_log_index.json"
+    # Message counts of each NPC per world, so the length of a conversation history can be looked up without reading it
+    __indexes: dict[str, dict[str, Any]] = {}
+    __index_lock: Lock = Lock()
+    __version: int = 0 # incremented whenever a conversation log is saved
+    __failed_migrations: dict[str, tuple[float, int]] = {} # modification time and size of the legacy files that could not be converted
 
     @staticmethod
     @utils.time_it
@@ -16,48 +24,203 @@ class conversation_log:
         # save conversation history
 
         if len(messages) > 0:
-            # if this is not the first conversation
             conversation_history_file = conversation_log.__get_path_to_conversation_history_file(character, world_id)
-            # transformed_messages = messages.transform_to_openai_messages(messages.get_talk_only())
-            if os.path.exists(conversation_history_file):
-                with open(conversation_history_file, 'r', encoding='utf-8') as f:
-                    conversation_history = json.load(f)
-
-                # add new conversation to conversation history
-                conversation_history.append(messages) # append everything except the initial system prompt
-            # if this is the first conversation
-            else:
-                directory = os.path.dirname(conversation_history_file)
-                os.makedirs(directory, exist_ok=True)
-                conversation_history = [messages] # wrap the first conversation in a list
-            
-            with open(conversation_history_file, 'w', encoding='utf-8') as f:
-                json.dump(conversation_history, f, indent=4) # save everything except the initial system prompt
+            directory = os.path.dirname(conversation_history_file)
+            os.makedirs(directory, exist_ok=True)
+            with conversation_log.__index_lock:
+                entry = conversation_log.__get_index_entry(conversation_history_file, world_id)
+                # each conversation is appended as a single line, so saving does not depend on the size of the existing history
+                conversation_log.__append_line(conversation_history_file, json.dumps(messages)) # save everything except the initial system prompt
+                entry["messages"] += len(messages)
+                entry["conversations"] += 1
+                entry["size"] = os.path.getsize(conversation_history_file)
+                conversation_log.__save_index(world_id)
+                conversation_log.__version += 1
+
+    @staticmethod
+    def get_version() -> int:
+        """Returns a counter that changes whenever a conversation log is saved, so values derived from the logs can be cached until then
+        """
+        return conversation_log.__version
 
     @staticmethod   
     @utils.time_it 
     def load_conversation_log(character: Character, world_id: str) -> list[str]:
         conversation_history_file = conversation_log.__get_path_to_conversation_history_file(character, world_id)
-        if os.path.exists(conversation_history_file):
-            with open(conversation_history_file, 'r', encoding='utf-8') as f:
-                conversation_history = json.load(f)
-            previous_conversations = []
-            for conversation in conversation_history:
-                previous_conversations.extend(conversation)
-            return previous_conversations
-        else:
-            return []
+        previous_conversations = []
+        for conversation in conversation_log.__read_conversations(conversation_history_file):
+            previous_conversations.extend(conversation)
+        return previous_conversations
+
+    @staticmethod
+    @utils.time_it
+    def load_conversation_log_since(character: Character, world_id: str, start: int) -> tuple[list[ChatCompletionMessageParam], int] | None:
+        """Loads the messages of the conversations that have been saved since the conversation history file had a size of `start` bytes.
+        Only the part of the file after `start` is read
+
+        Args:
+            character (Character): the character to load the messages for
+            world_id (str): the world the conversation history belongs to
+            start (int): the size of the file when it was last read, 0 to read the whole file
+
+        Returns:
+            tuple[list[ChatCompletionMessageParam], int] | None: the new messages and the current size of the file, to pass as `start` next time.
+                None if `start` is not the beginning of a conversation in the file, eg because the file has been edited by hand
+        """
+        conversation_history_file = conversation_log.__get_path_to_conversation_history_file(character, world_id)
+        with conversation_log.__index_lock: # no conversation can be appended while the file is read
+            size = os.path.getsize(conversation_history_file) if os.path.exists(conversation_history_file) else 0
+            if start > size:
+                return None
+            if start > 0:
+                with open(conversation_history_file, 'rb') as f:
+                    f.seek(start - 1)
+                    if f.read(1) != b'\n':
+                        return None
+            messages: list[ChatCompletionMessageParam] = []
+            for conversation in conversation_log.__read_conversations(conversation_history_file, start):
+                messages.extend(conversation)
+            return messages, size
 
     @staticmethod
     @utils.time_it
     def get_conversation_log_length(character: Character, world_id: str) -> int:
         conversation_history_file = conversation_log.__get_path_to_conversation_history_file(character, world_id)
-        if os.path.exists(conversation_history_file):
-            with open(conversation_history_file, 'r', encoding='utf-8') as f:
+        with conversation_log.__index_lock:
+            return conversation_log.__get_index_entry(conversation_history_file, world_id)["messages"]
+
+    @staticmethod
+    @utils.time_it
+    def get_world_conversation_log_length(world_id: str) -> int:
+        """Returns the number of messages of all NPCs in a world
+        """
+        with conversation_log.__index_lock:
+            index = conversation_log.__get_index(world_id)
+            return sum(entry["messages"] for entry in index.values())
+
+    @staticmethod
+    def __get_index_file(world_id: str) -> str:
+        return f"{conversation_log.game_path}/{world_id}/{conversation_log.INDEX_FILE_NAME}"
+
+    @staticmethod
+    @utils.time_it
+    def __get_index(world_id: str) -> dict[str, Any]:
+        """Returns the index of a world, loading it from disk the first time. Call only while holding __index_lock
+        """
+        index_file = conversation_log.__get_index_file(world_id)
+        if index_file not in conversation_log.__indexes:
+            index: dict[str, Any] = {}
+            if os.path.exists(index_file):
+                try:
+                    with open(index_file, 'r', encoding='utf-8') as f:
+                        index = json.load(f)
+                except Exception as e:
+                    logging.warning(f"Could not read {index_file}, it will be rebuilt: {e}")
+            conversation_log.__indexes[index_file] = index
+        return conversation_log.__indexes[index_file]
+
+    @staticmethod
+    @utils.time_it
+    def __get_index_entry(conversation_history_file: str, world_id: str) -> dict[str, int]:
+        """Returns the index entry of a conversation history file. Call only while holding __index_lock.
+        The entry is only rebuilt from the file if it is missing or the size of the file does not match, eg because the file was edited by hand
+        """
+        index = conversation_log.__get_index(world_id)
+        key = os.path.relpath(conversation_history_file, os.path.dirname(conversation_log.__get_index_file(world_id))).replace('\\', '/')
+        size = os.path.getsize(conversation_history_file) if os.path.exists(conversation_history_file) else 0
+        entry = index.get(key)
+        if not entry or entry.get("size") != size:
+            conversations = conversation_log.__read_conversations(conversation_history_file)
+            entry = {"messages": sum(len(conversation) for conversation in conversations), "conversations": len(conversations), "size": size}
+            index[key] = entry
+            if size > 0:
+                conversation_log.__save_index(world_id)
+        return entry
+
+    @staticmethod
+    @utils.time_it
+    def __save_index(world_id: str):
+        index_file = conversation_log.__get_index_file(world_id)
+        try:
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+            temp_file = index_file + '.tmp'
+            index = conversation_log.__indexes.get(index_file, {})
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({key: entry for key, entry in index.items() if entry["size"] > 0}, f, indent=4) # leave out NPCs without a conversation history
+            os.replace(temp_file, index_file)
+        except Exception as e:
+            logging.warning(f"Could not save {index_file}: {e}")
+
+    @staticmethod
+    @utils.time_it
+    def __read_conversations(conversation_history_file: str, start: int = 0) -> list[list[ChatCompletionMessageParam]]:
+        """Reads the conversations of a conversation history file. Each line of the file holds one conversation
+
+        Args:
+            conversation_history_file (str): the path to the file
+            start (int, optional): the byte position to start reading at, must be the beginning of a line. Defaults to 0.
+
+        Returns:
+            list[list[ChatCompletionMessageParam]]: the conversations in the order they were saved
+        """
+        conversations = []
+        if not os.path.exists(conversation_history_file):
+            return conversations
+        with open(conversation_history_file, 'rb') as f:
+            f.seek(start)
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    conversations.append(json.loads(line.decode('utf-8')))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # most likely the last line was not completely written, eg because Mantella was closed while saving
+                    position = f"line {line_number}" if start == 0 else f"line {line_number} after byte {start}"
+                    logging.warning(f"Skipping unreadable conversation in {position} of {conversation_history_file}")
+        return conversations
+
+    @staticmethod
+    @utils.time_it
+    def __append_line(file_path: str, line: str):
+        with open(file_path, 'a+b') as f:
+            # if a previous write was cut off, start a new line so the new entry stays readable
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            f.write((line + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    @utils.time_it
+    def __migrate_conversation_history_file(legacy_file: str, conversation_history_file: str):
+        """Converts a conversation history in the old format (a single JSON list of all conversations) into the append-only format.
+        Conversations that have already been saved in the new format are kept after the converted ones. The old file is kept as a backup with the ending '.bak'.
+        If the old file cannot be converted, it is tried again once the file has changed, eg because it has been fixed by hand
+        """
+        file_state = (os.path.getmtime(legacy_file), os.path.getsize(legacy_file))
+        if conversation_log.__failed_migrations.get(legacy_file) == file_state:
+            return
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
                 conversation_history = json.load(f)
-            return sum(len(conversation) for conversation in conversation_history)
-        else:
-            return 0
+            with conversation_log.__index_lock: # no conversation can be appended while the file is replaced
+                conversation_history += conversation_log.__read_conversations(conversation_history_file)
+                temp_file = conversation_history_file + '.tmp'
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    for conversation in conversation_history:
+                        f.write(json.dumps(conversation) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, conversation_history_file) # the new file only appears once it is complete
+                os.replace(legacy_file, legacy_file + '.bak')
+                conversation_log.__version += 1
+            conversation_log.__failed_migrations.pop(legacy_file, None)
+            logging.info(f"Converted conversation history {legacy_file} to {conversation_history_file}")
+        except Exception as e:
+            conversation_log.__failed_migrations[legacy_file] = file_state
+            logging.warning(f"Could not convert conversation history {legacy_file}: {e}. The conversations in it are missing from the conversation history until the file is fixed, it is converted once it changes")
 
     @staticmethod    
     @utils.time_it
@@ -65,10 +228,16 @@ class conversation_log:
         # if multiple NPCs in a conversation have the same name (eg Whiterun Guard) their names are appended with number IDs
         # these IDs need to be removed when saving the conversation
         name: str = utils.remove_trailing_number(character.name)
-        non_ref_path = f"{conversation_log.game_path}/{world_id}/{name}/{name}.json"
-        ref_path = f"{conversation_log.game_path}/{world_id}/{name} - {character.ref_id}/{name}.json"
+        non_ref_folder = f"{conversation_log.game_path}/{world_id}/{name}"
+        ref_folder = f"{conversation_log.game_path}/{world_id}/{name} - {character.ref_id}"
 
-        if os.path.exists(non_ref_path): # if a conversation folder already exists for this NPC, use it
-            return non_ref_path
+        if os.path.exists(f"{non_ref_folder}/{name}.jsonl") or os.path.exists(f"{non_ref_folder}/{name}.json"): # if a conversation history already exists for this NPC, use it
+            folder = non_ref_folder
         else: # else include the NPC's reference ID in the folder name to differentiate generic NPCs
-            return ref_path
+            folder = ref_folder
+        conversation_history_file = f"{folder}/{name}.jsonl"
+        
+        legacy_file = f"{folder}/{name}.json"
+        if os.path.exists(legacy_file): # also if the new file exists, in case converting the old one failed before
+            conversation_log.__migrate_conversation_history_file(legacy_file, conversation_history_file)
+        return conversation_history_file
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Iterator
+
+@dataclass
+class timeline_event:
+    name: str
+    category: str
+    start: float # time.perf_counter()
+    end: float | None # None for events without a duration
+    thread_id: int
+    args: dict[str, Any] = field(default_factory=dict)
+
+class conversation_timeline:
+    """Timestamped events of a single conversation, from the requests of the game over the LLM and the TTS to the sentence queue.
+    Exported in the Chrome trace event format, which can be opened in chrome://tracing or ui.perfetto.dev to find the gaps between voicelines.
+    If disabled, all methods return immediately without recording anything
+    """
+    MAX_EVENTS: int = 100_000
+    TRACE_FOLDER_NAME: str = "traces"
+
+    def __init__(self, enabled: bool) -> None:
+        self.__enabled: bool = enabled
+        self.__events: list[timeline_event] = []
+        self.__thread_names: dict[int, str] = {}
+        self.__lock: Lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.__enabled
+
+    @property
+    def event_count(self) -> int:
+        return len(self.__events)
+
+    @staticmethod
+    def now() -> float:
+        return time.perf_counter()
+
+    def add_event(self, name: str, category: str, **args: Any):
+        """Records an event without a duration that happens now, eg the first token of the LLM
+
+        Args:
+            name (str): the name shown in the trace viewer
+            category (str): the stage of the pipeline, eg "llm" or "tts"
+            **args (Any): details shown when selecting the event. Must be serializable to JSON
+        """
+        if self.__enabled:
+            self.__add(timeline_event(name, category, time.perf_counter(), None, threading.get_ident(), args))
+
+    def add_span(self, name: str, category: str, start: float, end: float | None = None, **args: Any):
+        """Records an event with a duration
+
+        Args:
+            name (str): the name shown in the trace viewer
+            category (str): the stage of the pipeline, eg "llm" or "tts"
+            start (float): conversation_timeline.now() when the span started
+            end (float | None, optional): conversation_timeline.now() when the span ended. Defaults to now.
+            **args (Any): details shown when selecting the span. Must be serializable to JSON
+        """
+        if self.__enabled:
+            self.__add(timeline_event(name, category, start, end if end is not None else time.perf_counter(), threading.get_ident(), args))
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[None]:
+        """Records the time spent in the with-block as a span, also if the block raises
+        """
+        if not self.__enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, **args)
+
+    def export(self, save_folder: str) -> str | None:
+        """Writes the timeline to a new trace file in the data/traces folder of the save folder
+
+        Args:
+            save_folder (str): the folder Mantella saves its data to
+
+        Returns:
+            str | None: the path of the trace file. None if the timeline is disabled, empty or could not be written
+        """
+        if not self.__enabled or len(self.__events) == 0:
+            return None
+        with self.__lock:
+            events = self.__events
+            thread_names = dict(self.__thread_names)
+            self.__events = [] # a conversation that is ended twice is only exported once
+        origin = min(e.start for e in events)
+        pid = os.getpid()
+        trace_events: list[dict[str, Any]] = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}} for tid, name in thread_names.items()]
+        for e in events:
+            trace_event: dict[str, Any] = {"name": e.name, "cat": e.category, "ts": (e.start - origin) * 1e6, "pid": pid, "tid": e.thread_id, "args": e.args}
+            if e.end is None:
+                trace_event.update({"ph": "i", "s": "t"})
+            else:
+                trace_event.update({"ph": "X", "dur": (e.end - e.start) * 1e6})
+            trace_events.append(trace_event)
+
+        folder = os.path.join(save_folder, "data", self.TRACE_FOLDER_NAME)
+        file_name = os.path.join(folder, f"conversation_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(file_name, 'w', encoding='utf-8') as f:
+                json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f, default=str)
+        except OSError as e:
+            logging.warning(f"Could not save conversation trace to {file_name}: {e}")
+            return None
+        logging.log(23, f"Conversation trace saved to {file_name}")
+        return file_name
+
+    def __add(self, event: timeline_event):
+        with self.__lock:
+            if len(self.__events) >= self.MAX_EVENTS:
+                return
+            self.__events.append(event)
+            if event.thread_id not in self.__thread_names:
+                self.__thread_names[event.thread_id] = threading.current_thread().name
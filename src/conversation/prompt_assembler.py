@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from typing import Any, Callable
+from src import utils
+
+@dataclass
+class prompt_section:
+    """A variable part of a prompt that can be left out if the prompt gets too long
+    """
+    keys: list[str] # the prompt variables the text is filled into, eg 'bio' and 'bios'
+    text: str
+    priority: int # sections with a higher priority get their share of the token budget first
+    split_paragraphs: bool = False # if True, the section is shortened by dropping its oldest lines instead of being dropped. The heading block is always kept
+    token_count: int | None = None # the number of tokens of the text if it is already known
+    included_text: str = ""
+
+    @property
+    def is_dropped(self) -> bool:
+        return len(self.text) > 0 and len(self.included_text) == 0
+
+    @property
+    def is_truncated(self) -> bool:
+        return 0 < len(self.included_text) < len(self.text)
+
+class prompt_assembler:
+    """Fills the variables of a prompt so that the prompt stays within a token budget.
+    The fixed part of the prompt and every section are only tokenized once.
+    The token count of the prompt is estimated from these counts instead of tokenizing every candidate prompt in full
+    """
+    def __init__(self, prompt: str, count_tokens: Callable[[str], int]) -> None:
+        self.__prompt: str = prompt
+        self.__count_tokens: Callable[[str], int] = count_tokens
+        self.__sections: list[prompt_section] = []
+
+    def add_section(self, keys: list[str], text: str, priority: int, split_paragraphs: bool = False, token_count: int | None = None) -> prompt_section:
+        """Adds a variable part of the prompt that is only included if it fits into the token budget
+
+        Args:
+            keys (list[str]): the prompt variables the text is filled into
+            text (str): the text of the section
+            priority (int): sections with a higher priority get their share of the token budget first
+            split_paragraphs (bool, optional): shorten the section line by line, oldest first, instead of dropping it.
+                The first line is kept as a heading. If the text has an empty line, everything before it is kept, eg a digest of older paragraphs. Defaults to False.
+            token_count (int | None, optional): the number of tokens of the text if it is already known, eg from cached parts of it. Defaults to None.
+
+        Returns:
+            prompt_section: the section, to check whether it has been included after assembling the prompt
+        """
+        section = prompt_section(keys, text, priority, split_paragraphs, token_count)
+        self.__sections.append(section)
+        return section
+
+    @utils.time_it
+    def assemble(self, token_budget: int, **values: Any) -> tuple[str, int]:
+        """Fills the prompt with the values and as many sections as fit into the token budget
+
+        Args:
+            token_budget (int): the max number of tokens of the prompt
+            **values (Any): the values of the prompt variables that are always included
+
+        Returns:
+            tuple[str, int]: the filled prompt and its estimated number of tokens
+        """
+        empty_sections = {key: "" for section in self.__sections for key in section.keys}
+        used_tokens = self.__count_tokens(self.__prompt.format(**values, **empty_sections))
+
+        for section in sorted(self.__sections, key=lambda s: s.priority, reverse=True):
+            section.included_text = ""
+            # a section is added to the prompt once for every variable it is filled into
+            occurrences = sum(self.__prompt.count(f"{{{key}}}") for key in section.keys)
+            if occurrences == 0 or len(section.text) == 0:
+                section.included_text = section.text
+                continue
+            section_tokens = section.token_count if section.token_count is not None else self.__count_tokens(section.text)
+            section_tokens *= occurrences
+            if used_tokens + section_tokens <= token_budget:
+                section.included_text = section.text
+                used_tokens += section_tokens
+            elif section.split_paragraphs:
+                section.included_text, section_tokens = self.__truncate(section.text, (token_budget - used_tokens) // occurrences)
+                used_tokens += section_tokens * occurrences
+
+        section_values = {key: section.included_text for section in self.__sections for key in section.keys}
+        return self.__prompt.format(**values, **section_values), used_tokens
+
+    def __truncate(self, text: str, token_budget: int) -> tuple[str, int]:
+        """Keeps the heading block and as many of the newest (last) lines as fit into the token budget, in their original order.
+        The heading block is everything before the first empty line, or only the first line if there is none.
+        If the heading block does not fit, only its first line is kept and the rest of it is dropped like the oldest lines
+
+        Returns:
+            tuple[str, int]: the shortened text and its estimated number of tokens. An empty text if nothing but the heading fits
+        """
+        heading_block, separator, body = text.partition("\n\n")
+        if separator:
+            pinned_lines = heading_block.split("\n")
+            lines = body.split("\n")
+        else:
+            lines = text.split("\n")
+            pinned_lines = lines[:1]
+            lines = lines[1:]
+        used_tokens = self.__count_tokens("\n".join(pinned_lines))
+        if len(pinned_lines) > 1 and used_tokens > token_budget:
+            lines = pinned_lines[1:] + lines
+            pinned_lines = pinned_lines[:1]
+            used_tokens = self.__count_tokens(pinned_lines[0])
+
+        kept_lines: list[str] = []
+        for line in reversed(lines):
+            line_tokens = self.__count_tokens(line) + 1 # +1 for the line break
+            if used_tokens + line_tokens > token_budget:
+                break
+            kept_lines.append(line)
+            used_tokens += line_tokens
+        kept_lines.reverse()
+        if len(pinned_lines) == 1:
+            if len(kept_lines) == 0:
+                return "", 0
+            return "\n".join(pinned_lines + kept_lines), used_tokens
+        if len(kept_lines) == 0:
+            return "\n".join(pinned_lines), used_tokens
+        return "\n".join(pinned_lines) + "\n\n" + "\n".join(kept_lines), used_tokens
@@ -1,4 +1,5 @@
 import logging
+import os
 from typing import Any, Hashable
 import regex
 from src.games.equipment import Equipment, EquipmentItem
@@ -9,12 +10,16 @@ from src.llm.sentence import sentence
 from src.output_manager import ChatManager
 from src.remember.remembering import remembering
 from src.remember.summaries import summaries
+from src.remember.retrieved_memories import retrieved_memories
 from src.config.config_loader import ConfigLoader
 from src.llm.llm_client import LLMClient
 from src.conversation.conversation import conversation
 from src.conversation.context import context
+from src.conversation.conversation_timeline import conversation_timeline
 from src.character_manager import Character
 import src.utils as utils
+from src.profiler import profiler
+from src.metrics import metrics
 from src.http.communication_constants import communication_constants as comm_consts
 from src.stt import Transcriber
 
@@ -34,7 +39,11 @@ class GameStateManager:
         self.__language_info: dict[Hashable, str] = language_info 
         self.__client: LLMClient = client
         self.__chat_manager: ChatManager = chat_manager
-        self.__rememberer: remembering = summaries(game, config.memory_prompt, config.resummarize_prompt, client, language_info['language'])
+        conversation_summaries = summaries(game, config.memory_prompt, config.resummarize_prompt, client, language_info['language'])
+        if config.memory_type == "Relevant Memories":
+            self.__rememberer: remembering = retrieved_memories(game, conversation_summaries, client)
+        else:
+            self.__rememberer: remembering = conversation_summaries
         self.__talk: conversation | None = None
         self.__mic_input: bool = False
         self.__mic_ptt: bool = False # push-to-talk
@@ -42,9 +51,18 @@ class GameStateManager:
         self.__api_file: str = api_file
         self.__stt: Transcriber | None = None
 
+    @utils.time_it
+    def shutdown(self):
+        """Ends the running conversation and stops the background workers. Call when the GameStateManager is replaced, eg after a config change
+        """
+        self.end_conversation({})
+        self.__chat_manager.shutdown()
+        self.__rememberer.shutdown()
+
     ###### react to calls from the game #######
     @utils.time_it
     def start_conversation(self, input_json: dict[str, Any]) -> dict[str, Any]:
+        received_at = conversation_timeline.now()
         if self.__talk: #This should only happen if game and server are out of sync due to some previous error -> close conversation and start a new one
             self.__talk.end()
             self.__talk = None
@@ -55,24 +73,28 @@ class GameStateManager:
         if input_json.__contains__(comm_consts.KEY_INPUTTYPE):
             if input_json[comm_consts.KEY_INPUTTYPE] in (comm_consts.KEY_INPUTTYPE_MIC, comm_consts.KEY_INPUTTYPE_PTT):
                 self.__mic_input = True
-                # only init Transcriber if mic input is enabled
-                self.__stt = Transcriber(self.__config, self.__stt_api_file, self.__api_file)
+                # only init Transcriber if mic input is enabled. It is kept for the following conversations
+                if not self.__stt:
+                    self.__stt = Transcriber(self.__config, self.__stt_api_file, self.__api_file)
+                else:
+                    self.__stt.reset_listening_state()
                 if input_json[comm_consts.KEY_INPUTTYPE] == comm_consts.KEY_INPUTTYPE_PTT:
                     self.__mic_ptt = True
                 
-        context_for_conversation = context(world_id, self.__config, self.__client, self.__rememberer, self.__language_info, self.__client.is_text_too_long)
+        context_for_conversation = context(world_id, self.__config, self.__client, self.__rememberer, self.__language_info)
         self.__talk = conversation(context_for_conversation, self.__chat_manager, self.__rememberer, self.__client, self.__stt, self.__mic_input, self.__mic_ptt)
         self.__update_context(input_json)
         character_to_talk = self.__talk.context.npcs_in_conversation.last_added_character
         self.__talk.output_manager.tts.change_voice(character_to_talk.tts_voice_model, character_to_talk.in_game_voice_model, character_to_talk.csv_in_game_voice_model, character_to_talk.advanced_voice_model, character_to_talk.voice_accent, voice_gender=character_to_talk.gender, voice_race=character_to_talk.race)
         self.__talk.start_conversation()
         
-        return {comm_consts.KEY_REPLYTYPE: comm_consts.KEY_REPLYTTYPE_STARTCONVERSATIONCOMPLETED}
+        return self.__add_request_to_timeline("Start conversation", received_at, {comm_consts.KEY_REPLYTYPE: comm_consts.KEY_REPLYTTYPE_STARTCONVERSATIONCOMPLETED})
     
     @utils.time_it
     def continue_conversation(self, input_json: dict[str, Any]) -> dict[str, Any]:
         if(not self.__talk ):
             return self.error_message("No running conversation.")
+        received_at = conversation_timeline.now()
         
         if input_json.__contains__(comm_consts.KEY_REQUEST_EXTRA_ACTIONS):
             extra_actions: list[str] = input_json[comm_consts.KEY_REQUEST_EXTRA_ACTIONS]
@@ -93,18 +115,21 @@ class GameStateManager:
 
         if sentence_to_play:
             if not sentence_to_play.error_message:
-                self.__game.prepare_sentence_for_game(sentence_to_play, self.__talk.context, self.__config)            
+                with metrics.measure(metrics.PREPARE_SENTENCE_FOR_GAME, game=type(self.__game).__name__):
+                    self.__game.prepare_sentence_for_game(sentence_to_play, self.__talk.context, self.__config)
                 reply[comm_consts.KEY_REPLYTYPE_NPCTALK] = self.sentence_to_json(sentence_to_play)
             else:
+                error_reply = self.__add_request_to_timeline("Continue conversation", received_at, self.error_message(sentence_to_play.error_message))
                 self.__talk.end()
-                return self.error_message(sentence_to_play.error_message)
-        return reply
+                return error_reply
+        return self.__add_request_to_timeline("Continue conversation", received_at, reply)
 
     @utils.time_it
     def player_input(self, input_json: dict[str, Any]) -> dict[str, Any]:
         if(not self.__talk ):
             return self.error_message("No running conversation.")
         
+        received_at = conversation_timeline.now()
         player_text: str = input_json[comm_consts.KEY_REQUESTTYPE_PLAYERINPUT]
         self.__update_context(input_json)
         self.__talk.process_player_input(player_text)
@@ -115,15 +140,15 @@ class GameStateManager:
             for action in self.__config.actions:
                 # if the player response is just the name of an action, force the action to trigger
                 if action.keyword.lower() == cleaned_player_text.lower() and npcs_in_conversation.last_added_character:
-                    return {comm_consts.KEY_REPLYTYPE: comm_consts.KEY_REPLYTYPE_NPCACTION,
+                    return self.__add_request_to_timeline("Player input", received_at, {comm_consts.KEY_REPLYTYPE: comm_consts.KEY_REPLYTYPE_NPCACTION,
                             comm_consts.KEY_REPLYTYPE_NPCACTION: {
                                 'mantella_actor_speaker': npcs_in_conversation.last_added_character.name,
                                 'mantella_actor_actions': [action.identifier],
                                 }
-                            }
+                            })
         
         # if the player response is not an action command, return a regular player reply type
-        return {comm_consts.KEY_REPLYTYPE: comm_consts.KEY_REPLYTYPE_NPCTALK}
+        return self.__add_request_to_timeline("Player input", received_at, {comm_consts.KEY_REPLYTYPE: comm_consts.KEY_REPLYTYPE_NPCTALK})
 
     @utils.time_it
     def end_conversation(self, input_json: dict[str, Any]) -> dict[str, Any]:
@@ -131,11 +156,26 @@ class GameStateManager:
             self.__talk.end()
             self.__talk = None
 
+        if profiler.enabled:
+            profiler.export(os.path.join(self.__config.save_folder, "data", "profiles"))
+
         logging.log(24, '\nConversations not starting when you select an NPC? See here:')
         logging.log(25, 'https://art-from-the-machine.github.io/Mantella/pages/issues_qna')
         logging.log(24, '\nWaiting for player to select an NPC...')
         return {comm_consts.KEY_REPLYTYPE: comm_consts.KEY_REPLYTYPE_ENDCONVERSATION}
 
+    @utils.time_it
+    def __add_request_to_timeline(self, request_name: str, received_at: float, reply: dict[str, Any]) -> dict[str, Any]:
+        """Records the handling of a request of the game in the timeline of the conversation, from the request arriving to the reply being returned
+
+        Returns:
+            dict[str, Any]: the reply, unchanged
+        """
+        if self.__talk:
+            npc_talk: dict[str, Any] = reply.get(comm_consts.KEY_REPLYTYPE_NPCTALK, {})
+            self.__talk.timeline.add_span(request_name, "request", received_at, reply_type=reply.get(comm_consts.KEY_REPLYTYPE), sentence=npc_talk.get(comm_consts.KEY_ACTOR_LINETOSPEAK, ""))
+        return reply
+
     ####### JSON constructions #########
 
     @utils.time_it
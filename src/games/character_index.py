@@ -0,0 +1,147 @@
+from typing import Any, Hashable
+import pandas as pd
+
+class character_index:
+    """Lookup tables for the rows of the character database, built once when the database is loaded.
+    Matches characters by ID, partial ID, name and race with dictionary lookups instead of comparing every row of the database for every lookup
+    """
+    PARTIAL_ID_LENGTHS: list[int] = [5, 4, 3]
+    FULL_ID_LENGTH: int = 6
+
+    def __init__(self, character_df: pd.DataFrame) -> None:
+        self.__by_id: dict[str, set[Hashable]] = {}
+        self.__by_partial_id: dict[int, dict[str, set[Hashable]]] = {length: {} for length in self.PARTIAL_ID_LENGTHS}
+        self.__by_name: dict[str, set[Hashable]] = {}
+        self.__by_race: dict[str, set[Hashable]] = {}
+        self.__keys_of_row: dict[Hashable, tuple[str, str, str, dict[int, str]]] = {}
+        for label, base_id, name, race in zip(character_df.index, self.__get_column(character_df, 'base_id'), self.__get_column(character_df, 'name'), self.__get_column(character_df, 'race')):
+            self.add_row(label, base_id, name, race)
+
+    def __len__(self) -> int:
+        return self.__keys_of_row.__len__()
+
+    def add_row(self, label: Hashable, base_id: Any, name: Any, race: Any):
+        """Adds a row of the character database to the index. Replaces the entry of the row if it is already indexed
+
+        Args:
+            label (Hashable): the label of the row in the character database
+            base_id (Any): the base_id of the row
+            name (Any): the name of the row
+            race (Any): the race of the row
+        """
+        if label in self.__keys_of_row:
+            self.remove_row(label)
+        id_key = self.__clean_id(base_id)
+        partial_id_keys: dict[int, str] = {}
+        for length in self.PARTIAL_ID_LENGTHS:
+            partial_id_keys[length] = self.__clean_partial_id(base_id, length)
+        name_key = self.__clean_text(name)
+        race_key = self.__clean_text(race)
+
+        self.__keys_of_row[label] = (id_key, name_key, race_key, partial_id_keys)
+        self.__by_id.setdefault(id_key, set()).add(label)
+        for length, partial_id_key in partial_id_keys.items():
+            self.__by_partial_id[length].setdefault(partial_id_key, set()).add(label)
+        self.__by_name.setdefault(name_key, set()).add(label)
+        self.__by_race.setdefault(race_key, set()).add(label)
+
+    def remove_row(self, label: Hashable):
+        """Removes a row of the character database from the index
+
+        Args:
+            label (Hashable): the label of the row in the character database
+        """
+        keys = self.__keys_of_row.pop(label, None)
+        if not keys:
+            return
+        id_key, name_key, race_key, partial_id_keys = keys
+        self.__by_id[id_key].discard(label)
+        for length, partial_id_key in partial_id_keys.items():
+            self.__by_partial_id[length][partial_id_key].discard(label)
+        self.__by_name[name_key].discard(label)
+        self.__by_race[race_key].discard(label)
+
+    def find(self, base_id: str, character_name: str, race: str) -> tuple[str, Hashable] | None:
+        """Finds the row of a character. Tries the matchers in order of priority and returns the first one that matches exactly one row
+
+        Args:
+            base_id (str): the base_id of the character
+            character_name (str): the name of the character
+            race (str): the race of the character
+
+        Returns:
+            tuple[str, Hashable] | None: the description of the matcher that was used and the label of the matching row. None if no matcher matched exactly one row
+        """
+        full_id_search = base_id[-self.FULL_ID_LENGTH:].lstrip('0').lower() # Strip leading zeros from the last 6 characters
+        name_search = character_name.lower()
+        race_search = race.lower()
+
+        # Partial ID match with decreasing lengths, the first length that matches any row is used
+        partial_id_length = self.PARTIAL_ID_LENGTHS[-1]
+        partial_id_search = ''
+        for length in self.PARTIAL_ID_LENGTHS:
+            partial_id_length = length
+            partial_id_search = base_id[-length:].lstrip('0').lower() # strip leading zeros from partial ID search
+            if self.__by_partial_id[length].get(partial_id_search):
+                break
+
+        # Every matcher but 'ID' requires the name to match, so only the rows with a matching name need to be checked
+        name_rows = self.__by_name.get(name_search, set())
+        race_rows = self.__by_race.get(race_search, set())
+        def matching(check_id: bool = False, check_partial_id: bool = False, check_race: bool = False) -> list[Hashable]:
+            result = []
+            for label in name_rows:
+                id_key, _, _, partial_id_keys = self.__keys_of_row[label]
+                if check_id and id_key != full_id_search:
+                    continue
+                if check_partial_id and partial_id_keys[partial_id_length] != partial_id_search:
+                    continue
+                if check_race and label not in race_rows:
+                    continue
+                result.append(label)
+            return result
+
+        ordered_matchers = {
+            'name, ID, race': lambda: matching(check_id=True, check_race=True), # match name, full ID, race (needed for Fallout 4 NPCs like Curie)
+            'name, ID': lambda: matching(check_id=True), # match name and full ID
+            'name, partial ID, race': lambda: matching(check_partial_id=True, check_race=True), # match name, partial ID, and race
+            'name, partial ID': lambda: matching(check_partial_id=True), # match name and partial ID
+            'name, race': lambda: matching(check_race=True), # match name and race
+            'name': lambda: list(name_rows), # match just name
+            'ID': lambda: list(self.__by_id.get(full_id_search, set())) # match just ID
+        }
+
+        for matcher, get_matching_rows in ordered_matchers.items():
+            rows = get_matching_rows()
+            if len(rows) == 1: #If there is exactly one match
+                return matcher, rows[0]
+
+        return None
+
+    @staticmethod
+    def __get_column(character_df: pd.DataFrame, column_name: str) -> list[Any]:
+        if column_name in character_df.columns:
+            return character_df[column_name].tolist()
+        return [None] * len(character_df.index)
+
+    @staticmethod
+    def __to_string(value: Any) -> str:
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return ''
+        return str(value)
+
+    @staticmethod
+    def __clean_id(base_id: Any) -> str:
+        # remove leading zeros from hexadecimal ID strings
+        return character_index.__to_string(base_id).lstrip('0').lower()
+
+    @staticmethod
+    def __clean_partial_id(base_id: Any, length: int) -> str:
+        base_id_string = character_index.__to_string(base_id)
+        if len(base_id_string) >= length:
+            base_id_string = base_id_string[-length:]
+        return base_id_string.lstrip('0').lower()
+
+    @staticmethod
+    def __clean_text(text: Any) -> str:
+        return str(text).lower()
@@ -1,3 +1,4 @@
+import itertools
 from src import utils
 
 class EquipmentItem:
@@ -17,9 +18,17 @@ class Equipment:
     RIGHTHAND = "righthand"
     LEFTHAND = "lefthand"
     DESCRIPTION_ORDER_ARMOR: list[str] = [BODY, HEAD, HANDS, FEET, AMULET]
+    __versions = itertools.count(1)
 
     def __init__(self, slots_to_items: dict[str, EquipmentItem]) -> None:
         self.__slots_to_items = slots_to_items
+        self.__version: int = next(Equipment.__versions)
+
+    @property
+    def version(self) -> int:
+        """Unique for every Equipment. The items are never changed after creation, changed equipment comes as a new Equipment with a new version
+        """
+        return self.__version
 
     @utils.time_it
     def get_item(self, slot: str) -> EquipmentItem | None:
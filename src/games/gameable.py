@@ -3,13 +3,15 @@ import json
 import logging
 import os
 from pathlib import Path
-from typing import Any
+import pickle
+from typing import Any, Hashable
 import pandas as pd
 from src.conversation.conversation_log import conversation_log
 from src.conversation.context import context
 from src.config.config_loader import ConfigLoader
 from src.llm.sentence import sentence
 from src.games.external_character_info import external_character_info
+from src.games.character_index import character_index
 import src.utils as utils
 
 class gameable(ABC):
@@ -21,20 +23,27 @@ class gameable(ABC):
     Args:
         ABC (_type_): _description_
     """
+    CHARACTER_DATABASE_CACHE_VERSION: int = 2 # increase whenever the way the character database is built changes, this invalidates existing caches
+
     @utils.time_it
     def __init__(self, config: ConfigLoader, path_to_character_df: str, mantella_game_folder_path: str):
-        try:
-            self.__character_df: pd.DataFrame = self.__get_character_df(path_to_character_df)
-        except:
-            logging.error(f'Unable to read / open {path_to_character_df}. If you have recently edited this file, please try reverting to a previous version. This error is normally due to using special characters, or saving the CSV in an incompatible format.')
-            input("Press Enter to exit.")
-        
         self._is_vr: bool = 'vr' in config.game.lower()
-        #Apply character overrides
         mod_overrides_folder = os.path.join(*[config.mod_path_base, self.extender_name, "Plugins","MantellaSoftware","data",f"{mantella_game_folder_path}","character_overrides"])
-        self.__apply_character_overrides(mod_overrides_folder, self.__character_df.columns.values.tolist())
-        personal_overrides_folder = os.path.join(config.save_folder, f"data/{mantella_game_folder_path}/character_overrides")     
-        self.__apply_character_overrides(personal_overrides_folder, self.__character_df.columns.values.tolist())
+        personal_overrides_folder = os.path.join(config.save_folder, f"data/{mantella_game_folder_path}/character_overrides")
+        cache_file = os.path.join(config.save_folder, f"data/{mantella_game_folder_path}/character_database.cache")
+        cache_signature = self.__get_character_database_signature(path_to_character_df, [mod_overrides_folder, personal_overrides_folder])
+
+        if not self.__load_character_database_cache(cache_file, cache_signature):
+            try:
+                self.__character_df: pd.DataFrame = self.__get_character_df(path_to_character_df)
+            except:
+                logging.error(f'Unable to read / open {path_to_character_df}. If you have recently edited this file, please try reverting to a previous version. This error is normally due to using special characters, or saving the CSV in an incompatible format.')
+                input("Press Enter to exit.")
+            self.__character_index: character_index = character_index(self.__character_df)
+            
+            #Apply character overrides
+            self.__apply_character_overrides([mod_overrides_folder, personal_overrides_folder], self.__character_df.columns.values.tolist())
+            self.__save_character_database_cache(cache_file, cache_signature)
 
         self.__conversation_folder_path = config.save_folder + f"data/{mantella_game_folder_path}/conversations"
         conversation_log.game_path = self.__conversation_folder_path
@@ -69,6 +78,58 @@ class gameable(ABC):
         """ Return the path to the image file created by in-game screenshots"""
         pass
     
+    @utils.time_it
+    def __get_character_database_signature(self, path_to_character_df: str, overrides_folders: list[str]) -> list[Any]:
+        """Describes the state of all files the character database is built from. If any of them changes, so does the signature
+        """
+        signature: list[Any] = [self.CHARACTER_DATABASE_CACHE_VERSION]
+        files = [path_to_character_df]
+        for overrides_folder in overrides_folders:
+            if not os.path.exists(overrides_folder):
+                os.makedirs(overrides_folder)
+            else:
+                files.extend(os.path.join(overrides_folder, file) for file in os.listdir(overrides_folder) if os.path.splitext(file)[1] in (".json", ".csv"))
+        for file in files:
+            try:
+                stat = os.stat(file)
+                signature.append((os.path.abspath(file), stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((os.path.abspath(file), None, None))
+        return signature
+
+    @utils.time_it
+    def __load_character_database_cache(self, cache_file: str, cache_signature: list[Any]) -> bool:
+        """Loads the character database with all overrides applied from the cache, if the cache was built from the current files
+
+        Returns:
+            bool: True if the character database was loaded from the cache, False otherwise
+        """
+        if not os.path.exists(cache_file):
+            return False
+        try:
+            with open(cache_file, 'rb') as fp:
+                cache: dict[str, Any] = pickle.load(fp)
+            if cache.get("signature") != cache_signature:
+                return False
+            self.__character_df = cache["character_df"]
+            self.__character_index = cache["character_index"]
+            logging.debug(f'Loaded character database from {cache_file}')
+            return True
+        except Exception as e:
+            logging.debug(f'Could not load character database cache {cache_file}. It will be rebuilt. Error: {e}')
+            return False
+
+    @utils.time_it
+    def __save_character_database_cache(self, cache_file: str, cache_signature: list[Any]):
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            temp_file = cache_file + ".tmp"
+            with open(temp_file, 'wb') as fp:
+                pickle.dump({"signature": cache_signature, "character_df": self.__character_df, "character_index": self.__character_index}, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, cache_file) # only replace the old cache once the new one is complete
+        except Exception as e:
+            logging.warning(f'Could not save character database cache {cache_file}. Error: {e}')
+
     @utils.time_it
     def __get_character_df(self, file_name: str) -> pd.DataFrame:
         encoding = utils.get_file_encoding(file_name)
@@ -158,69 +219,29 @@ class gameable(ABC):
         pass
 
     @utils.time_it
-    def _get_matching_df_rows_matcher(self, base_id: str, character_name: str, race: str) -> pd.Series | None:
-        character_name_lower = character_name.lower()
-        race_lower = race.lower()
-        
-        full_id_len = 6
-        full_id_search = base_id[-full_id_len:].lstrip('0')  # Strip leading zeros from the last 6 characters
-
-        # Function to remove leading zeros from hexadecimal ID strings
-        def vectorized_remove_zeros(series):
-            return series.fillna('').astype(str).str.lstrip('0')
-        
-        def vectorized_partial_id_match(series, length):
-            str_series = series.fillna('').astype(str)
-            # Create mask for strings long enough
-            length_mask = str_series.str.len() >= length
-            # Apply different logic based on length
-            result = pd.Series('', index=series.index)  # Default to empty string
-            result[length_mask] = str_series[length_mask].str[-length:].str.lstrip('0')
-            result[~length_mask] = str_series[~length_mask].str.lstrip('0')
-            return result.str.lower()
-
-        df_id_cleaned = vectorized_remove_zeros(self.character_df['base_id']).str.lower()
-        id_match = df_id_cleaned == full_id_search.lower()
-        name_match = self.character_df['name'].astype(str).str.lower() == character_name_lower
-
-        race_match = self.character_df['race'].astype(str).str.lower() == race_lower
-
-        # Partial ID match with decreasing lengths
-        partial_id_match = pd.Series(False, index=self.character_df.index)
-        for length in [5, 4, 3]:
-            if partial_id_match.any():
-                break
-            partial_id_search = base_id[-length:].lstrip('0').lower()  # strip leading zeros from partial ID search
-            partial_id_match = vectorized_partial_id_match(self.character_df['base_id'], length) == partial_id_search
-
-        ordered_matchers = {
-            'name, ID, race': name_match & id_match & race_match, # match name, full ID, race (needed for Fallout 4 NPCs like Curie)
-            'name, ID': name_match & id_match, # match name and full ID
-            'name, partial ID, race': name_match & partial_id_match & race_match, # match name, partial ID, and race
-            'name, partial ID': name_match & partial_id_match, # match name and partial ID
-            'name, race': name_match & race_match, # match name and race
-            'name': name_match, # match just name
-            'ID': id_match # match just ID
-        }
-
-        for matcher in ordered_matchers:
-            view = self.character_df.loc[ordered_matchers[matcher]]
-            if view.shape[0] == 1: #If there is exactly one match
-                logging.info(f'Matched {character_name} in CSV by {matcher}')
-                return ordered_matchers[matcher]
-            
-        return None
+    def _get_matching_df_row(self, base_id: str, character_name: str, race: str) -> Hashable | None:
+        """Finds the row of a character in the character database
+
+        Returns:
+            Hashable | None: the label of the matching row, None if there is no unique match
+        """
+        match = self.__character_index.find(base_id, character_name, race)
+        if not match:
+            return None
+        matcher, row = match
+        logging.info(f'Matched {character_name} in CSV by {matcher}')
+        return row
 
     @utils.time_it
     def find_character_info(self, base_id: str, character_name: str, race: str, gender: int, ingame_voice_model: str):
         character_race = race.split('<')[1].split('Race ')[0] # TODO: check if this covers "character_currentrace.split('<')[1].split('Race ')[0]" from FO4
-        matcher = self._get_matching_df_rows_matcher(base_id, character_name, character_race)
-        if isinstance(matcher, type(None)):
+        row = self._get_matching_df_row(base_id, character_name, character_race)
+        if row is None:
             logging.info(f"Could not find {character_name} in {self.game_name_in_filepath}_characters.csv. Loading as a generic NPC.")
             character_info = self.load_unnamed_npc(character_name, character_race, gender, ingame_voice_model)
             is_generic_npc = True
         else:
-            result = self.character_df.loc[matcher]
+            result = self.character_df.loc[[row]]
             character_info = result.to_dict('records')[0]
             if (character_info['voice_model'] is None) or (pd.isnull(character_info['voice_model'])) or (character_info['voice_model'] == ''):
                 character_info['voice_model'] = self.find_best_voice_model(race, gender, ingame_voice_model) 
@@ -229,7 +250,53 @@ class gameable(ABC):
         return character_info, is_generic_npc
     
     @utils.time_it
-    def __apply_character_overrides(self, overrides_folder: str, character_df_column_headers: list[str]):
+    def __apply_character_overrides(self, overrides_folders: list[str], character_df_column_headers: list[str]):
+        """Applies all character overrides at once. All override records are read first and matched against the index,
+        then the updates are written to the character database column by column and the new characters are added with a single concat
+        """
+        records: list[tuple[str, str, str, dict[str, Any], list[Any]]] = []
+        for overrides_folder in overrides_folders:
+            records.extend(self.__read_character_overrides(overrides_folder, character_df_column_headers))
+        if len(records) == 0:
+            return
+
+        # Records are matched in order, so a later override can still update a character that was added or changed by an earlier one
+        updated_rows: dict[Hashable, dict[str, Any]] = {}
+        new_rows: dict[Hashable, dict[str, Any]] = {}
+        next_row_label = len(self.character_df.index)
+        for name, base_id, race, update_values, new_row in records:
+            matching_row = self._get_matching_df_row(base_id, name, race)
+            if matching_row is None: #character not in csv, add as new row
+                matching_row = next_row_label
+                next_row_label += 1
+                new_rows[matching_row] = dict(zip(character_df_column_headers, new_row))
+                character = new_rows[matching_row]
+            elif matching_row in new_rows: #character was added by an earlier override, update it
+                character = new_rows[matching_row]
+                character.update(update_values)
+            else: #character is in csv, update row
+                updated_rows.setdefault(matching_row, {}).update(update_values)
+                character = {entry: updated_rows[matching_row].get(entry, self.character_df.at[matching_row, entry]) for entry in ['base_id', 'name', 'race'] if entry in character_df_column_headers}
+            self.__character_index.add_row(matching_row, character.get('base_id'), character.get('name'), character.get('race'))
+
+        if len(updated_rows) > 0:
+            updates_df = pd.DataFrame.from_dict(updated_rows, orient='index')
+            for entry in updates_df.columns:
+                values = updates_df[entry].dropna()
+                self.character_df.loc[values.index, entry] = values
+        if len(new_rows) > 0:
+            new_rows_df = pd.DataFrame.from_dict(new_rows, orient='index', columns=character_df_column_headers)
+            self.__character_df = pd.concat([self.__character_df, new_rows_df])
+
+    @utils.time_it
+    def __read_character_overrides(self, overrides_folder: str, character_df_column_headers: list[str]) -> list[tuple[str, str, str, dict[str, Any], list[Any]]]:
+        """Reads the override files of a folder
+
+        Returns:
+            list[tuple[str, str, str, dict[str, Any], list[Any]]]: for each override record its name, base_id and race, 
+            the values to update an existing character with and the full row to add if the character does not exist yet
+        """
+        records: list[tuple[str, str, str, dict[str, Any], list[Any]]] = []
         if not os.path.exists(overrides_folder):
             os.makedirs(overrides_folder)
         override_files: list[str] = os.listdir(overrides_folder)
@@ -237,6 +304,7 @@ class gameable(ABC):
             try:
                 filename, extension = os.path.splitext(file)
                 full_path_file = os.path.join(overrides_folder,file)
+                file_records: list[tuple[str, str, str, dict[str, Any], list[Any]]] = []
                 if extension == ".json":
                     with open(full_path_file) as fp:
                         json_object = json.load(fp)
@@ -247,38 +315,30 @@ class gameable(ABC):
                             name = content.get("name", "")
                             base_id = content.get("base_id", "")
                             race = content.get("race", "")
-                            matcher = self._get_matching_df_rows_matcher(base_id, name, race)
-                            if isinstance(matcher, type(None)): #character not in csv, add as new row
-                                row = []
-                                for entry in character_df_column_headers:
-                                    value = content.get(entry, "")
-                                    row.append(value)
-                                self.character_df.loc[len(self.character_df.index)] = row
-                            else: #character is in csv, update row
-                                for entry in character_df_column_headers:
-                                    value = content.get(entry, None)
-                                    if value and value != "":
-                                        self.character_df.loc[matcher, entry] = value
+                            update_values = {}
+                            for entry in character_df_column_headers:
+                                value = content.get(entry, None)
+                                if value and value != "":
+                                    update_values[entry] = value
+                            new_row = [content.get(entry, "") for entry in character_df_column_headers]
+                            file_records.append((name, base_id, race, update_values, new_row))
                 elif extension == ".csv":
                     extra_df = self.__get_character_df(full_path_file)
-                    for i in range(extra_df.shape[0]):#for each row in df
-                        name = self.get_string_from_df(extra_df.iloc[i], "name")
-                        base_id = self.get_string_from_df(extra_df.iloc[i], "base_id")
-                        race = self.get_string_from_df(extra_df.iloc[i], "race")
-                        matcher = self._get_matching_df_rows_matcher(base_id, name, race)
-                        if isinstance(matcher, type(None)): #character not in csv, add as new row
-                            row = []
-                            for entry in character_df_column_headers:
-                                value = self.get_string_from_df(extra_df.iloc[i], entry)
-                                row.append(value)
-                            self.character_df.loc[len(self.character_df.index)] = row
-                        else: #character is in csv, update row
-                            for entry in character_df_column_headers:
-                                value = extra_df.iloc[i].get(entry, None)
-                                if value and not pd.isna(value) and value != "":
-                                    self.character_df.loc[matcher, entry] = value
+                    for content in extra_df.to_dict('records'):#for each row in df
+                        name = self.get_string_from_df(content, "name")
+                        base_id = self.get_string_from_df(content, "base_id")
+                        race = self.get_string_from_df(content, "race")
+                        update_values = {}
+                        for entry in character_df_column_headers:
+                            value = content.get(entry, None)
+                            if value and not pd.isna(value) and value != "":
+                                update_values[entry] = value
+                        new_row = [self.get_string_from_df(content, entry) for entry in character_df_column_headers]
+                        file_records.append((name, base_id, race, update_values, new_row))
+                records.extend(file_records) # only use files that could be read completely
             except Exception as e:
                 logging.log(logging.WARNING, f"Could not load character override file '{file}' in '{overrides_folder}'. Most likely there is an error in the formating of the file. Error: {e}")
+        return records
 
     @staticmethod
     @utils.time_it
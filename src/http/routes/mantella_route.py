@@ -1,5 +1,6 @@
 import json
 import logging
+import time
 from typing import Any, Hashable
 
 from fastapi import FastAPI, Request
@@ -12,6 +13,7 @@ from src.llm.llm_client import LLMClient
 from src.game_manager import GameStateManager
 from src.http.routes.routeable import routeable
 from src.http.communication_constants import communication_constants as comm_consts
+from src.http.session_recorder import session_recorder
 from src.tts.ttsable import ttsable
 from src.tts.xvasynth import xvasynth
 from src.tts.xtts import xtts
@@ -31,6 +33,7 @@ class mantella_route(routeable):
         self.__stt_secret_key_file = stt_secret_key_file
         self.__image_secret_key_file: str = image_secret_key_file
         self.__game: GameStateManager | None = None
+        self.__recorder: session_recorder | None = None
 
         # if not self._can_route_be_used():
         #     error_message = "MantellaSoftware settings faulty. Please check MantellaSoftware's window or log."
@@ -39,7 +42,7 @@ class mantella_route(routeable):
     @utils.time_it
     def _setup_route(self):
         if self.__game:
-            self.__game.end_conversation({})
+            self.__game.shutdown()
 
         # Determine which game we're running for and select the appropriate character file
         game: gameable
@@ -62,11 +65,18 @@ class mantella_route(routeable):
         chat_manager = ChatManager(game, self._config, tts, llm_client)
         self.__game = GameStateManager(game, chat_manager, self._config, self.__language_info, llm_client, self.__stt_secret_key_file, self.__secret_key_file)
 
+        if self._config.record_sessions and not self.__recorder:
+            self.__recorder = session_recorder.start(self._config.save_folder)
+        elif not self._config.record_sessions and self.__recorder:
+            session_recorder.stop()
+            self.__recorder = None
+
     @utils.time_it
     def add_route_to_server(self, app: FastAPI):
         @app.post("/mantella")
         async def mantella(request: Request):
             logging.debug('Received request')
+            received_at = time.perf_counter()
             if not self._can_route_be_used():
                 error_message = "MantellaSoftware settings faulty. Please check MantellaSoftware's window or log."
                 logging.error(error_message)
@@ -102,4 +112,6 @@ class mantella_route(routeable):
 
             if self._show_debug_messages:
                 logging.log(self._log_level_http_out, json.dumps(reply, indent=4))
+            if self.__recorder:
+                self.__recorder.record_exchange(received_json, reply, received_at)
             return reply
@@ -0,0 +1,25 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from src.config.config_loader import ConfigLoader
+from src.http.routes.routeable import routeable
+from src.metrics import metrics
+from src import utils
+
+class metrics_route(routeable):
+    """Route that serves the latencies of the conversation pipeline in the Prometheus text format
+
+    Args:
+        routeable (_type_): _description_
+    """
+    def __init__(self, config: ConfigLoader, show_debug_messages: bool = False) -> None:
+        super().__init__(config, show_debug_messages)
+
+    @utils.time_it
+    def _setup_route(self):
+        pass # the metrics are collected independently of the config
+
+    @utils.time_it
+    def add_route_to_server(self, app: FastAPI):
+        @app.get("/metrics")
+        async def get_metrics():
+            return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,120 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Any, ClassVar
+
+class session_recorder:
+    """Records the traffic of the /mantella route to a session file, so a session can be replayed later (see benchmarks/replay_session.py).
+
+    Every line of the session file is a JSON object with a "type":
+        - "session": the first line, with the time the recording started
+        - "exchange": a request of the game and the reply to it
+        - "llm" / "tts": a call to the LLM or the TTS while handling the requests. Only hashes of the input and output are stored,
+          so the file does not grow with the size of the prompt and a replay can check whether it sent the same prompts
+    All "time" values are seconds since the start of the recording
+    """
+    SESSION_FOLDER_NAME: ClassVar[str] = "sessions"
+    SESSION_FILE_VERSION: ClassVar[int] = 1
+    __active_recorder: ClassVar['session_recorder | None'] = None
+
+    def __init__(self, session_file: str) -> None:
+        self.__session_file: str = session_file
+        self.__started_at: float = time.perf_counter()
+        self.__lock: Lock = Lock()
+        os.makedirs(os.path.dirname(session_file), exist_ok=True)
+        self.__file = open(session_file, 'a', encoding='utf-8')
+        self.__write({"type": "session", "version": self.SESSION_FILE_VERSION, "started": datetime.datetime.now().isoformat()})
+        logging.log(23, f"Recording session to {session_file}")
+
+    @property
+    def session_file(self) -> str:
+        return self.__session_file
+
+    @staticmethod
+    def start(save_folder: str) -> 'session_recorder':
+        """Starts recording to a new session file in the save folder. Replaces the recorder that is currently recording
+
+        Args:
+            save_folder (str): the folder Mantella saves its data to
+
+        Returns:
+            session_recorder: the new recorder
+        """
+        session_recorder.stop()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        session_file = os.path.join(save_folder, "data", session_recorder.SESSION_FOLDER_NAME, f"session_{timestamp}.jsonl")
+        session_recorder.__active_recorder = session_recorder(session_file)
+        return session_recorder.__active_recorder
+
+    @staticmethod
+    def stop():
+        """Stops the recorder that is currently recording, if any
+        """
+        recorder = session_recorder.__active_recorder
+        session_recorder.__active_recorder = None
+        if recorder:
+            recorder.close()
+
+    @staticmethod
+    def get_active_recorder() -> 'session_recorder | None':
+        return session_recorder.__active_recorder
+
+    @staticmethod
+    def record_interaction(kind: str, input: Any, output: Any = None):
+        """Records a call to an external service (eg the LLM or the TTS) if a session is being recorded
+
+        Args:
+            kind (str): the kind of service, eg "llm" or "tts"
+            input (Any): what was sent to the service. Must be serializable to JSON
+            output (Any, optional): what the service returned. Must be serializable to JSON. Defaults to None.
+        """
+        recorder = session_recorder.__active_recorder
+        if not recorder:
+            return
+        record: dict[str, Any] = {"type": kind, "time": recorder.__get_elapsed(), "input_hash": session_recorder.get_hash(input)}
+        if output is not None:
+            record["output_hash"] = session_recorder.get_hash(output)
+        recorder.__write(record)
+
+    def record_exchange(self, request: dict[str, Any] | None, reply: dict[str, Any], received_at: float):
+        """Records a request of the game and the reply to it
+
+        Args:
+            request (dict[str, Any] | None): the JSON of the request
+            reply (dict[str, Any]): the JSON of the reply
+            received_at (float): the time.perf_counter() when the request was received
+        """
+        self.__write({
+            "type": "exchange",
+            "time": round(received_at - self.__started_at, 6),
+            "duration": round(time.perf_counter() - received_at, 6),
+            "request": request,
+            "reply": reply
+        })
+
+    def close(self):
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+    @staticmethod
+    def get_hash(value: Any) -> str:
+        text = value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def __get_elapsed(self) -> float:
+        return round(time.perf_counter() - self.__started_at, 6)
+
+    def __write(self, record: dict[str, Any]):
+        with self.__lock:
+            if self.__file.closed:
+                return
+            try:
+                self.__file.write(json.dumps(record, default=str) + "\n")
+                self.__file.flush() # the session should survive Mantella being closed mid-conversation
+            except OSError as e:
+                logging.warning(f"Could not write to session file {self.__session_file}: {e}")
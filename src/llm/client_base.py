@@ -1,5 +1,7 @@
 from abc import ABC
+import asyncio
 from threading import Lock
+import httpx
 import src.utils as utils
 from typing import AsyncGenerator, Any
 from openai import APIConnectionError, BadRequestError, OpenAI, AsyncOpenAI, RateLimitError
@@ -9,6 +11,7 @@ import tiktoken
 import os
 from pathlib import Path
 from src.llm.message_thread import message_thread
+from src.llm.token_count_cache import token_count_cache
 from src.llm.messages import message, image_message, user_message
 
 class LLMModelList:            
@@ -43,13 +46,19 @@ class ClientBase(ABC):
     api_token_limits = {}
     tiktoken_cache_dir = "data"
     os.environ["TIKTOKEN_CACHE_DIR"] = tiktoken_cache_dir
+    REQUEST_TIMEOUT: httpx.Timeout = httpx.Timeout(600.0, connect=5.0) # same as the default timeout of the openai package
+    TOKEN_COUNT_CACHE_SIZE: int = 2048
+    token_counts: token_count_cache = token_count_cache(TOKEN_COUNT_CACHE_SIZE) # shared by all clients, eg the LLM and the image client
 
-    def __init__(self, api_url: str, llm: str, llm_params: dict[str, Any], custom_token_count: str, secret_key_files: list[str]) -> None:
+    def __init__(self, api_url: str, llm: str, llm_params: dict[str, Any], custom_token_count: str, secret_key_files: list[str], connection_pool_size: int = 10, connection_idle_timeout: float = 30.0) -> None:
         super().__init__()
         self._generation_lock: Lock = Lock()
         self._model_name: str = llm
         self._base_url = self.__get_endpoint(api_url)
-        self._startup_async_client: AsyncOpenAI | None = None
+        self._connection_limits: httpx.Limits = httpx.Limits(max_connections=connection_pool_size, max_keepalive_connections=connection_pool_size, keepalive_expiry=connection_idle_timeout)
+        self._async_client: AsyncOpenAI | None = None
+        self._async_client_loop: asyncio.AbstractEventLoop | None = None
+        self._sync_client: OpenAI | None = None
         self._request_params: dict[str, Any] = llm_params
         self._image_client = None
 
@@ -100,35 +109,75 @@ class ClientBase(ABC):
     @utils.time_it
     def generate_async_client(self) -> AsyncOpenAI:
         """Generates a new AsyncOpenAI client already setup to be used right away.
-        Close the client after usage using 'await client.close()'
+        The client keeps a pool of connections alive between calls. Close the client after usage using 'await client.close()'
 
-        The client needs to be closed after every call (and a new one created for the next call) to avoid connection issues
-
-        Use :func:`streaming_call` for a normal streaming call to the LLM
+        Use :func:`streaming_call` for a normal streaming call to the LLM. It reuses one pooled client instead of generating a new one per call
 
         Returns:
             AsyncOpenAI: The new async client object
         """
-        return AsyncOpenAI(api_key=self._api_key, base_url=self._base_url, default_headers=self._header)
+        http_client = httpx.AsyncClient(limits=self._connection_limits, timeout=self.REQUEST_TIMEOUT)
+        return AsyncOpenAI(api_key=self._api_key, base_url=self._base_url, default_headers=self._header, http_client=http_client)
 
 
     @utils.time_it
     def generate_sync_client(self) -> OpenAI:
         """Generates a new OpenAI client already setup to be used right away.
-        Close the client after usage using 'client.close()'
+        The client keeps a pool of connections alive between calls. Close the client after usage using 'client.close()'
 
-        Use :func:`request_call` for a normal call to the LLM
+        Use :func:`request_call` for a normal call to the LLM. It reuses one pooled client instead of generating a new one per call
 
         Returns:
             OpenAI: The new sync client object
         """
-        return OpenAI(api_key=self._api_key, base_url=self._base_url, default_headers=self._header)
+        http_client = httpx.Client(limits=self._connection_limits, timeout=self.REQUEST_TIMEOUT)
+        return OpenAI(api_key=self._api_key, base_url=self._base_url, default_headers=self._header, http_client=http_client)
+
+
+    @utils.time_it
+    def _get_sync_client(self) -> OpenAI:
+        """Returns the pooled sync client, generating a new one if there is none yet or the last one was discarded
+        """
+        if not self._sync_client or self._sync_client.is_closed():
+            self._sync_client = self.generate_sync_client()
+        return self._sync_client
+
+
+    @utils.time_it
+    async def _get_async_client(self) -> AsyncOpenAI:
+        """Returns the pooled async client, generating a new one if there is none yet or the last one was discarded.
+        Pooled connections belong to the event loop they were opened in, so the client is also replaced if it was used in a different event loop
+        """
+        running_loop = asyncio.get_running_loop()
+        if self._async_client and not self._async_client.is_closed() and self._async_client_loop in (None, running_loop):
+            self._async_client_loop = running_loop
+            return self._async_client
+        
+        await self._discard_async_client()
+        self._async_client = self.generate_async_client()
+        self._async_client_loop = running_loop
+        return self._async_client
+
+
+    @utils.time_it
+    async def _discard_async_client(self):
+        """Closes the pooled async client, eg after a broken connection. The next call starts with a fresh connection pool
+        """
+        if self._async_client:
+            if self._async_client_loop in (None, asyncio.get_running_loop()):
+                try:
+                    await self._async_client.close()
+                except Exception as e:
+                    logging.debug(f"Could not close LLM client: {e}")
+            # else: the connections of the old event loop can not be closed from this one. They are dropped together with the client
+            self._async_client = None
+            self._async_client_loop = None
 
 
     @utils.time_it
     def request_call(self, messages: message | message_thread) -> str | None:
         """A standard sync request call to the LLM. 
-        This method generates a new client, calls 'client.chat.completions.create', returns the result and closes when finished
+        This method uses the pooled client, calls 'client.chat.completions.create' and returns the result
 
         Args:
             messages (conversation_thread): The message thread of the conversation
@@ -137,7 +186,7 @@ class ClientBase(ABC):
             str | None: The reply of the LLM
         """
         with self._generation_lock:
-            sync_client = self.generate_sync_client()        
+            sync_client = self._get_sync_client()
             chat_completion = None
             logging.info('Getting LLM response...')
 
@@ -155,8 +204,6 @@ class ClientBase(ABC):
             except RateLimitError:
                 logging.warning('Could not connect to LLM API, retrying in 5 seconds...')
                 time.sleep(5)
-            finally:
-                sync_client.close()
 
             if not chat_completion or chat_completion.choices.__len__() < 1 or not chat_completion.choices[0].message.content:
                 logging.info(f"LLM Response failed")
@@ -169,7 +216,7 @@ class ClientBase(ABC):
     @utils.time_it
     async def streaming_call(self, messages: message | message_thread, is_multi_npc: bool) -> AsyncGenerator[str | None, None]:
         """A standard streaming call to the LLM. Forwards the output of 'client.chat.completions.create' 
-        This method generates a new client, calls 'client.chat.completions.create' in a streaming way, yields the result immediately and closes when finished
+        This method uses the pooled client, calls 'client.chat.completions.create' in a streaming way and yields the result immediately
 
         Args:
             messages (message_thread): The message thread of the conversation
@@ -184,11 +231,7 @@ class ClientBase(ABC):
         with self._generation_lock:
             logging.info('Getting LLM response...')
 
-            if self._startup_async_client:
-                async_client = self._startup_async_client
-                self._startup_async_client = None # do not reuse the same client
-            else:
-                async_client = self.generate_async_client()
+            async_client = await self._get_async_client()
 
             request_params = self._request_params.copy() # copy of self._request_params to allow temporary override
             if is_multi_npc: # override max_tokens to be at least 250 in radiant / multi-NPC conversations
@@ -208,16 +251,20 @@ class ClientBase(ABC):
                 if self._image_client:
                     openai_messages = self._image_client.add_image_to_messages(openai_messages, vision_hints)
 
-                async for chunk in await async_client.chat.completions.create(
+                stream = await async_client.chat.completions.create(
                     model=self.model_name, 
                     messages=openai_messages, 
                     stream=True,
                     **request_params,
-                ):
-                    if chunk and chunk.choices and chunk.choices.__len__() > 0 and chunk.choices[0].delta:
-                        yield chunk.choices[0].delta.content
-                    else:
-                        break
+                )
+                try:
+                    async for chunk in stream:
+                        if chunk and chunk.choices and chunk.choices.__len__() > 0 and chunk.choices[0].delta:
+                            yield chunk.choices[0].delta.content
+                        else:
+                            break
+                finally:
+                    await stream.response.aclose() # hand the connection back to the pool, even if the stream was not read until the end
             except Exception as e:
                 if isinstance(e, APIConnectionError):
                     if e.code in [401, 'invalid_api_key']: # incorrect API key
@@ -228,15 +275,17 @@ class ClientBase(ABC):
                         logging.error(f"Invalid API key. If you are trying to connect to {service_connection_attempt}, please choose an {service_connection_attempt} model via the 'model' setting in MantellaSoftware/config.ini. If you are instead trying to connect to a local model, please ensure the service is running.")
                     else:
                         logging.error(f"LLM API Error: {e}")
+                    await self._discard_async_client() # do not reuse connections that might be broken
                 elif isinstance(e, BadRequestError):
                     if (e.type == 'invalid_request_error') and (self._image_client): # invalid request
                         logging.error(f"Invalid request. Try disabling Vision in Mantella's settings and try again.")
                     else:
                         logging.error(f"LLM API Error: {e}")
+                elif isinstance(e, httpx.TransportError): # connection dropped while the response was streamed
+                    logging.error(f"LLM API Error: {e}")
+                    await self._discard_async_client() # do not reuse connections that might be broken
                 else:
                     logging.error(f"LLM API Error: {e}")
-            finally:
-                await async_client.close()
 
 
     @utils.time_it
@@ -359,25 +408,25 @@ For more information, see here: https://art-from-the-machine.github.io/Mantella/
     def num_tokens_from_messages(self, messages: message_thread | list[message]) -> int:
         """Returns the number of tokens used by a list of messages
         """
-        messages_to_check = []
         if isinstance(messages, message_thread):
-            messages_to_check = messages.get_openai_messages()
+            num_tokens = messages.count_tokens(self.num_tokens_from_openai_message) # only measures messages that have changed since the last count
         else:
+            num_tokens = 0
             for m in messages:
-                messages_to_check.append(m.get_openai_message())
-
-        # note: this calculation is based on GPT-3.5, future models may deviate from this
-        num_tokens = 0
-        for message in messages_to_check:
-            num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
-            for key, value in message.items():
-                if isinstance(value, str):
-                    num_tokens += len(self._encoding.encode(value))
-                    if key == "name":  # if there's a name, the role is omitted
-                        num_tokens += -1  # role is always required and always 1 token
+                num_tokens += self.num_tokens_from_openai_message(m)
         num_tokens += 2  # every reply is primed with <im_start>assistant
         return num_tokens
     
+    def num_tokens_from_openai_message(self, message_to_measure: message) -> int:
+        # note: this calculation is based on GPT-3.5, future models may deviate from this
+        num_tokens = 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
+        for key, value in message_to_measure.get_openai_message().items():
+            if isinstance(value, str):
+                num_tokens += ClientBase.token_counts.count_tokens(self._encoding, value)
+                if key == "name":  # if there's a name, the role is omitted
+                    num_tokens += -1  # role is always required and always 1 token
+        return num_tokens
+    
     @utils.time_it
     def num_tokens_from_message(self, message_to_measure: message | str) -> int:
         text: str = ""
@@ -395,7 +444,7 @@ For more information, see here: https://art-from-the-machine.github.io/Mantella/
     
     @utils.time_it
     def calculate_tokens_from_text(self, text: str) -> int:
-        return len(self._encoding.encode(text))
+        return ClientBase.token_counts.count_tokens(self._encoding, text)
     
     @utils.time_it
     def is_text_too_long(self, text: str, token_limit_percent: float) -> bool:
@@ -19,7 +19,7 @@ class ImageClient(ClientBase):
         else: # default to base LLM config values
             setup_values = {'api_url': config.llm_api, 'llm': config.llm, 'llm_params': config.llm_params, 'custom_token_count': config.custom_token_count}
         
-        super().__init__(**setup_values, secret_key_files=[image_secret_key_file, secret_key_file])
+        super().__init__(**setup_values, secret_key_files=[image_secret_key_file, secret_key_file], connection_pool_size=config.llm_connection_pool_size, connection_idle_timeout=config.llm_connection_idle_timeout)
 
         if self.__custom_vision_model:
             if self._is_local:
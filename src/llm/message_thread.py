@@ -53,6 +53,24 @@ class message_thread():
     def get_openai_messages(self) -> list[ChatCompletionMessageParam]:
         return message_thread.transform_to_openai_messages(self.__messages)
 
+    @utils.time_it
+    def count_tokens(self, message_measurer: Callable[[message], int]) -> int:
+        """Counts the tokens of all messages in this thread. 
+        The count of each message is kept until the message changes, so only new or changed messages are measured again
+
+        Args:
+            message_measurer (Callable[[message], int]): returns the number of tokens of a single message
+
+        Returns:
+            int: the sum of the tokens of all messages
+        """
+        total = 0
+        for m in self.__messages:
+            if m.token_count is None:
+                m.token_count = message_measurer(m)
+            total += m.token_count
+        return total
+
     def add_message(self, new_message: user_message | assistant_message | image_message | image_description_message):
         self.__messages.append(new_message)
 
@@ -68,19 +86,25 @@ class message_thread():
                 self.__messages.append(new_message)
     
     @utils.time_it
-    def reload_message_thread(self, new_prompt: str, text_measurer: Callable[[str], int], max_tokens: int):
+    def reload_message_thread(self, new_prompt: str, message_measurer: Callable[[message], int], max_tokens: int):
         """Reloads this message_thread with a new system_message prompt and drops all but the last X messages
 
         Args:
             new_prompt (str): the new prompt for the system_message
-            last_messages_to_keep (int): how many of the last messages to keep
+            message_measurer (Callable[[message], int]): returns the number of tokens of a single message. Messages that have been counted before and have not changed since are not measured again
+            max_tokens (int): the max number of tokens of the messages to keep
         """
         result: list[message] = []
         result.append(system_message(new_prompt))
         messages_to_keep: list[message]  = []
         used_tokens = 0
-        for talk_message in reversed(self.get_talk_only()):
-            used_tokens += text_measurer(talk_message.get_formatted_content())
+        # the kept messages are the same objects, so their token counts carry over to the reloaded thread
+        for talk_message in reversed(self.__messages):
+            if not isinstance(talk_message, (assistant_message, user_message)) or talk_message.is_system_generated_message:
+                continue
+            if talk_message.token_count is None:
+                talk_message.token_count = message_measurer(talk_message)
+            used_tokens += talk_message.token_count
             if used_tokens < max_tokens:
                 messages_to_keep.append(talk_message)
             else:
@@ -89,6 +113,16 @@ class message_thread():
         result.extend(messages_to_keep)
         self.__messages = result
 
+    @utils.time_it
+    def set_system_prompt(self, new_prompt: str):
+        """Replaces the prompt of the system_message and keeps all other messages as they are
+
+        Args:
+            new_prompt (str): the new prompt for the system_message
+        """
+        if len(self.__messages) > 0 and isinstance(self.__messages[0], system_message):
+            self.__messages[0].text = new_prompt
+
     @utils.time_it
     def get_talk_only(self, include_system_generated_messages: bool = False) -> list[message]:
         """Returns a deepcopy of the messages in the conversation thread without the system_message
@@ -12,6 +12,7 @@ class message(ABC):
         self.__text: str = text
         self.__is_multi_npc_message: bool = False
         self.__is_system_generated_message = is_system_generated_message
+        self.__token_count: int | None = None
 
     @property
     def text(self) -> str:
@@ -20,6 +21,7 @@ class message(ABC):
     @text.setter
     def text(self, text: str):
         self.__text = text
+        self.token_count = None
 
     @property
     def is_multi_npc_message(self) -> bool:
@@ -27,7 +29,19 @@ class message(ABC):
     
     @is_multi_npc_message.setter
     def is_multi_npc_message(self, is_multi_npc_message: bool):
-        self.__is_multi_npc_message = is_multi_npc_message
+        if self.__is_multi_npc_message != is_multi_npc_message:
+            self.__is_multi_npc_message = is_multi_npc_message
+            self.token_count = None
+
+    @property
+    def token_count(self) -> int | None:
+        """The number of tokens of this message as last counted by a message_thread. None if the message has changed since
+        """
+        return self.__token_count
+    
+    @token_count.setter
+    def token_count(self, token_count: int | None):
+        self.__token_count = token_count
 
     @property
     def is_system_generated_message(self) -> bool:
@@ -81,6 +95,7 @@ class assistant_message(message):
     
     def add_sentence(self, new_sentence: sentence):
         self.__sentences.append(new_sentence)
+        self.token_count = None
 
     def get_formatted_content(self) -> str:
         if len(self.__sentences) < 1:
@@ -135,6 +150,7 @@ class user_message(message):
     def add_event(self, events: list[str]):
         for event in events:
             self.__ingame_events.append(event)
+        self.token_count = None
     
     def count_ingame_events(self) -> int:
         return len(self.__ingame_events)
@@ -147,6 +163,7 @@ class user_message(message):
     
     def set_ingame_time(self, time: str, time_group: str):
         self.__time = time, time_group
+        self.token_count = None
 
 
 class image_message(message):
@@ -1,74 +1,115 @@
 import logging
-import queue
 import threading
+import time
+from collections import deque
 from src.llm.sentence import sentence
 from src import utils
+from src.metrics import metrics
 
 class sentence_queue:
+    """The queue of voiced sentences between the ChatManager generating them and the conversation handing them to the game.
+    All access goes through a single condition variable, so a blocked get never keeps clear() or put_at_front() from running
+    """
     __logging_level = 42
     __should_log = False
 
     def __init__(self) -> None:
-        self.__queue: queue.Queue[sentence] = queue.Queue[sentence]()
-        self.__get_lock: threading.Lock = threading.Lock()
-        self.__put_lock: threading.Lock = threading.Lock()
+        self.__queue: deque[sentence] = deque()
+        self.__condition: threading.Condition = threading.Condition()
         self.__is_more_to_come: bool = False
-    
+        self.__clear_count: int = 0 # incremented by clear(), so waiting gets know that they have been woken up by it
+
     @property
     def is_more_to_come(self) -> bool:
         return self.__is_more_to_come
-    
+
     @is_more_to_come.setter
     def is_more_to_come(self, value: bool):
-        self.__is_more_to_come = value
+        with self.__condition:
+            self.__is_more_to_come = value
+            # gets waiting for more sentences return None if there are no more to come
+            self.__condition.notify_all()
+
+    def __len__(self) -> int:
+        with self.__condition:
+            return len(self.__queue)
 
     @utils.time_it
-    def get_next_sentence(self) -> sentence | None:
-        self.log(f"Trying to aquire get_lock to get next sentence")
-        with self.__get_lock:
-            if self.__queue.qsize() > 0 or self.__is_more_to_come:
-                retrieved_sentence = self.__queue.get()
-                self.log(f"Retrieved '{retrieved_sentence.sentence}'")
-                return retrieved_sentence
-            else:
-                self.log(f"Nothing to get from queue, returning None")
-                return None
-    
+    def get_next_sentence(self, timeout: float | None = None) -> sentence | None:
+        """Returns the next sentence. If the queue is empty but more sentences are to come, waits until one is put in the queue
+
+        Args:
+            timeout (float | None, optional): the max number of seconds to wait for a sentence. Waits indefinitely if None. Defaults to None.
+
+        Returns:
+            sentence | None: the next sentence. None if there are no more sentences to come, the queue has been cleared while waiting or the timeout has passed
+        """
+        wait_start = time.perf_counter()
+        deadline = wait_start + timeout if timeout is not None else None
+        with self.__condition:
+            clear_count = self.__clear_count
+            while len(self.__queue) == 0:
+                if not self.__is_more_to_come or self.__clear_count != clear_count:
+                    self.log(f"Nothing to get from queue, returning None")
+                    return None
+                remaining = deadline - time.perf_counter() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self.log(f"Timed out waiting for the next sentence, returning None")
+                    return None
+                self.__condition.wait(remaining)
+            retrieved_sentence = self.__queue.popleft()
+        metrics.observe(metrics.SENTENCE_QUEUE_WAIT, time.perf_counter() - wait_start)
+        self.log(f"Retrieved '{retrieved_sentence.sentence}'")
+        return retrieved_sentence
+
+    @utils.time_it
+    def peek(self) -> sentence | None:
+        """Returns the next sentence without removing it from the queue. Does not wait
+
+        Returns:
+            sentence | None: the next sentence or None if the queue is empty
+        """
+        with self.__condition:
+            return self.__queue[0] if len(self.__queue) > 0 else None
+
     @utils.time_it
     def put(self, new_sentence: sentence):
-        self.log(f"Trying to aquire put_lock to put '{new_sentence.sentence}'")
-        with self.__put_lock:
-            self.log(f"Putting '{new_sentence.sentence}'")
-            self.__queue.put(new_sentence)
+        self.log(f"Putting '{new_sentence.sentence}'")
+        with self.__condition:
+            self.__queue.append(new_sentence)
+            self.__condition.notify()
+
+    @utils.time_it
+    def put_last(self, last_sentence: sentence):
+        """Puts the last sentence of a response and marks that no more sentences are to come, in one step.
+        A waiting get either returns this sentence or, if it is taken by another get, returns None. It can never see the end of the response before the last sentence
+
+        Args:
+            last_sentence (sentence): the last sentence of the response
+        """
+        self.log(f"Putting the last sentence '{last_sentence.sentence}'")
+        with self.__condition:
+            self.__queue.append(last_sentence)
+            self.__is_more_to_come = False
+            self.__condition.notify_all()
 
     @utils.time_it
     def put_at_front(self, new_sentence: sentence):
-        self.log(f"Trying to aquire get_lock to put_at_front '{new_sentence.sentence}'")
-        with self.__get_lock:
-            self.log(f"Trying to aquire put_lock to put_at_front '{new_sentence.sentence}'")
-            with self.__put_lock:            
-                sentence_list: list[sentence] = []
-                try:
-                    while True:
-                        sentence_list.append(self.__queue.get_nowait() )
-                except queue.Empty:
-                    pass
-                self.__queue.put_nowait(new_sentence)
-                for s in sentence_list:
-                    self.__queue.put_nowait(s)
+        self.log(f"Putting '{new_sentence.sentence}' at the front")
+        with self.__condition:
+            self.__queue.appendleft(new_sentence)
+            self.__condition.notify()
 
     @utils.time_it
     def clear(self):
-        self.log(f"Trying to aquire get_lock to clear()")
-        with self.__get_lock:
-            self.log(f"Trying to aquire put_lock to clear()")
-            with self.__put_lock:
-                try:
-                    while True:                
-                        self.__queue.get_nowait()
-                except queue.Empty:
-                    pass
-    
+        """Removes all sentences from the queue and wakes up all waiting gets, which return None
+        """
+        self.log(f"Clearing the queue")
+        with self.__condition:
+            self.__queue.clear()
+            self.__clear_count += 1
+            self.__condition.notify_all()
+
     @utils.time_it
     def log(self, text: str):
         if(self.__should_log):
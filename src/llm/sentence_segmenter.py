@@ -0,0 +1,123 @@
+import unicodedata
+from src import utils
+
+class sentence_segmenter:
+    """Splits the text streamed by the LLM into sentences.
+    Keeps track of the last sentence end and the count of asterisks while the text is fed in,
+    so every token is only scanned once instead of rescanning the whole text received so far.
+    """
+    MAX_SENTENCE_LENGTH: int = 148 # max length of a voiceline in Fallout 4. Counted in bytes when shortening sentences
+    END_OF_SENTENCE_CHARS: list[str] = [unicodedata.normalize('NFKC', char) for char in ['.', '?', '!', ':', ';', '。', '？', '！', '；', '：']]
+    CLOSING_CHARS: list[str] = ['*',')','}',']']
+
+    def __init__(self, end_of_sentence_chars: list[str] | None = None, max_sentence_length: int = MAX_SENTENCE_LENGTH) -> None:
+        if end_of_sentence_chars is None:
+            end_of_sentence_chars = self.END_OF_SENTENCE_CHARS
+        self.__end_of_sentence_chars: set[str] = set(end_of_sentence_chars)
+        self.__max_sentence_length: int = max_sentence_length
+        self.__chunks: list[str] = []
+        self.__length: int = 0
+        self.__last_end_of_sentence: int = -1
+        self.__asterisk_count: int = 0
+
+    @property
+    def buffer(self) -> str:
+        """The text that has been fed in but not yet returned as part of a sentence"""
+        return ''.join(self.__chunks)
+
+    def feed(self, content: str) -> str | None:
+        """Adds the next piece of streamed text and returns a sentence if one has been completed by it
+
+        Args:
+            content (str): the text to add, usually a single token of the LLM stream
+
+        Returns:
+            str | None: the completed sentence(s) up to the last sentence end within the max sentence length, None if there is no complete sentence yet
+        """
+        self.__add(content)
+        if (self.__last_end_of_sentence == -1) or (self.__asterisk_count % 2 != 0):
+            return None
+
+        text = self.buffer
+        # Split the sentence at the last punctuation mark
+        split_index = self.__last_end_of_sentence + 1
+        remaining_content = text[split_index:]
+        # if sentence is contained in bracket or asterisk, include the bracket / asterisk
+        if remaining_content.strip() in self.CLOSING_CHARS:
+            sentence = text
+            remaining_content = ''
+        else:
+            sentence = text[:split_index]
+        self.__reset(remaining_content)
+        return sentence
+
+    def push_front(self, text: str):
+        """Puts text back in front of the text that has not been returned yet, eg to process it again with the next token
+
+        Args:
+            text (str): the text to put back
+        """
+        self.__reset(text + self.buffer)
+
+    @utils.time_it
+    def limit_length(self, sentence: str) -> str:
+        """Shortens a sentence to the max sentence length in bytes. Prefers splitting after a comma, then after a space.
+        The part that was cut off is put back in front of the remaining text to become part of the next sentence
+
+        Args:
+            sentence (str): the sentence to shorten
+
+        Returns:
+            str: the sentence, shortened if needed
+        """
+        overflow = ''
+        while len(sentence.encode('utf-8')) > self.__max_sentence_length:
+            # never split after the last character, otherwise the sentence would not get any shorter
+            search_end = min(self.__max_sentence_length, len(sentence) - 1)
+            split_index = -1
+            for p in [',', ' ']: # First look for comma, then space
+                split_index = sentence.rfind(p, 0, search_end)
+                if split_index != -1:
+                    break
+            if split_index == -1: # no comma or space to split at, cut after the last character that fits
+                split_index = len(sentence.encode('utf-8')[:self.__max_sentence_length].decode('utf-8', errors='ignore')) - 1
+            overflow = sentence[split_index + 1:] + overflow
+            sentence = sentence[:split_index + 1]
+        if overflow:
+            self.push_front(overflow)
+        return sentence
+
+    @staticmethod
+    def split_speaker_keyword(sentence: str) -> tuple[str, str] | None:
+        """Splits a sentence of the form 'keyword: text'. The LLM uses this to switch to another speaker or to trigger an action
+
+        Args:
+            sentence (str): the sentence to check
+
+        Returns:
+            tuple[str, str] | None: the keyword and the text after the colon, None if the sentence does not contain a colon
+        """
+        content_edit = unicodedata.normalize('NFKC', sentence)
+        if ':' not in content_edit:
+            return None
+        parts = content_edit.split(':', 1)
+        keyword_extraction = parts[0].strip().lstrip("*").lstrip('"').strip() #This is very rough. Should use a Regex
+        return keyword_extraction, parts[1].strip()
+
+    def __add(self, text: str):
+        # Only the part of the text that falls within the max sentence length can contain a sentence end
+        offset = self.__length
+        for i in range(max(0, min(len(text), self.__max_sentence_length - offset))):
+            if text[i] in self.__end_of_sentence_chars:
+                self.__last_end_of_sentence = offset + i
+        self.__asterisk_count += text.count('*')
+        self.__chunks.append(text)
+        self.__length += len(text)
+
+    def __reset(self, text: str):
+        self.__chunks = []
+        self.__length = 0
+        self.__last_end_of_sentence = -1
+        self.__asterisk_count = 0
+        if text:
+            self.__add(text)
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+import hashlib
+from threading import Lock
+import tiktoken
+from src.metrics import metrics
+
+class token_count_cache:
+    """A bounded least-recently-used cache of token counts.
+    The same texts (prompts, bios, summaries, past messages) are measured over and over during a conversation.
+    Entries are keyed by the encoding and a hash of the text, so long texts are not kept in memory.
+    Hits and misses are counted in the metrics served by the /metrics route
+    """
+    def __init__(self, max_size: int) -> None:
+        self.__max_size: int = max_size
+        self.__counts: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+        self.__lock: Lock = Lock()
+
+    def __len__(self) -> int:
+        return self.__counts.__len__()
+
+    def count_tokens(self, encoding: tiktoken.Encoding, text: str) -> int:
+        """Returns the number of tokens of a text, only encoding it if it has not been counted recently
+
+        Args:
+            encoding (tiktoken.Encoding): the encoding to count the tokens with
+            text (str): the text to count the tokens of
+
+        Returns:
+            int: the number of tokens of the text
+        """
+        key = (encoding.name, hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest())
+        with self.__lock:
+            count = self.__counts.get(key)
+            if count is not None:
+                self.__counts.move_to_end(key)
+        if count is not None:
+            metrics.increment(metrics.TOKEN_COUNT_CACHE_HITS)
+            return count
+
+        count = len(encoding.encode(text)) # encode outside of the lock, it is the expensive part
+        metrics.increment(metrics.TOKEN_COUNT_CACHE_MISSES)
+        with self.__lock:
+            self.__counts[key] = count
+            self.__counts.move_to_end(key)
+            while len(self.__counts) > self.__max_size:
+                self.__counts.popitem(last=False)
+        return count
+
+    def clear(self):
+        with self.__lock:
+            self.__counts.clear()
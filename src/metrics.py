@@ -0,0 +1,155 @@
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import ClassVar, Iterator
+
+@dataclass
+class metric_definition:
+    name: str
+    kind: str # "counter" or "histogram"
+    help: str
+    buckets: tuple[float, ...] = () # upper bounds of the histogram buckets, without +Inf
+
+@dataclass
+class histogram_values:
+    bucket_counts: list[int]
+    count: int = 0
+    sum: float = 0.0
+
+@dataclass
+class metric_values:
+    counters: dict[tuple[tuple[str, str], ...], float] = field(default_factory=dict)
+    histograms: dict[tuple[tuple[str, str], ...], histogram_values] = field(default_factory=dict)
+
+class metrics:
+    """Counters and histograms of the stages of the conversation pipeline, served in the Prometheus text format by the /metrics route.
+    Values are kept in memory from the start of Mantella and are only updated with a lock, so they can be recorded from any thread
+    """
+    SECONDS_BUCKETS: ClassVar[tuple[float, ...]] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    FAST_SECONDS_BUCKETS: ClassVar[tuple[float, ...]] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+    TOKENS_PER_SECOND_BUCKETS: ClassVar[tuple[float, ...]] = (5, 10, 20, 40, 60, 80, 120, 160, 240, 320)
+
+    LLM_TIME_TO_FIRST_TOKEN: ClassVar[str] = "mantella_llm_time_to_first_token_seconds"
+    LLM_TOKENS_PER_SECOND: ClassVar[str] = "mantella_llm_tokens_per_second"
+    LLM_RESPONSES: ClassVar[str] = "mantella_llm_responses_total"
+    LLM_COMPLETION_TOKENS: ClassVar[str] = "mantella_llm_completion_tokens_total"
+    SENTENCE_SEGMENTATION: ClassVar[str] = "mantella_sentence_segmentation_seconds"
+    TTS_SYNTHESIS: ClassVar[str] = "mantella_tts_synthesis_seconds"
+    LIP_GENERATION: ClassVar[str] = "mantella_lip_generation_seconds"
+    PREPARE_SENTENCE_FOR_GAME: ClassVar[str] = "mantella_prepare_sentence_for_game_seconds"
+    SENTENCE_QUEUE_WAIT: ClassVar[str] = "mantella_sentence_queue_wait_seconds"
+    STT_TRANSCRIPTION: ClassVar[str] = "mantella_stt_transcription_seconds"
+    INTERRUPTION: ClassVar[str] = "mantella_interruption_seconds"
+    TOKEN_COUNT_CACHE_HITS: ClassVar[str] = "mantella_token_count_cache_hits_total"
+    TOKEN_COUNT_CACHE_MISSES: ClassVar[str] = "mantella_token_count_cache_misses_total"
+
+    __definitions: ClassVar[dict[str, metric_definition]] = {d.name: d for d in [
+        metric_definition(LLM_TIME_TO_FIRST_TOKEN, "histogram", "Time from sending a streaming request to the LLM until the first token arrives.", SECONDS_BUCKETS),
+        metric_definition(LLM_TOKENS_PER_SECOND, "histogram", "Tokens per second the LLM streamed a response with, from the first token to the end of the response.", TOKENS_PER_SECOND_BUCKETS),
+        metric_definition(LLM_RESPONSES, "counter", "Number of LLM responses that were streamed."),
+        metric_definition(LLM_COMPLETION_TOKENS, "counter", "Number of tokens the LLM responded with."),
+        metric_definition(SENTENCE_SEGMENTATION, "histogram", "Time spent splitting the LLM stream of a response into sentences.", FAST_SECONDS_BUCKETS),
+        metric_definition(TTS_SYNTHESIS, "histogram", "Time the TTS took to synthesize a voiceline.", SECONDS_BUCKETS),
+        metric_definition(LIP_GENERATION, "histogram", "Time spent generating the lip file (and the fuz file for Fallout 4) of a voiceline.", SECONDS_BUCKETS),
+        metric_definition(PREPARE_SENTENCE_FOR_GAME, "histogram", "Time spent copying the voiceline files of a sentence to the mod folder.", FAST_SECONDS_BUCKETS),
+        metric_definition(SENTENCE_QUEUE_WAIT, "histogram", "Time the game waited for the next sentence of the sentence queue.", SECONDS_BUCKETS),
+        metric_definition(STT_TRANSCRIPTION, "histogram", "Time the speech-to-text took to transcribe a mic input.", SECONDS_BUCKETS),
+        metric_definition(INTERRUPTION, "histogram", "Time it took to stop a response that was still being generated, eg when the player interrupted the NPC.", SECONDS_BUCKETS),
+        metric_definition(TOKEN_COUNT_CACHE_HITS, "counter", "Number of token counts that were answered from the token count cache."),
+        metric_definition(TOKEN_COUNT_CACHE_MISSES, "counter", "Number of texts that had to be tokenized because their token count was not cached."),
+    ]}
+    __values: ClassVar[dict[str, metric_values]] = {}
+    __lock: ClassVar[Lock] = Lock()
+
+    @staticmethod
+    def increment(name: str, amount: float = 1.0, **labels: str):
+        """Adds to a counter
+
+        Args:
+            name (str): the name of the counter, one of the constants of this class
+            amount (float, optional): the amount to add. Defaults to 1.0.
+            **labels (str): the labels of the time series, eg backend="piper"
+        """
+        key = tuple(sorted(labels.items()))
+        with metrics.__lock:
+            values = metrics.__values.setdefault(name, metric_values())
+            values.counters[key] = values.counters.get(key, 0.0) + amount
+
+    @staticmethod
+    def observe(name: str, value: float, **labels: str):
+        """Adds a value to a histogram
+
+        Args:
+            name (str): the name of the histogram, one of the constants of this class
+            value (float): the observed value, eg a duration in seconds
+            **labels (str): the labels of the time series, eg backend="piper"
+        """
+        buckets = metrics.__definitions[name].buckets
+        key = tuple(sorted(labels.items()))
+        with metrics.__lock:
+            values = metrics.__values.setdefault(name, metric_values())
+            histogram = values.histograms.get(key)
+            if not histogram:
+                histogram = histogram_values([0] * len(buckets))
+                values.histograms[key] = histogram
+            for i, upper_bound in enumerate(buckets):
+                if value <= upper_bound:
+                    histogram.bucket_counts[i] += 1
+                    break
+            histogram.count += 1
+            histogram.sum += value
+
+    @staticmethod
+    @contextmanager
+    def measure(name: str, **labels: str) -> Iterator[None]:
+        """Observes the time spent in the with-block in seconds, also if the block raises
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def reset():
+        with metrics.__lock:
+            metrics.__values = {}
+
+    @staticmethod
+    def render() -> str:
+        """Returns all metrics in the Prometheus text exposition format (version 0.0.4)
+        """
+        lines: list[str] = []
+        with metrics.__lock:
+            for name, definition in metrics.__definitions.items():
+                lines.append(f"# HELP {name} {definition.help}")
+                lines.append(f"# TYPE {name} {definition.kind}")
+                values = metrics.__values.get(name)
+                if not values:
+                    continue
+                for labels, counter in values.counters.items():
+                    lines.append(f"{name}{metrics.__format_labels(labels)} {metrics.__format_value(counter)}")
+                for labels, histogram in values.histograms.items():
+                    cumulative = 0
+                    for upper_bound, count in zip(definition.buckets, histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{metrics.__format_labels(labels + (('le', metrics.__format_value(upper_bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{metrics.__format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{metrics.__format_labels(labels)} {metrics.__format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{metrics.__format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def __format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+        if len(labels) == 0:
+            return ""
+        escaped = [(key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for key, value in labels]
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+    @staticmethod
+    def __format_value(value: float) -> str:
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(float(value)) if not float(value).is_integer() else str(int(value))
@@ -1,14 +1,17 @@
 import asyncio
-from threading import Lock
+from contextlib import suppress
+from concurrent.futures import Future, wait
+from threading import Lock, Thread
 import wave
 import logging
 import time
 import re
-import unicodedata
+from dataclasses import dataclass, field
 from openai import APIConnectionError
 from src.games.gameable import gameable
 from src.conversation.action import action
 from src.llm.sentence_queue import sentence_queue
+from src.llm.sentence_segmenter import sentence_segmenter
 from src.config.config_loader import ConfigLoader
 from src.llm.sentence import sentence as mantella_sentence #<- Do not collide with frequent and logical use of "sentence" when generating text from the LLM
 import src.utils as utils
@@ -19,8 +22,23 @@ from src.llm.message_thread import message_thread
 from src.llm.llm_client import LLMClient
 from src.tts.ttsable import ttsable
 from src.tts.synthesization_options import SynthesizationOptions
+from src.http.session_recorder import session_recorder
+from src.metrics import metrics
+from src.conversation.conversation_timeline import conversation_timeline
+
+@dataclass
+class SentenceJob:
+    """A finished sentence of the LLM response that is waiting to be voiced by the TTS worker"""
+    text: str
+    character: Character
+    actions: list[action] = field(default_factory=list)
+    is_first_line_of_response: bool = False
+    has_switched_character: bool = False
 
 class ChatManager:
+    TTS_QUEUE_SIZE: int = 4 # max number of finished sentences that can wait for the TTS before the LLM stream is paused
+    STOP_GENERATION_TIMEOUT: float = 10.0 # max seconds stop_generation waits for the generation to finish
+
     def __init__(self, game: gameable, config: ConfigLoader, tts: ttsable, client: LLMClient):
         self.loglevel = 28
         self.__game: gameable = game
@@ -30,17 +48,20 @@ class ChatManager:
         # self.wait_time_buffer = config.wait_time_buffer
         self.__tts: ttsable = tts
         self.__client: LLMClient = client
-        self.__is_generating: bool = False
+        self.__generation_future: Future | None = None
         self.__stop_generation = asyncio.Event()
         self.__tts_access_lock = Lock()
+        # All responses are generated in one long-lived event loop, so async resources like the connections of the LLM client can be reused between responses
+        self.__generation_loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.__generation_task: asyncio.Task | None = None
+        self.__generation_thread: Thread = Thread(None, self.__generation_loop.run_forever, "generation_worker", daemon=True)
+        self.__generation_thread.start()
         # self.__number_words_tts: int = config.number_words_tts
-        self.__end_of_sentence_chars = ['.', '?', '!', ':', ';', '。', '？', '！', '；', '：']
-        self.__end_of_sentence_chars = [unicodedata.normalize('NFKC', char) for char in self.__end_of_sentence_chars]
 
     @property
     def tts(self) -> ttsable:
         return self.__tts
-
+    
     @utils.time_it
     def generate_sentence(self, text: str, character_to_talk: Character, is_first_line_of_response: bool = False, is_system_generated_sentence: bool = False) -> mantella_sentence:
         """Generates the audio for a text and returns the corresponding sentence
@@ -79,31 +100,75 @@ class ChatManager:
             return self.__client.num_tokens_from_message(content_to_measure)
 
     @utils.time_it
-    def generate_response(self, messages: message_thread, characters: Characters, blocking_queue: sentence_queue, actions: list[action]):
-        """Starts generating responses by the LLM for the current state of the input messages
+    def generate_response(self, messages: message_thread, characters: Characters, blocking_queue: sentence_queue, actions: list[action], timeline: conversation_timeline | None = None) -> Future | None:
+        """Starts generating responses by the LLM for the current state of the input messages.
+        The generation runs in the background on the generation worker, this method returns immediately
 
         Args:
             messages (message_thread): _description_
             characters (Characters): _description_
             blocking_queue (sentence_queue): _description_
             actions (list[action]): _description_
+            timeline (conversation_timeline | None, optional): the timeline of the conversation to record the stages of the generation in. Defaults to None.
+
+        Returns:
+            Future | None: completes once the generation has finished or was stopped. None if no generation was started
         """
         if(not characters.last_added_character):
-            return
-        self.__is_generating = True
+            return None
         
-        asyncio.run(self.process_response(characters.last_added_character, blocking_queue, messages, characters, actions))
+        if not timeline:
+            timeline = conversation_timeline(False)
+        self.__generation_future = asyncio.run_coroutine_threadsafe(self.__run_generation(characters.last_added_character, blocking_queue, messages, characters, actions, timeline), self.__generation_loop)
+        return self.__generation_future
     
     @utils.time_it
     def stop_generation(self):
         """Stops the current generation and only returns once this stop has been successful
         """
-        self.__stop_generation.set()
-        while self.__is_generating:
-            time.sleep(0.01)
-        self.__stop_generation.clear()
+        start_time = time.perf_counter()
+        generation_future = self.__generation_future
+        self.__generation_loop.call_soon_threadsafe(self.__cancel_generation)
+        if generation_future and not generation_future.done():
+            # returns as soon as the generation has finished, including its cleanup
+            _, not_done = wait([generation_future], timeout=self.STOP_GENERATION_TIMEOUT)
+            interruption_duration = time.perf_counter() - start_time
+            metrics.observe(metrics.INTERRUPTION, interruption_duration)
+            if not_done:
+                logging.warning(f"The generation did not stop within {self.STOP_GENERATION_TIMEOUT} seconds. Continuing without waiting for it")
+            else:
+                logging.debug(f"Interrupting the generation took {round(interruption_duration, 5)} seconds")
+        self.__generation_loop.call_soon_threadsafe(self.__stop_generation.clear)
         return
 
+    @utils.time_it
+    def shutdown(self):
+        """Stops the current generation and the generation worker. Call once the ChatManager is no longer used, eg when it is replaced after a config change
+        """
+        if self.__generation_loop.is_closed():
+            return
+        self.stop_generation()
+        self.__generation_loop.call_soon_threadsafe(self.__generation_loop.stop)
+        self.__generation_thread.join(timeout=self.STOP_GENERATION_TIMEOUT)
+        if self.__generation_thread.is_alive():
+            logging.warning("The generation worker did not stop in time")
+        else:
+            self.__generation_loop.close()
+
+    async def __run_generation(self, active_character: Character, blocking_queue: sentence_queue, messages: message_thread, characters: Characters, actions: list[action], timeline: conversation_timeline):
+        self.__generation_task = asyncio.current_task()
+        try:
+            await self.process_response(active_character, blocking_queue, messages, characters, actions, timeline)
+        finally:
+            self.__generation_task = None
+
+    def __cancel_generation(self):
+        """Runs on the generation worker. Signals the current generation to stop and cancels whatever it is currently waiting for, eg the LLM
+        """
+        self.__stop_generation.set()
+        if self.__generation_task and not self.__generation_task.done():
+            self.__generation_task.cancel()
+
     @utils.time_it
     def get_audio_duration(self, audio_file: str):
         """Check if the external software has finished playing the audio file"""
@@ -183,13 +248,67 @@ class ChatManager:
         return None
 
     @utils.time_it
-    async def process_response(self, active_character: Character, blocking_queue: sentence_queue, messages : message_thread, characters: Characters, actions: list[action]):
-        """Stream response from LLM one sentence at a time"""
+    def __voice_sentence_job(self, job: SentenceJob) -> mantella_sentence:
+        """Runs on a worker thread. Changes the voice if the job requires it and generates the audio for the job's text"""
+        if job.has_switched_character:
+            character = job.character
+            with self.__tts_access_lock:
+                self.__tts.change_voice(character.tts_voice_model, character.in_game_voice_model, character.csv_in_game_voice_model, character.advanced_voice_model, voice_accent=character.voice_accent, voice_gender=character.gender, voice_race=character.race)
+        return self.generate_sentence(job.text, job.character, job.is_first_line_of_response)
 
+    @utils.time_it
+    async def __tts_worker(self, pending_sentences: asyncio.Queue, blocking_queue: sentence_queue, tts_failed: asyncio.Event, timeline: conversation_timeline):
+        """Voices the sentences segmented from the LLM stream one after another and puts them in the blocking_queue in the order they were received.
+        Synthesis runs in a worker thread so the LLM stream can keep being read in the meantime.
+
+        Args:
+            pending_sentences (asyncio.Queue): the queue of SentenceJobs to voice. A None marks the end of the response
+            blocking_queue (sentence_queue): the queue the voiced sentences are put in
+            tts_failed (asyncio.Event): set by this worker if the TTS failed to voice a sentence
+            timeline (conversation_timeline): the timeline to record the synthesis of every sentence in
+        """
+        while True:
+            job: SentenceJob | None = await pending_sentences.get()
+            try:
+                if job is None:
+                    return
+                if self.__stop_generation.is_set() or tts_failed.is_set():
+                    continue # keep draining the queue so the LLM stream never blocks on a full queue
+                with timeline.span("TTS", "tts", sentence=job.text.strip()):
+                    new_sentence = await asyncio.to_thread(self.__voice_sentence_job, job)
+                if self.__stop_generation.is_set():
+                    continue
+                if new_sentence.error_message:
+                    tts_failed.set()
+                else:
+                    for a in job.actions:
+                        new_sentence.actions.append(a.identifier)
+                blocking_queue.put(new_sentence)
+                timeline.add_event("Sentence enqueued", "queue", sentence=new_sentence.sentence)
+            except Exception as e:
+                # the worker has to keep draining the queue, otherwise the LLM stream blocks on the full queue and the response never ends
+                logging.log(29, f"Text-to-Speech Error: {e}")
+                tts_failed.set()
+            finally:
+                pending_sentences.task_done()
+
+    @utils.time_it
+    async def process_response(self, active_character: Character, blocking_queue: sentence_queue, messages : message_thread, characters: Characters, actions: list[action], timeline: conversation_timeline | None = None):
+        """Stream response from LLM one sentence at a time.
+        Finished sentences are handed to a TTS worker through a bounded queue, so the LLM stream is read while the previous sentence is being voiced"""
+        if not timeline:
+            timeline = conversation_timeline(False)
+        response_start = timeline.now()
+
+        pending_sentences: asyncio.Queue[SentenceJob | None] = asyncio.Queue(maxsize=self.TTS_QUEUE_SIZE)
+        tts_failed = asyncio.Event()
+        tts_worker = asyncio.create_task(self.__tts_worker(pending_sentences, blocking_queue, tts_failed, timeline))
+        full_reply = ''
+        first_token_at: float | None = None
+        last_token_at: float | None = None
+        segmentation_seconds = 0.0
         try:
-            sentence = ''
-            remaining_content = ''
-            full_reply = ''
+            segmenter = sentence_segmenter()
             num_sentences = 0
             #Added from xTTS implementation
             accumulated_sentence = ''
@@ -198,52 +317,46 @@ class ChatManager:
             actions_in_sentence: list[action] = []
             first_token = True
             is_first_line_of_response = True
+            has_switched_character = False
             while True:
                 try:
                     start_time = time.time()
+                    stream_start = timeline.now()
+                    timeline.add_event("LLM request sent", "llm")
                     async for content in self.__client.streaming_call(messages=messages, is_multi_npc=characters.contains_multiple_npcs()):
-                        if self.__stop_generation.is_set():
+                        if self.__stop_generation.is_set() or tts_failed.is_set():
                             break
                         if not content:
                             continue
 
                         if first_token:
                             logging.log(self.loglevel, f"LLM took {round(time.time() - start_time, 5)} seconds to respond")
+                            metrics.observe(metrics.LLM_TIME_TO_FIRST_TOKEN, time.time() - start_time)
+                            first_token_at = time.perf_counter()
                             first_token = False
+                            timeline.add_event("First token", "llm")
                         
-                        sentence += content
-                        # Check for the last occurrence of sentence-ending punctuation within first 150 chars
-                        last_punctuation = max(sentence.rfind(p,0, 148) for p in self.__end_of_sentence_chars)
-                        
-                        asterisks_count = sentence.count('*')
-                        if (last_punctuation != -1) and (asterisks_count % 2 == 0):
-                            # Split the sentence at the last punctuation mark
-                            remaining_content = sentence[last_punctuation + 1:]
-                            # if sentence is contained in bracket or asterisk, include the bracket / asterisk
-                            if remaining_content.strip() in ['*',')','}',']']:
-                                current_sentence = sentence
-                                remaining_content = ''
-                            else:
-                                current_sentence = sentence[:last_punctuation + 1]
-
+                        # Returns the text up to the last sentence-ending punctuation within the first 148 chars, once that text is complete
+                        segmentation_start = time.perf_counter()
+                        current_sentence = segmenter.feed(content)
+                        last_token_at = time.perf_counter()
+                        segmentation_seconds += last_token_at - segmentation_start
+                        if current_sentence:
+                            timeline.add_event("Sentence segmented", "llm", sentence=current_sentence)
                             current_sentence = self.clean_sentence(current_sentence)
                             if not current_sentence:
-                                sentence = remaining_content
                                 continue
                             
                             if not self.__game.is_sentence_allowed(current_sentence, num_sentences):
                                 continue
                             
                             # New logic to handle conditions based on the presence of a colon and the state of `accumulated_sentence`
-                            content_edit = unicodedata.normalize('NFKC', current_sentence)
-                            if ':' in content_edit:
+                            speaker_keyword = sentence_segmenter.split_speaker_keyword(current_sentence)
+                            if speaker_keyword:
                                 if accumulated_sentence:  # accumulated_sentence is not empty
                                     cumulative_sentence_bool = True
                                 else:  # accumulated_sentence is empty
-                                    # Split the sentence at the colon
-                                    parts = content_edit.split(':', 1)
-                                    keyword_extraction = parts[0].strip().lstrip("*").lstrip('"').strip() #This is very rough. Should use a Regex
-                                    current_sentence = parts[1].strip() if len(parts) > 1 else ''
+                                    keyword_extraction, current_sentence = speaker_keyword
                                     # if LLM is switching character
                                     # Find the first character whose name starts with keyword_extraction
                                     if keyword_extraction == "Player":
@@ -258,23 +371,25 @@ class ChatManager:
                                             logging.log(28, f"Switched to {character_switched_to.name}")
                                             active_character = character_switched_to
                                             full_reply += f"{keyword_extraction}: "
-                                            self.__tts.change_voice(active_character.tts_voice_model, active_character.in_game_voice_model, active_character.csv_in_game_voice_model, active_character.advanced_voice_model, voice_accent=active_character.voice_accent, voice_gender=active_character.gender, voice_race=active_character.race)
+                                            # The voice is changed by the TTS worker once it reaches this character's first sentence
+                                            has_switched_character = True
                                     else:
                                         action_to_take: action | None = self.__matching_action_keyword(keyword_extraction, actions)
                                         if action_to_take:
                                             logging.log(28, action_to_take.info_text)
                                             actions_in_sentence.append(action_to_take)
                                             full_reply += f"{keyword_extraction}: "
-                                            sentence = remaining_content
 
                             # Accumulate sentences if less than X words
                             if len(accumulated_sentence.split()) + len(current_sentence.split()) < self.__config.number_words_tts and cumulative_sentence_bool == False:
                                 accumulated_sentence += current_sentence
-                                sentence = remaining_content
                                 continue
                             else:
                                 if cumulative_sentence_bool == True:
                                     sentence = accumulated_sentence
+                                    # the sentence containing the colon is processed again once the accumulated sentences have been voiced
+                                    segmenter.push_front(current_sentence)
+                                    cumulative_sentence_bool = False
                                 else:
                                     sentence = accumulated_sentence + current_sentence
                                 accumulated_sentence = ''
@@ -282,42 +397,22 @@ class ChatManager:
                                     logging.log(28, f'Skipping voiceline that is too short: {sentence}')
                                     break
                                 
-                                # Generate the audio and return the audio file path
-                                # Put the audio file path in the sentence_queue
+                                # Hand the sentence over to the TTS worker which puts the voiced sentence in the sentence_queue
                                 
-                                # Try to get the sentence below 148 characters which is the max for Fallout4
-                                while len(sentence.encode('utf-8')) > 148:			# Count bytes and not chars
-                                    for p in [',', ' ']:                    		# First look for comma, then space
-                                        lastp = sentence.rfind(p, 0, 148)
-                                        if lastp != -1:
-                                            remaining_content = sentence[lastp+1:] + remaining_content
-                                            sentence = sentence[:lastp+1]
-                                            break
+                                # Try to get the sentence below 148 bytes which is the max for Fallout4. The rest becomes part of the next sentence
+                                sentence = segmenter.limit_length(sentence)
                                    
                                 #logging.info(f"[{len(sentence)}] {sentence}")
                                 
                                 if self.__stop_generation.is_set():
                                     break
-                                new_sentence = self.generate_sentence(' ' + sentence + ' ', active_character, is_first_line_of_response)
+                                has_interrupting_action = any(a.is_interrupting for a in actions_in_sentence)
+                                await pending_sentences.put(SentenceJob(' ' + sentence + ' ', active_character, actions_in_sentence, is_first_line_of_response, has_switched_character))
                                 is_first_line_of_response = False
-                                blocking_queue.put(new_sentence)
-
-                                has_interrupting_action = False
-                                if not new_sentence.error_message:
-                                    for a in actions_in_sentence:
-                                        has_interrupting_action |= a.is_interrupting
-                                        new_sentence.actions.append( a.identifier)
-                                else:
-                                    break
+                                has_switched_character = False
                                 
                                 full_reply += sentence
                                 num_sentences += 1
-                                if cumulative_sentence_bool == True :
-                                    sentence = current_sentence + remaining_content
-                                    cumulative_sentence_bool = False
-                                else :
-                                    sentence = remaining_content
-                                remaining_content = ''
                                 actions_in_sentence = []
 
                                 # stop processing LLM response if:
@@ -333,29 +428,21 @@ class ChatManager:
                 except Exception as e:
                     logging.error(f"LLM API Error: {e}")                    
                     error_response = "I can't find the right words at the moment."
-                    new_sentence = self.generate_sentence(error_response, active_character)
-                    blocking_queue.put(new_sentence)
-                    if new_sentence.error_message:
+                    await pending_sentences.put(SentenceJob(error_response, active_character, actions_in_sentence, has_switched_character=has_switched_character))
+                    has_switched_character = False
+                    await pending_sentences.join() # wait for the error response to be voiced to know if the TTS is still working
+                    if tts_failed.is_set():
                         break
-                    else:
-                        for a in actions_in_sentence:
-                            new_sentence.actions.append( a.identifier)
                     logging.log(self.loglevel, 'Retrying connection to API...')
-                    time.sleep(5)
+                    await asyncio.sleep(5)
 
-            if not self.__stop_generation.is_set():
+            if not self.__stop_generation.is_set() and not tts_failed.is_set():
                 # Check if there is any accumulated sentence at the end
                 if accumulated_sentence and len(accumulated_sentence.strip()) > 3:
-                    # Generate the audio and return the audio file path
                     # Might need to check for len > 150 here
-                    try:
-                        new_sentence = self.generate_sentence(' ' + accumulated_sentence + ' ', active_character)
-                        blocking_queue.put(new_sentence)
-                        full_reply += accumulated_sentence
-                        accumulated_sentence = ''
-                    except Exception as e:
-                        accumulated_sentence = ''
-                        logging.error(f"TTS Error: {e}")
+                    await pending_sentences.put(SentenceJob(' ' + accumulated_sentence + ' ', active_character, [], has_switched_character=has_switched_character))
+                    full_reply += accumulated_sentence
+                    accumulated_sentence = ''
 
             # Mark the end of the response
             # await sentence_queue.put(None)
@@ -370,9 +457,31 @@ class ChatManager:
             else:
                 logging.error(f"LLM API Error: {e}")
         finally:
-            logging.log(23, f"Full response saved ({self.__client.calculate_tokens_from_text(full_reply)} tokens): {full_reply.strip()}")
-            blocking_queue.is_more_to_come = False
-            # This sentence is required to make sure there is one in case the game is already waiting for it
-            # before the ChatManager realises there is not another message coming from the LLM
-            blocking_queue.put(mantella_sentence(active_character,"","",0, True))
-            self.__is_generating = False
\ No newline at end of file
+            try:
+                try:
+                    # Let the TTS worker voice everything that is still pending before marking the end of the response
+                    await pending_sentences.put(None)
+                    # shielded, so cancelling the generation while it waits here does not cancel the worker in the middle of a sentence
+                    await asyncio.shield(tts_worker)
+                except asyncio.CancelledError:
+                    tts_worker.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await tts_worker
+                    raise
+                response_tokens = self.__client.calculate_tokens_from_text(full_reply)
+                logging.log(23, f"Full response saved ({response_tokens} tokens): {full_reply.strip()}")
+                if first_token_at is not None and last_token_at is not None:
+                    timeline.add_span("LLM stream", "llm", stream_start, last_token_at, tokens=response_tokens)
+                    metrics.increment(metrics.LLM_RESPONSES)
+                    metrics.increment(metrics.LLM_COMPLETION_TOKENS, response_tokens)
+                    metrics.observe(metrics.SENTENCE_SEGMENTATION, segmentation_seconds)
+                    if last_token_at > first_token_at:
+                        metrics.observe(metrics.LLM_TOKENS_PER_SECOND, response_tokens / (last_token_at - first_token_at))
+                if session_recorder.get_active_recorder():
+                    session_recorder.record_interaction("llm", messages.get_openai_messages(), full_reply)
+            finally:
+                # The end of the response is always marked, even if the TTS worker failed, so the game never waits for a sentence that does not come
+                # This sentence is required to make sure there is one in case the game is already waiting for it
+                # before the ChatManager realises there is not another message coming from the LLM
+                blocking_queue.put_last(mantella_sentence(active_character,"","",0, True))
+                timeline.add_span("Response", "llm", response_start, reply=full_reply.strip())
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import ClassVar
+
+@dataclass
+class function_stats:
+    """Aggregated timings of the calls to a single function
+    """
+    call_count: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+    histogram: list[int] = field(default_factory=list) # bucket i counts calls that took less than 2^i microseconds
+
+    def add(self, duration_ns: int):
+        self.call_count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        bucket = min((duration_ns // 1000).bit_length(), profiler.HISTOGRAM_BUCKETS - 1)
+        if len(self.histogram) <= bucket:
+            self.histogram.extend([0] * (bucket + 1 - len(self.histogram)))
+        self.histogram[bucket] += 1
+
+    def get_percentile_ns(self, percentile: float) -> int:
+        """Estimates a percentile of the call durations from the histogram
+
+        Returns:
+            int: the upper bound of the bucket the percentile falls into, in nanoseconds
+        """
+        target = percentile * self.call_count
+        counted = 0
+        for bucket, count in enumerate(self.histogram):
+            counted += count
+            if counted >= target and count > 0:
+                return min((1 << bucket) * 1000, self.max_ns)
+        return self.max_ns
+
+class profiler:
+    """Collects the timings of the functions decorated with `utils.time_it`.
+    Disabled by default, in which case `utils.time_it` only adds a single check of `profiler.enabled` to each call.
+    When enabled, the call counts and a histogram of the durations are aggregated per function in memory,
+    and every call is kept as a trace event (up to MAX_TRACE_EVENTS) that can be opened in chrome://tracing or Perfetto
+    """
+    HISTOGRAM_BUCKETS: ClassVar[int] = 32
+    MAX_TRACE_EVENTS: ClassVar[int] = 500_000
+    SUMMARY_FILE_NAME: ClassVar[str] = "profile_summary.txt"
+    TRACE_FILE_NAME: ClassVar[str] = "profile_trace.json"
+    enabled: ClassVar[bool] = False
+    __lock: ClassVar[Lock] = Lock()
+    __stats: ClassVar[dict[str, function_stats]] = {}
+    __trace_events: ClassVar[list[tuple[str, int, int, int]]] = [] # name, start, duration (ns) and thread id of every call
+    __started_ns: ClassVar[int] = 0
+
+    @staticmethod
+    def enable():
+        profiler.reset()
+        profiler.enabled = True
+        logging.log(23, "Profiler enabled")
+
+    @staticmethod
+    def disable():
+        profiler.enabled = False
+
+    @staticmethod
+    def reset():
+        with profiler.__lock:
+            profiler.__stats = {}
+            profiler.__trace_events = []
+            profiler.__started_ns = time.perf_counter_ns()
+
+    @staticmethod
+    def record(name: str, start_ns: int, end_ns: int):
+        """Records a single call of a function
+
+        Args:
+            name (str): the qualified name of the function
+            start_ns (int): time.perf_counter_ns() when the call started
+            end_ns (int): time.perf_counter_ns() when the call returned
+        """
+        duration_ns = end_ns - start_ns
+        with profiler.__lock:
+            stats = profiler.__stats.get(name)
+            if not stats:
+                stats = function_stats()
+                profiler.__stats[name] = stats
+            stats.add(duration_ns)
+            if len(profiler.__trace_events) < profiler.MAX_TRACE_EVENTS:
+                profiler.__trace_events.append((name, start_ns, duration_ns, threading.get_ident()))
+
+    @staticmethod
+    def get_stats() -> dict[str, function_stats]:
+        with profiler.__lock:
+            return dict(profiler.__stats)
+
+    @staticmethod
+    def get_summary_table() -> str:
+        """Returns a table of all profiled functions, sorted by the total time spent in them
+        """
+        stats = sorted(profiler.get_stats().items(), key=lambda item: item[1].total_ns, reverse=True)
+        name_width = max([len("Function")] + [len(name) for name, _ in stats])
+        header = f"{'Function':<{name_width}} {'Calls':>8} {'Total ms':>11} {'Mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'Max ms':>10}"
+        lines = [header, "-" * len(header)]
+        for name, s in stats:
+            lines.append(f"{name:<{name_width}} {s.call_count:>8} {s.total_ns / 1e6:>11.3f} {s.total_ns / s.call_count / 1e6:>10.3f} "
+                         f"{s.get_percentile_ns(0.5) / 1e6:>10.3f} {s.get_percentile_ns(0.95) / 1e6:>10.3f} {s.max_ns / 1e6:>10.3f}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def export_chrome_trace(file_name: str):
+        """Writes the recorded calls in the Chrome trace event format
+
+        Args:
+            file_name (str): the file to write the trace to
+        """
+        with profiler.__lock:
+            trace_events = list(profiler.__trace_events)
+            started_ns = profiler.__started_ns
+        pid = os.getpid()
+        events = [{"name": name, "cat": name.rsplit(".", 1)[0], "ph": "X", "ts": (start_ns - started_ns) / 1000, "dur": duration_ns / 1000, "pid": pid, "tid": tid}
+                  for name, start_ns, duration_ns, tid in trace_events]
+        with open(file_name, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    @staticmethod
+    def export(folder: str):
+        """Writes the summary table and the Chrome trace to the folder, replacing earlier exports
+        """
+        if not profiler.enabled:
+            return
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, profiler.SUMMARY_FILE_NAME), 'w', encoding='utf-8') as f:
+                f.write(profiler.get_summary_table())
+            profiler.export_chrome_trace(os.path.join(folder, profiler.TRACE_FILE_NAME))
+            logging.log(23, f"Profile saved to {folder}")
+        except OSError as e:
+            logging.warning(f"Could not save profile to {folder}: {e}")
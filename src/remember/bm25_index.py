@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+
+class bm25_index:
+    """A keyword index over short passages of text (summary paragraphs, conversation turns), ranked with Okapi BM25.
+    Passages are grouped by source, so the passages of a single NPC can be replaced when its files change without rebuilding the whole index.
+    Term statistics are updated incrementally when a source is added or removed.
+    Every source is saved to its own file in the index folder, and only the sources that have changed since the last save are written
+    """
+    K1: float = 1.5
+    B: float = 0.75
+    INDEX_VERSION: int = 2
+    WORD_PATTERN: re.Pattern[str] = re.compile(r"\w+", re.UNICODE)
+    STOP_WORDS: set[str] = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'had', 'has', 'have', 'he', 'her', 'his', 'i', 'in', 'is', 'it', 'its',
+                            'me', 'my', 'of', 'on', 'or', 'she', 'so', 'that', 'the', 'their', 'them', 'they', 'this', 'to', 'was', 'we', 'were', 'what', 'with', 'you', 'your'}
+
+    def __init__(self) -> None:
+        self.__sources: dict[str, dict] = {} # source -> {"signature": str, "passages": [{"text": str, "terms": dict[str, int], "length": int}]}
+        self.__document_frequencies: Counter[str] = Counter()
+        self.__passage_count: int = 0
+        self.__total_length: int = 0
+        self.__changed_sources: set[str] = set() # sources that have been added, changed or removed since the last save
+
+    def __len__(self) -> int:
+        return self.__passage_count
+
+    def get_signature(self, source: str) -> str | None:
+        """Returns the signature the passages of a source were indexed with, None if the source is not indexed
+        """
+        indexed_source = self.__sources.get(source)
+        return indexed_source["signature"] if indexed_source else None
+
+    def get_passage_count(self, source: str) -> int:
+        indexed_source = self.__sources.get(source)
+        return len(indexed_source["passages"]) if indexed_source else 0
+
+    def set_source(self, source: str, signature: str, passages: list[str]):
+        """Replaces the passages of a source
+
+        Args:
+            source (str): the name of the source, eg the summary file of an NPC
+            signature (str): identifies the state of the source the passages were taken from
+            passages (list[str]): the passages of the source, oldest first
+        """
+        self.remove_source(source)
+        self.__sources[source] = {"signature": signature, "passages": []}
+        self.add_passages(source, signature, passages)
+
+    def add_passages(self, source: str, signature: str, passages: list[str]):
+        """Adds passages to the end of a source, eg the newest turns of a conversation log
+
+        Args:
+            source (str): the name of the source
+            signature (str): identifies the state of the source after adding the passages
+            passages (list[str]): the new passages, oldest first
+        """
+        indexed_source = self.__sources.setdefault(source, {"signature": signature, "passages": []})
+        indexed_source["signature"] = signature
+        self.__changed_sources.add(source)
+        for text in passages:
+            terms = self.tokenize(text)
+            if len(terms) == 0:
+                continue
+            term_counts = Counter(terms)
+            indexed_source["passages"].append({"text": text, "terms": dict(term_counts), "length": len(terms)})
+            self.__document_frequencies.update(term_counts.keys())
+            self.__passage_count += 1
+            self.__total_length += len(terms)
+
+    def remove_source(self, source: str):
+        indexed_source = self.__sources.pop(source, None)
+        if not indexed_source:
+            return
+        self.__changed_sources.add(source)
+        for passage in indexed_source["passages"]:
+            self.__document_frequencies.subtract(passage["terms"].keys())
+            self.__passage_count -= 1
+            self.__total_length -= passage["length"]
+        self.__document_frequencies += Counter() # drops the terms that no longer occur
+
+    def search(self, query: str, sources: list[str], top_k: int) -> list[tuple[float, str, str]]:
+        """Ranks the passages of the given sources by their relevance to the query
+
+        Args:
+            query (str): the text to search for
+            sources (list[str]): only passages of these sources are ranked
+            top_k (int): the max number of passages to return
+
+        Returns:
+            list[tuple[float, str, str]]: score, source and text of the best passages, best first. Passages that do not contain any term of the query are left out.
+                Passages with the same score are ordered like their sources in `sources`, and newest first within a source
+        """
+        query_terms = set(self.tokenize(query))
+        average_length = self.__total_length / self.__passage_count if self.__passage_count > 0 else 0
+        idf: dict[str, float] = {}
+        for term in query_terms:
+            document_frequency = self.__document_frequencies.get(term, 0)
+            idf[term] = math.log(1 + (self.__passage_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        ranked: list[tuple[float, int, int, str, str]] = []
+        for source_number, source in enumerate(sources):
+            indexed_source = self.__sources.get(source)
+            if not indexed_source:
+                continue
+            for position, passage in enumerate(indexed_source["passages"]):
+                score = 0.0
+                length_norm = self.K1 * (1 - self.B + self.B * passage["length"] / average_length) if average_length > 0 else self.K1
+                for term in query_terms:
+                    term_frequency = passage["terms"].get(term, 0)
+                    if term_frequency > 0:
+                        score += idf[term] * term_frequency * (self.K1 + 1) / (term_frequency + length_norm)
+                if score > 0:
+                    ranked.append((score, source_number, position, source, passage["text"]))
+        ranked.sort(key=lambda r: (-r[0], r[1], -r[2]))
+        return [(score, source, text) for score, _, _, source, text in ranked[:top_k]]
+
+    @staticmethod
+    def tokenize(text: str) -> list[str]:
+        return [word for word in bm25_index.WORD_PATTERN.findall(text.lower()) if len(word) > 1 and word not in bm25_index.STOP_WORDS]
+
+    @staticmethod
+    def get_source_file(index_folder: str, source: str) -> str:
+        """Returns the file a source is saved to. Source names can contain characters that are not allowed in file names, so the file is named after a hash of the name
+        """
+        return os.path.join(index_folder, f"{hashlib.blake2b(source.encode('utf-8'), digest_size=16).hexdigest()}.json")
+
+    def save(self, index_folder: str):
+        """Writes the sources that have changed since the last save to disk. Each file is replaced atomically, so a crash never leaves a half written source
+        """
+        for source in list(self.__changed_sources):
+            source_file = self.get_source_file(index_folder, source)
+            try:
+                indexed_source = self.__sources.get(source)
+                if indexed_source is None:
+                    if os.path.exists(source_file):
+                        os.remove(source_file)
+                else:
+                    os.makedirs(index_folder, exist_ok=True)
+                    temp_file = source_file + '.tmp'
+                    with open(temp_file, 'w', encoding='utf-8') as f:
+                        json.dump({"version": self.INDEX_VERSION, "source": source, **indexed_source}, f)
+                    os.replace(temp_file, source_file)
+                self.__changed_sources.discard(source)
+            except Exception as e:
+                logging.error(f"Could not save memory index of {source} to {source_file}: {e}")
+
+    @staticmethod
+    def load(index_folder: str) -> 'bm25_index':
+        """Reads an index from disk. Sources that cannot be read are left out, so they are indexed again
+        """
+        index = bm25_index()
+        if not os.path.isdir(index_folder):
+            return index
+        for file_name in os.listdir(index_folder):
+            if not file_name.endswith('.json'):
+                continue
+            source_file = os.path.join(index_folder, file_name)
+            try:
+                with open(source_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") != bm25_index.INDEX_VERSION:
+                    continue
+                passages: list[dict] = data["passages"]
+                total_length = sum(passage["length"] for passage in passages)
+                terms = [passage["terms"].keys() for passage in passages]
+                index.__sources[data["source"]] = {"signature": data["signature"], "passages": passages}
+                for passage_terms in terms:
+                    index.__document_frequencies.update(passage_terms)
+                index.__passage_count += len(passages)
+                index.__total_length += total_length
+            except Exception as e:
+                logging.error(f"Could not load memory index from {source_file}, it will be rebuilt: {e}")
+        return index
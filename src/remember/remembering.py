@@ -5,12 +5,14 @@ from src.llm.message_thread import message_thread
 
 class remembering(ABC):
     @abstractmethod
-    def get_prompt_text(self, npcs_in_conversation: Characters, world_id: str) -> str:
+    def get_prompt_text(self, npcs_in_conversation: Characters, world_id: str, location: str = "", player_input: str = "") -> str:
         """ Generates a text that explains the previous interactions of the npcs with the player. 
             Text is passed as part of the prompt to the LLM
 
         Args:
             npcs_in_conversation (Characters): the NPCs in question
+            location (str, optional): the current location, can be used to pick the relevant interactions. Defaults to "".
+            player_input (str, optional): the latest input of the player, can be used to pick the relevant interactions. Defaults to "".
 
         Returns:
             str: a single text
@@ -25,4 +27,15 @@ class remembering(ABC):
             messages (message_thread): The messages in the conversation
             npcs_in_conversation (Characters): the NPCs to save for
         """
+        pass
+
+    @property
+    def uses_player_input(self) -> bool:
+        """Whether get_prompt_text picks the interactions by the latest player input. If True, the prompt is generated again for every player input
+        """
+        return False
+
+    def shutdown(self):
+        """Stops the background work of the rememberer. Called when it is replaced, eg after a config change
+        """
         pass
\ No newline at end of file
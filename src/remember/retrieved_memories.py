@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import os
+from threading import Lock
+from src.games.gameable import gameable
+from src.llm.llm_client import LLMClient
+from src.llm.message_thread import message_thread
+from src.characters_manager import Characters
+from src.character_manager import Character
+from src.conversation.conversation_log import conversation_log
+from src.remember.bm25_index import bm25_index
+from src.remember.remembering import remembering
+from src.remember.summaries import summaries
+from src import utils
+
+class retrieved_memories(remembering):
+    """ Builds the memories for a prompt from the passages of past conversations that are most relevant to the current one.
+        Summary paragraphs and the turns of the conversation logs are kept in a BM25 index per world, which is updated when the files of an NPC change.
+        Only the sources of the NPCs that have changed are saved again, so building a prompt does not rewrite the index of the whole world.
+        Conversations are still saved and summarized by summaries
+    """
+    INDEX_FOLDER_NAME: str = "memory_index"
+    TOP_K: int = 12 # max number of passages in a prompt
+    MEMORY_TOKEN_LIMIT_PCT: float = 0.1 # share of the token limit the memories can take up in a prompt
+    LOG_SIGNATURE_PREFIX: str = "size:" # the log sources are signed with the size of the log file they have been indexed up to
+
+    def __init__(self, game: gameable, summaries_rememberer: summaries, client: LLMClient) -> None:
+        super().__init__()
+        self.__game: gameable = game
+        self.__summaries: summaries = summaries_rememberer
+        self.__client: LLMClient = client
+        self.__indexes: dict[str, bm25_index] = {}
+        self.__index_lock: Lock = Lock()
+
+    @utils.time_it
+    def get_prompt_text(self, npcs_in_conversation: Characters, world_id: str, location: str = "", player_input: str = "") -> str:
+        """Searches the past conversations of the NPCs for the passages most relevant to the location, the participants and the latest player input
+
+        Args:
+            npcs_in_conversation (Characters): the npcs to load the memories for
+            world_id (str): the world the memories belong to
+            location (str, optional): the current location. Defaults to "".
+            player_input (str, optional): the latest input of the player. Defaults to "".
+
+        Returns:
+            str: the most relevant passages that fit into the memory token budget as a single string
+        """
+        characters = [character for character in npcs_in_conversation.get_all_characters() if not character.is_player_character]
+        if len(characters) == 0:
+            return ""
+
+        # the summary paragraphs are gathered before taking the lock, so other prompts do not wait for the summaries
+        summary_paragraphs = [self.__summaries.get_summary_paragraphs(character, world_id) for character in characters]
+        with self.__index_lock:
+            index = self.__get_index(world_id)
+            sources: list[str] = []
+            has_index_changed = False
+            for character, paragraphs in zip(characters, summary_paragraphs):
+                summary_source, log_source = self.__get_sources(character)
+                has_index_changed |= self.__update_summary_source(index, summary_source, paragraphs)
+                has_index_changed |= self.__update_log_source(index, log_source, character, world_id)
+                sources.extend([summary_source, log_source])
+            if has_index_changed:
+                index.save(self.__get_index_folder(world_id))
+
+            query = " ".join([location] + [character.name for character in characters] + [player_input])
+            results = index.search(query, sources, self.TOP_K)
+
+        token_budget = self.__client.token_limit * self.MEMORY_TOKEN_LIMIT_PCT
+        used_tokens = 0
+        passages: list[str] = []
+        for _, _, text in results:
+            passage_tokens = self.__client.calculate_tokens_from_text(text)
+            if used_tokens + passage_tokens > token_budget:
+                continue
+            passages.append(text)
+            used_tokens += passage_tokens
+        logging.info(f"Selected {len(passages)} of {len(results)} relevant memories ({used_tokens} / {int(token_budget)} tokens)")
+
+        if passages:
+            # the most relevant passages come last, so a prompt that is too long loses the least relevant ones first
+            result = "\n".join(reversed(passages))
+            return f"Below are memories of past events relevant to this conversation:\n{result}"
+        else:
+            return ""
+
+    @utils.time_it
+    def save_conversation_state(self, messages: message_thread, npcs_in_conversation: Characters, world_id: str, is_reload=False):
+        # the index is brought up to date with the saved files the next time a prompt is built
+        self.__summaries.save_conversation_state(messages, npcs_in_conversation, world_id, is_reload)
+
+    @property
+    def uses_player_input(self) -> bool:
+        return True
+
+    @utils.time_it
+    def shutdown(self):
+        self.__summaries.shutdown()
+
+    @utils.time_it
+    def __get_index(self, world_id: str) -> bm25_index:
+        index = self.__indexes.get(world_id)
+        if index is None:
+            index = bm25_index.load(self.__get_index_folder(world_id))
+            self.__indexes[world_id] = index
+        return index
+
+    def __get_index_folder(self, world_id: str) -> str:
+        return os.path.join(self.__game.conversation_folder_path, world_id, self.INDEX_FOLDER_NAME)
+
+    @staticmethod
+    def __get_sources(character: Character) -> tuple[str, str]:
+        name = utils.remove_trailing_number(character.name)
+        return f"{name} - {character.ref_id}/summary", f"{name} - {character.ref_id}/log"
+
+    @utils.time_it
+    def __update_summary_source(self, index: bm25_index, source: str, paragraphs: list[str]) -> bool:
+        """Indexes the summary paragraphs of a character again if they have changed
+
+        Returns:
+            bool: True if the index has been changed
+        """
+        signature = hashlib.blake2b("\n".join(paragraphs).encode('utf-8'), digest_size=16).hexdigest()
+        if index.get_signature(source) == signature:
+            return False
+        index.set_source(source, signature, paragraphs)
+        return True
+
+    @utils.time_it
+    def __update_log_source(self, index: bm25_index, source: str, character: Character, world_id: str) -> bool:
+        """Indexes the turns of the conversation log of a character that have been added since it was last indexed.
+        The source is signed with the size of the log file, so only the conversations appended after it are read
+
+        Returns:
+            bool: True if the index has been changed
+        """
+        indexed_signature = index.get_signature(source)
+        indexed_size = int(indexed_signature.removeprefix(self.LOG_SIGNATURE_PREFIX)) if indexed_signature and indexed_signature.startswith(self.LOG_SIGNATURE_PREFIX) else None
+        if indexed_size is not None:
+            new_messages = conversation_log.load_conversation_log_since(character, world_id, indexed_size)
+            if new_messages is not None:
+                messages, size = new_messages
+                if size == indexed_size:
+                    return False
+                # conversation logs only grow, so only the new turns need to be indexed
+                index.add_passages(source, f"{self.LOG_SIGNATURE_PREFIX}{size}", self.__get_turns(messages))
+                return True
+
+        # the log has not been indexed yet or has been changed by hand
+        messages, size = conversation_log.load_conversation_log_since(character, world_id, 0) or ([], 0)
+        index.set_source(source, f"{self.LOG_SIGNATURE_PREFIX}{size}", self.__get_turns(messages))
+        return True
+
+    @staticmethod
+    def __get_turns(messages: list) -> list[str]:
+        return [message["content"].strip() for message in messages if message.get("role") != "system" and isinstance(message.get("content"), str)]
@@ -1,6 +1,11 @@
+from dataclasses import dataclass, field
+import json
 import logging
 import os
+import queue
+from threading import Lock, Thread
 import time
+import uuid
 from src.games.gameable import gameable
 from src.llm.llm_client import LLMClient
 from src.llm.message_thread import message_thread
@@ -10,10 +15,33 @@ from src.character_manager import Character
 from src.remember.remembering import remembering
 from src import utils
 
+@dataclass
+class SummaryJob:
+    """A conversation waiting to be summarized in the background. Saved to disk until it is finished
+    """
+    id: str
+    world_id: str
+    npcs: list[dict[str, str]] # name and ref_id of each NPC to save the summary for
+    text_to_summarize: str
+    npc_name: str
+    is_reload: bool = False
+    summary: str | None = None # set once the conversation has been summarized
+    appended_npcs: list[str] = field(default_factory=list) # ref_ids of the NPCs the summary has already been added for
+    attempts: int = 0
+
 class summaries(remembering):
     """ Stores a conversation as a summary in a text file.
         Loads the latest summary from disk for a prompt text.
+        Summaries are created in the background, so ending a conversation does not have to wait for the LLM
     """
+    PENDING_JOBS_FILE_NAME: str = "pending_summaries.json"
+    MAX_SUMMARY_ATTEMPTS: int = 5
+    SUMMARY_RETRY_DELAY: float = 5 # seconds, doubled with every failed attempt
+    COMPACTION_INPUT_PCT: float = 0.5 # share of the summary limit that is sent to the LLM in one compaction request
+    # Pending jobs are shared by all instances in this process, so a job is only ever processed once even if the config is reloaded
+    __pending_jobs: dict[str, dict[str, SummaryJob]] = {}
+    __pending_jobs_lock: Lock = Lock()
+
     def __init__(self, game: gameable, memory_prompt: str, resummarize_prompt: str, client: LLMClient, language_name: str, summary_limit_pct: float = 0.3) -> None:
         super().__init__()
         self.loglevel = 28
@@ -23,10 +51,22 @@ class summaries(remembering):
         self.__language_name: str = language_name
         self.__memory_prompt: str = memory_prompt
         self.__resummarize_prompt:str = resummarize_prompt
+        # summary paragraphs per world and NPC, so building a prompt does not need to read the summary files every time
+        self.__summary_cache: dict[str, dict[tuple[str, str], tuple[list[str], list[str]]]] = {} # the digest and the newer paragraphs per character
+        self.__summary_cache_lock: Lock = Lock()
+        # file size and token count per summary file, so the summaries do not have to be counted again after every conversation
+        self.__summary_token_counts: dict[str, tuple[int, int]] = {}
+
+        self.__pending_jobs_file: str = os.path.join(self.__game.conversation_folder_path, self.PENDING_JOBS_FILE_NAME)
+        self.__job_queue: queue.Queue[SummaryJob | None] = queue.Queue() # None stops the summary worker
+        Thread(None, self.__process_summary_jobs, "summary_worker", daemon=True).start()
+        self.__load_pending_jobs()
 
     @utils.time_it
-    def get_prompt_text(self, npcs_in_conversation: Characters, world_id: str) -> str:
-        """Load the conversation summaries for all NPCs in the conversation and returns them as one string
+    def get_prompt_text(self, npcs_in_conversation: Characters, world_id: str, location: str = "", player_input: str = "") -> str:
+        """Load the conversation summaries for all NPCs in the conversation and returns them as one string.
+        The digests of compacted summaries come first, separated from the newer paragraphs by an empty line,
+        so a prompt that is too long keeps the digests and loses the oldest of the newer paragraphs first
 
         Args:
             npcs_in_conversation (Characters): the npcs to load the summaries for
@@ -34,44 +74,246 @@ class summaries(remembering):
         Returns:
             str: a concatenation of the summaries as a single string
         """
-        paragraphs = set()
+        digests: dict[str, None] = {}
+        paragraphs: dict[str, None] = {}
         for character in npcs_in_conversation.get_all_characters():
-            if not character.is_player_character:          
-                conversation_summary_file = self.__get_latest_conversation_summary_file_path(character, world_id)      
-                if os.path.exists(conversation_summary_file):
-                    with open(conversation_summary_file, 'r', encoding='utf-8') as f:
-                        paragraphs.update(line.strip() for line in f if line.strip())
-        if paragraphs:
-            result = "\n".join(paragraphs)
-            return f"Below is a summary of past events:\n{result}"
+            if not character.is_player_character:
+                digest, newer_paragraphs = self.__get_digest_and_paragraphs(character, world_id)
+                digests.update(dict.fromkeys(digest))
+                paragraphs.update(dict.fromkeys(newer_paragraphs))
+        paragraphs = {paragraph: None for paragraph in paragraphs if paragraph not in digests}
+        heading = "Below is a summary of past events:"
+        if digests and paragraphs:
+            return f"{heading}\n" + "\n".join(digests) + "\n\n" + "\n".join(paragraphs)
+        elif digests or paragraphs:
+            return f"{heading}\n" + "\n".join(digests or paragraphs)
         else:
             return ""
 
+    @utils.time_it
+    def get_summary_paragraphs(self, character: Character, world_id: str) -> list[str]:
+        """Returns the paragraphs of the latest summary of a character, including summaries that are created but not yet saved.
+        Does not wait for summaries that are still being created
+
+        Args:
+            character (Character): the character to get the summary paragraphs for
+            world_id (str): the world the summaries belong to
+
+        Returns:
+            list[str]: the paragraphs, oldest first
+        """
+        digest, paragraphs = self.__get_digest_and_paragraphs(character, world_id)
+        return digest + paragraphs
+
+    @utils.time_it
+    def __get_digest_and_paragraphs(self, character: Character, world_id: str) -> tuple[list[str], list[str]]:
+        """Returns the lines of the digest of a compacted summary and the newer paragraphs of a character, including summaries that are not yet saved
+        """
+        # the pending jobs are checked before the summary file, so a summary that is saved in between is found twice rather than not at all
+        unsaved_summaries = self.__get_unsaved_summaries(character, world_id)
+        digest, saved_paragraphs = self.__get_summary_paragraphs(character.name, character.ref_id, world_id)
+        paragraphs: dict[str, None] = dict.fromkeys(saved_paragraphs)
+        for summary in unsaved_summaries:
+            paragraphs.update(dict.fromkeys(line.strip() for line in summary.splitlines() if line.strip()))
+        return list(digest), [paragraph for paragraph in paragraphs if paragraph not in digest]
+
     @utils.time_it
     def save_conversation_state(self, messages: message_thread, npcs_in_conversation: Characters, world_id: str, is_reload=False):
-        summary = ''
-        for npc in npcs_in_conversation.get_all_characters():
-            if not npc.is_player_character:
-                if len(summary) < 1: # if a summary has not already been generated, make one
-                    summary = self.__create_new_conversation_summary(messages, npc.name)
-                if len(summary) > 0 or is_reload: # if a summary has been generated, give the same summary to all NPCs
-                    self.__append_new_conversation_summary(summary, npc, world_id)
+        npcs = [npc for npc in npcs_in_conversation.get_all_characters() if not npc.is_player_character]
+        if len(npcs) == 0:
+            return
+        if len(messages) >= 5:
+            text_to_summarize = messages.transform_to_dict_representation(messages.get_talk_only())
+        else:
+            logging.info(f"Conversation summary not saved. Not enough dialogue spoken.")
+            if not is_reload:
+                return
+            text_to_summarize = ''
+
+        job = SummaryJob(str(uuid.uuid4()), world_id, [{"name": npc.name, "ref_id": npc.ref_id} for npc in npcs], text_to_summarize, npcs[0].name, is_reload)
+        with summaries.__pending_jobs_lock:
+            summaries.__pending_jobs.setdefault(self.__pending_jobs_file, {})[job.id] = job
+            self.__save_pending_jobs()
+        self.__job_queue.put(job)
+        logging.info(f"Conversation summary will be created in the background")
+
+    @utils.time_it
+    def shutdown(self):
+        """Stops the summary worker once it has finished the jobs that are already queued. Does not wait for it
+        """
+        self.__job_queue.put(None)
+
+    @utils.time_it
+    def __process_summary_jobs(self):
+        """Runs on the summary worker. Processes one job after the other, so the summaries of an NPC are always added in order
+        """
+        while True:
+            job = self.__job_queue.get()
+            if job is None:
+                return
+            # a failed job is retried before the next one is started, so later summaries of the same NPC can not overtake it
+            while True:
+                try:
+                    self.__process_summary_job(job)
+                    break
+                except Exception as e:
+                    job.attempts += 1
+                    if job.attempts >= self.MAX_SUMMARY_ATTEMPTS:
+                        logging.error(f'Failed to summarize conversation after {job.attempts} attempts. The conversation will not be remembered. Error: {e}')
+                        break
+                    delay = self.SUMMARY_RETRY_DELAY * 2 ** (job.attempts - 1)
+                    logging.error(f'Failed to summarize conversation. Retrying in {delay} seconds... Error: {e}')
+                    with summaries.__pending_jobs_lock:
+                        self.__save_pending_jobs()
+                    time.sleep(delay)
+            self.__finish_job(job)
+
+    @utils.time_it
+    def __process_summary_job(self, job: SummaryJob):
+        """Summarizes the conversation of a job and adds the summary for all of its NPCs.
+        Every finished step is saved, so a retry or a restart continues where the job stopped
+        """
+        if job.summary is None:
+            summary = self.__create_new_conversation_summary(job.text_to_summarize, job.npc_name)
+            if len(summary) < 1 and len(job.text_to_summarize) > 0:
+                raise RuntimeError("The LLM did not return a summary")
+            job.summary = summary
+            with summaries.__pending_jobs_lock:
+                self.__save_pending_jobs()
+
+        if len(job.summary) < 1 and not job.is_reload:
+            return
+
+        for npc in job.npcs:
+            if npc["ref_id"] not in job.appended_npcs:
+                self.__append_new_conversation_summary(job.summary, npc["name"], npc["ref_id"], job.world_id)
+                job.appended_npcs.append(npc["ref_id"])
+                with summaries.__pending_jobs_lock:
+                    self.__save_pending_jobs()
+        for npc in job.npcs:
+            self.__resummarize_if_too_long(npc["name"], npc["ref_id"], job.world_id)
+
+    @utils.time_it
+    def __finish_job(self, job: SummaryJob):
+        with summaries.__pending_jobs_lock:
+            summaries.__pending_jobs.get(self.__pending_jobs_file, {}).pop(job.id, None)
+            self.__save_pending_jobs()
+
+    @utils.time_it
+    def __get_unsaved_summaries(self, character: Character, world_id: str) -> list[str]:
+        """Returns the summaries of the character that are created but not yet saved to the summary file of the character.
+        Conversations that are still being summarized are left out instead of waiting for them, so starting a conversation is never held up by the LLM
+
+        Returns:
+            list[str]: the unsaved summaries, oldest first
+        """
+        name = utils.remove_trailing_number(character.name)
+        unsaved_summaries: list[str] = []
+        with summaries.__pending_jobs_lock:
+            for job in summaries.__pending_jobs.get(self.__pending_jobs_file, {}).values():
+                if job.world_id != world_id:
+                    continue
+                npc = next((npc for npc in job.npcs if utils.remove_trailing_number(npc["name"]) == name), None)
+                if not npc or npc["ref_id"] in job.appended_npcs:
+                    continue
+                if job.summary:
+                    unsaved_summaries.append(job.summary)
+                elif job.summary is None:
+                    logging.info(f"The last conversation with {character.name} is still being summarized. It will not be remembered in this conversation.")
+        return unsaved_summaries
+
+    @utils.time_it
+    def __load_pending_jobs(self):
+        """Queues the jobs that were not finished before Mantella was closed
+        """
+        with summaries.__pending_jobs_lock:
+            if self.__pending_jobs_file in summaries.__pending_jobs: # already loaded by an earlier instance
+                return
+            jobs: dict[str, SummaryJob] = {}
+            if os.path.exists(self.__pending_jobs_file):
+                try:
+                    with open(self.__pending_jobs_file, 'r', encoding='utf-8') as f:
+                        for job_dict in json.load(f):
+                            job = SummaryJob(**job_dict)
+                            jobs[job.id] = job
+                except Exception as e:
+                    logging.error(f"Could not load pending summaries from {self.__pending_jobs_file}: {e}")
+            summaries.__pending_jobs[self.__pending_jobs_file] = jobs
+        if len(jobs) > 0:
+            logging.info(f"Creating {len(jobs)} conversation summaries that were not finished before Mantella was closed")
+        for job in jobs.values():
+            self.__job_queue.put(job)
 
     @utils.time_it
-    def __get_latest_conversation_summary_file_path(self, character: Character, world_id: str) -> str:
+    def __save_pending_jobs(self):
+        """Saves the pending jobs to disk. Call only while holding __pending_jobs_lock
+        """
+        try:
+            os.makedirs(os.path.dirname(self.__pending_jobs_file), exist_ok=True)
+            jobs = summaries.__pending_jobs.get(self.__pending_jobs_file, {})
+            temp_file = self.__pending_jobs_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump([job.__dict__ for job in jobs.values()], f, indent=4)
+            os.replace(temp_file, self.__pending_jobs_file)
+        except Exception as e:
+            logging.error(f"Could not save pending summaries to {self.__pending_jobs_file}: {e}")
+
+    @utils.time_it
+    def __get_summary_paragraphs(self, character_name: str, ref_id: str, world_id: str) -> tuple[list[str], list[str]]:
+        """Returns the digest and the newer paragraphs of the latest summary file of a character. The file is only read the first time, afterwards the cached paragraphs are used.
+        Compacted summary files (every file after the first) start with the digest of the older summaries, the first file has no digest
+        """
+        key = (utils.remove_trailing_number(character_name), ref_id)
+        with self.__summary_cache_lock:
+            world_cache = self.__summary_cache.setdefault(world_id, {})
+            cached = world_cache.get(key)
+            if cached is None:
+                digest: list[str] = []
+                paragraphs: list[str] = []
+                conversation_summary_file = self.__get_latest_conversation_summary_file_path(character_name, ref_id, world_id)
+                if os.path.exists(conversation_summary_file):
+                    with open(conversation_summary_file, 'r', encoding='utf-8') as f:
+                        chunks = self.__split_summary_chunks(f.read())
+                    if len(chunks) > 0 and self.__is_compacted_summary_file(conversation_summary_file):
+                        digest = [line.strip() for line in chunks[0].splitlines() if line.strip()]
+                        chunks = chunks[1:]
+                    paragraphs = [line.strip() for chunk in chunks for line in chunk.splitlines() if line.strip()]
+                cached = (digest, paragraphs)
+                world_cache[key] = cached
+            return cached
+
+    @staticmethod
+    def __is_compacted_summary_file(conversation_summary_file: str) -> bool:
+        """Whether the summary file has been created by compacting an earlier one, ie whether its first summary is a digest
+        """
+        file_number = os.path.splitext(os.path.basename(conversation_summary_file))[0].rsplit('_', 1)[-1]
+        return file_number.isdigit() and int(file_number) > 1
+
+    @utils.time_it
+    def __invalidate_summary_cache(self, character_name: str, world_id: str):
+        """Removes the cached summary of a character. NPCs with the same name can share a summary file, so all of them are removed
+        """
+        name = utils.remove_trailing_number(character_name)
+        with self.__summary_cache_lock:
+            world_cache = self.__summary_cache.get(world_id, {})
+            for key in [key for key in world_cache if key[0] == name]:
+                del world_cache[key]
+
+    @utils.time_it
+    def __get_latest_conversation_summary_file_path(self, character_name: str, ref_id: str, world_id: str) -> str:
         """Get latest conversation summary by file name suffix"""
 
         # if multiple NPCs in a conversation have the same name (eg Whiterun Guard) their names are appended with number IDs
         # these IDs need to be removed when saving the conversation
-        name: str = utils.remove_trailing_number(character.name)
-        
+        name: str = utils.remove_trailing_number(character_name)
+
         name_conversation_folder_path = os.path.join(self.__game.conversation_folder_path, world_id, name)
         if os.path.exists(name_conversation_folder_path): # if a conversation folder already exists for this NPC, use it
             character_conversation_folder_path = name_conversation_folder_path
         else: # else include the NPC's reference ID in the folder name to differentiate generic NPCs
-            name_ref: str = f'{name} - {character.ref_id}'
+            name_ref: str = f'{name} - {ref_id}'
             character_conversation_folder_path = os.path.join(self.__game.conversation_folder_path, world_id, name_ref)
-        
+
         if os.path.exists(character_conversation_folder_path):
             # get all files from the directory
             files = os.listdir(character_conversation_folder_path)
@@ -87,82 +329,111 @@ class summaries(remembering):
         else:
             logging.info(f"{character_conversation_folder_path} does not exist. A new summary file will be created.")
             latest_file_number = 1
-        
+
         conversation_summary_file = f"{character_conversation_folder_path}/{name}_summary_{latest_file_number}.txt"
         return conversation_summary_file
 
     @utils.time_it
-    def __create_new_conversation_summary(self, messages: message_thread, npc_name: str) -> str:
+    def __create_new_conversation_summary(self, text_to_summarize: str, npc_name: str) -> str:
+        if len(text_to_summarize) < 1:
+            return ""
         prompt = self.__memory_prompt.format(
                     name=npc_name,
                     language=self.__language_name,
                     game=self.__game
                 )
-        while True:
-            try:
-                if len(messages) >= 5:
-                    return self.summarize_conversation(messages.transform_to_dict_representation(messages.get_talk_only()), prompt, npc_name)
-                else:
-                    logging.info(f"Conversation summary not saved. Not enough dialogue spoken.")
-                break
-            except:
-                logging.error('Failed to summarize conversation. Retrying...')
-                time.sleep(5)
-                continue
-        return ""
-
-    @utils.time_it
-    def __append_new_conversation_summary(self, new_summary: str, npc: Character, world_id: str):
-        # if this is not the first conversation
-        conversation_summary_file = self.__get_latest_conversation_summary_file_path(npc, world_id)
-        if os.path.exists(conversation_summary_file):
-            with open(conversation_summary_file, 'r', encoding='utf-8') as f:
-                previous_conversation_summaries = f.read()
+        return self.summarize_conversation(text_to_summarize, prompt, npc_name)
+
+    @utils.time_it
+    def __append_new_conversation_summary(self, new_summary: str, npc_name: str, ref_id: str, world_id: str):
+        conversation_summary_file = self.__get_latest_conversation_summary_file_path(npc_name, ref_id, world_id)
         # if this is the first conversation
-        else:
+        if not os.path.exists(conversation_summary_file):
             directory = os.path.dirname(conversation_summary_file)
             os.makedirs(directory, exist_ok=True)
-            previous_conversation_summaries = ''
-       
+
         if len(new_summary) > 0:
-            conversation_summaries = previous_conversation_summaries + new_summary
-            with open(conversation_summary_file, 'w', encoding='utf-8') as f:
-                f.write(conversation_summaries)
-        else:
-            conversation_summaries = previous_conversation_summaries
-            
+            count_tokens_summaries = self.__get_summary_token_count(conversation_summary_file)
+            with open(conversation_summary_file, 'a', encoding='utf-8') as f:
+                f.write(new_summary)
+            # only the new summary needs to be counted, the rest of the file has been counted before
+            count_tokens_summaries += sum(self.__client.calculate_tokens_from_text(chunk) for chunk in self.__split_summary_chunks(new_summary))
+            self.__summary_token_counts[conversation_summary_file] = (os.path.getsize(conversation_summary_file), count_tokens_summaries)
+            self.__invalidate_summary_cache(npc_name, world_id)
+
+    @utils.time_it
+    def __resummarize_if_too_long(self, npc_name: str, ref_id: str, world_id: str):
+        """Compacts the summaries of an NPC into a new summary file once they are longer than the summary limit.
+        Only the oldest summaries are summarized into a digest at the start of the file, the newer ones are kept as they are.
+        Every call to the LLM gets at most COMPACTION_INPUT_PCT of the summary limit, so the requests do not grow with the history
+        """
+        conversation_summary_file = self.__get_latest_conversation_summary_file_path(npc_name, ref_id, world_id)
+        if not os.path.exists(conversation_summary_file):
+            return
 
         summary_limit = round(self.__client.token_limit*self.__summary_limit_pct,0)
+        count_tokens_summaries = self.__get_summary_token_count(conversation_summary_file)
+        if count_tokens_summaries <= summary_limit:
+            return
 
-        count_tokens_summaries = self.__client.calculate_tokens_from_text(conversation_summaries)
-        # if summaries token limit is reached, summarize the summaries
-        if count_tokens_summaries > summary_limit:
-            logging.info(f'Token limit of conversation summaries reached ({count_tokens_summaries} / {summary_limit} tokens). Creating new summary file...')
-            while True:
-                try:
-                    prompt = self.__resummarize_prompt.format(
-                        name=npc.name,
-                        language=self.__language_name,
-                        game=self.__game
-                    )
-                    long_conversation_summary = self.summarize_conversation(conversation_summaries, prompt, npc.name)
-                    break
-                except:
-                    logging.error('Failed to summarize conversation. Retrying...')
-                    time.sleep(5)
-                    continue
+        logging.info(f'Token limit of conversation summaries reached ({count_tokens_summaries} / {summary_limit} tokens). Compacting the oldest summaries...')
+        with open(conversation_summary_file, 'r', encoding='utf-8') as f:
+            chunks = self.__split_summary_chunks(f.read())
+        chunk_token_counts = [self.__client.calculate_tokens_from_text(chunk) for chunk in chunks]
+        compaction_input_limit = summary_limit * self.COMPACTION_INPUT_PCT
+        prompt = self.__resummarize_prompt.format(
+            name=npc_name,
+            language=self.__language_name,
+            game=self.__game
+        )
+        while count_tokens_summaries > summary_limit and len(chunks) > 1:
+            # the oldest chunk is the digest of earlier compactions. Always take at least two chunks, so every round makes the summaries shorter
+            chunk_count = 2
+            input_tokens = chunk_token_counts[0] + chunk_token_counts[1]
+            while chunk_count < len(chunks) and input_tokens + chunk_token_counts[chunk_count] <= compaction_input_limit:
+                input_tokens += chunk_token_counts[chunk_count]
+                chunk_count += 1
+            digest = self.summarize_conversation("\n\n".join(chunks[:chunk_count]), prompt, npc_name).strip()
+            if not digest:
+                raise RuntimeError(f"Compacting the conversation summaries of {npc_name} failed")
+            chunks = [digest] + chunks[chunk_count:]
+            chunk_token_counts = [self.__client.calculate_tokens_from_text(digest)] + chunk_token_counts[chunk_count:]
+            count_tokens_summaries = sum(chunk_token_counts)
+            logging.info(f'Compacted {chunk_count} summaries of {npc_name} into a digest ({count_tokens_summaries} / {summary_limit} tokens)')
+
+        # Split the file path and increment the number by 1
+        base_directory, filename = os.path.split(conversation_summary_file)
+        file_prefix, old_number = filename.rsplit('_', 1)
+        old_number = os.path.splitext(old_number)[0]
+        new_number = int(old_number) + 1
+        new_conversation_summary_file = os.path.join(base_directory, f"{file_prefix}_{new_number}.txt")
 
-            # Split the file path and increment the number by 1
-            base_directory, filename = os.path.split(conversation_summary_file)
-            file_prefix, old_number = filename.rsplit('_', 1)
-            old_number = os.path.splitext(old_number)[0]
-            new_number = int(old_number) + 1
-            new_conversation_summary_file = os.path.join(base_directory, f"{file_prefix}_{new_number}.txt")
+        with open(new_conversation_summary_file, 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(chunks) + "\n\n")
+        self.__summary_token_counts[new_conversation_summary_file] = (os.path.getsize(new_conversation_summary_file), count_tokens_summaries)
 
-            with open(new_conversation_summary_file, 'w', encoding='utf-8') as f:
-                f.write(long_conversation_summary)
-            
-            # npc.conversation_summary_file = self.__get_latest_conversation_summary_file_path(npc)
+        self.__invalidate_summary_cache(npc_name, world_id)
+
+    @utils.time_it
+    def __get_summary_token_count(self, conversation_summary_file: str) -> int:
+        """Returns the token count of a summary file. The file is only counted again if it has been changed outside of Mantella
+        """
+        if not os.path.exists(conversation_summary_file):
+            return 0
+        file_size = os.path.getsize(conversation_summary_file)
+        cached = self.__summary_token_counts.get(conversation_summary_file)
+        if cached and cached[0] == file_size:
+            return cached[1]
+        with open(conversation_summary_file, 'r', encoding='utf-8') as f:
+            count_tokens_summaries = sum(self.__client.calculate_tokens_from_text(chunk) for chunk in self.__split_summary_chunks(f.read()))
+        self.__summary_token_counts[conversation_summary_file] = (file_size, count_tokens_summaries)
+        return count_tokens_summaries
+
+    @staticmethod
+    def __split_summary_chunks(text: str) -> list[str]:
+        """Splits the text of a summary file into its summaries, oldest first. Summaries are separated by an empty line
+        """
+        return [chunk.strip() for chunk in text.split("\n\n") if chunk.strip()]
 
     @utils.time_it
     def summarize_conversation(self, text_to_summarize: str, prompt: str, npc_name: str) -> str:
@@ -188,4 +459,4 @@ class summaries(remembering):
         else:
             logging.info(f"Conversation summary not saved. Not enough dialogue spoken.")
 
-        return summary
\ No newline at end of file
+        return summary
@@ -4,6 +4,7 @@ import speech_recognition as sr
 import logging
 from src.config.config_loader import ConfigLoader
 import src.utils as utils
+from src.metrics import metrics
 import requests
 import json
 import io
@@ -43,6 +44,11 @@ class TranscriptionQueue:
             return None
 
 class Transcriber:
+    # Shared by all Transcribers of this process, so every conversation after the first one starts without loading a model or calibrating the mic
+    __whisper_models: dict[tuple[str, str], WhisperModel] = {}
+    __ambient_noise_thresholds: dict[tuple[str, str], float] = {}
+    __shared_state_lock = threading.Lock()
+
     def __init__(self, config: ConfigLoader, stt_secret_key_file: str, secret_key_file: str):
         self.loglevel = 27
         # self.mic_enabled = config.mic_enabled
@@ -80,10 +86,7 @@ class Transcriber:
         self.microphone = sr.Microphone()
 
         if self.audio_threshold == 'auto':
-            logging.log(self.loglevel, f"Audio threshold set to 'auto'. Adjusting microphone for ambient noise...")
-            logging.log(self.loglevel, "If the mic is not picking up your voice, try setting this `Speech-to-Text`->`Audio Threshold` value manually in the Mantella UI\n")
-            with self.microphone as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=5)
+            self.__adjust_for_ambient_noise()
         else:
             self.recognizer.dynamic_energy_threshold = False
             self.recognizer.energy_threshold = int(self.audio_threshold)
@@ -92,10 +95,7 @@ class Transcriber:
         self.transcribe_model: WhisperModel | None = None
         # if using faster_whisper, load model selected by player, otherwise skip this step
         if not self.external_whisper_service:
-            if self.process_device == 'cuda':
-                self.transcribe_model = WhisperModel(self.model, device=self.process_device)
-            else:
-                self.transcribe_model = WhisperModel(self.model, device=self.process_device, compute_type="float32")
+            self.transcribe_model = Transcriber.get_whisper_model(self.model, self.process_device)
 
         # Thread management
         self.__listen_thread: Optional[threading.Thread] = None
@@ -111,6 +111,77 @@ class Transcriber:
     def stopped_listening(self):
         return self.__stop_listening
 
+    @staticmethod
+    @utils.time_it
+    def get_whisper_model(model: str, process_device: str) -> WhisperModel:
+        """Returns the local Whisper model. The model is only loaded the first time it is requested and then kept for the lifetime of the process
+
+        Args:
+            model (str): the name of the Whisper model
+            process_device (str): the device to run the model on, eg 'cpu' or 'cuda'
+
+        Returns:
+            WhisperModel: the loaded model
+        """
+        with Transcriber.__shared_state_lock:
+            key = (model, process_device)
+            if key not in Transcriber.__whisper_models:
+                if process_device == 'cuda':
+                    Transcriber.__whisper_models[key] = WhisperModel(model, device=process_device)
+                else:
+                    Transcriber.__whisper_models[key] = WhisperModel(model, device=process_device, compute_type="float32")
+            return Transcriber.__whisper_models[key]
+
+    @utils.time_it
+    def __adjust_for_ambient_noise(self):
+        """Calibrates the energy threshold of the mic for the ambient noise. 
+        The calibration is only done once per audio device and then reused until the device or the audio threshold setting changes
+        """
+        key = (self.__get_microphone_name(), str(self.audio_threshold))
+        with Transcriber.__shared_state_lock:
+            energy_threshold = Transcriber.__ambient_noise_thresholds.get(key)
+        if energy_threshold is not None:
+            self.recognizer.energy_threshold = energy_threshold
+            logging.debug(f"Reusing ambient noise calibration of microphone '{key[0]}'")
+            return
+
+        logging.log(self.loglevel, f"Audio threshold set to 'auto'. Adjusting microphone for ambient noise...")
+        logging.log(self.loglevel, "If the mic is not picking up your voice, try setting this `Speech-to-Text`->`Audio Threshold` value manually in the Mantella UI\n")
+        with self.microphone as source:
+            self.recognizer.adjust_for_ambient_noise(source, duration=5)
+        with Transcriber.__shared_state_lock:
+            Transcriber.__ambient_noise_thresholds[key] = self.recognizer.energy_threshold
+
+    @utils.time_it
+    def __get_microphone_name(self) -> str:
+        """Returns the name of the audio device used as the mic, so a calibration is not reused for a different device
+        """
+        try:
+            audio = self.microphone.pyaudio_module.PyAudio()
+            try:
+                if self.microphone.device_index is None:
+                    device_info = audio.get_default_input_device_info()
+                else:
+                    device_info = audio.get_device_info_by_index(self.microphone.device_index)
+                return str(device_info.get('name', ''))
+            finally:
+                audio.terminate()
+        except Exception as e:
+            logging.debug(f"Could not get name of microphone: {e}")
+            return ''
+
+    @utils.time_it
+    def reset_listening_state(self):
+        """Resets everything that belongs to a single conversation. The Whisper model and the mic calibration are kept
+        """
+        self.stop_listening()
+        with self.__latest_capture_lock:
+            self.__latest_capture = None
+        self.__transcription_queue = TranscriptionQueue()
+        self._speech_started.clear()
+        self.show_mic_warning = True
+        self.call_count = 0
+
     @utils.time_it
     def __generate_sync_client(self):
         if self.__initial_client:
@@ -243,7 +314,8 @@ If you would prefer to run speech-to-text locally, please ensure the `Speech-to-
                 #transcript = base64.b64encode(audio_data).decode('utf-8')
                 audio_file = io.BytesIO(audio_data)
                 audio_file.name = 'out.wav'
-                transcript = self.whisper_transcribe(audio_file, capture.prompt)
+                with metrics.measure(metrics.STT_TRANSCRIPTION):
+                    transcript = self.whisper_transcribe(audio_file, capture.prompt)
 
                 transcript_cleaned = utils.clean_text(transcript)
 
@@ -10,6 +10,8 @@ from subprocess import STARTUPINFO, STARTF_USESHOWWINDOW
 import subprocess
 import time
 from src.tts.synthesization_options import SynthesizationOptions
+from src.http.session_recorder import session_recorder
+from src.metrics import metrics
 import requests
 
 class ttsable(ABC):
@@ -59,13 +61,16 @@ class ttsable(ABC):
         except:
             logging.warning("Failed to remove spoken voicelines")
 
-        self.tts_synthesize(voiceline, final_voiceline_file, synth_options)
+        with metrics.measure(metrics.TTS_SYNTHESIS, backend=type(self).__name__):
+            self.tts_synthesize(voiceline, final_voiceline_file, synth_options)
+        session_recorder.record_interaction("tts", [voice, voiceline])
         if not os.path.exists(final_voiceline_file):
             logging.error(f'TTS failed to generate voiceline at: {Path(final_voiceline_file)}')
             raise FileNotFoundError()
         
         if (self._lip_generation_enabled == 'enabled') or (self._lip_generation_enabled == 'lazy' and not synth_options.is_first_line_of_response):
-            self._generate_lip_file(final_voiceline_file, voiceline)
+            with metrics.measure(metrics.LIP_GENERATION, backend=type(self).__name__):
+                self._generate_lip_file(final_voiceline_file, voiceline)
 
         #rename to unique name        
         if (os.path.exists(final_voiceline_file)):
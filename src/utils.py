@@ -1,3 +1,5 @@
+import functools
+import inspect
 import time
 import logging
 import re
@@ -6,15 +8,37 @@ import sys
 import os
 from shutil import rmtree
 from charset_normalizer import detect
+from src.profiler import profiler
 
 
 def time_it(func):
+    """Records the duration of every call of the function with the profiler, if the profiler is enabled
+    """
+    if inspect.isasyncgenfunction(func):
+        return func # the time until an async generator is created says nothing about the time it takes to iterate over it
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return await func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profiler.record(name, start, time.perf_counter_ns())
+        return async_wrapper
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.time()
-        result = func(*args, **kwargs)
-        end = time.time()
-        logging.debug(f"Function {func.__module__}.{func.__name__} took {round(end - start, 5)} seconds to execute")
-        return result
+        if not profiler.enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.record(name, start, time.perf_counter_ns())
     return wrapper
 
 
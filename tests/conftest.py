@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tests import the modules of Mantella the same way main.py does, relative to the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
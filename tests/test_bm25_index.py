@@ -0,0 +1,63 @@
+import os
+from src.remember.bm25_index import bm25_index
+
+def test_search_ranks_matching_passages_first():
+    index = bm25_index()
+    index.set_source("Lydia - 1/summary", "a", ["Lydia fought a dragon near Whiterun.", "Lydia bought bread."])
+    index.add_passages("Lydia - 1/log", "1", ["The dragon burned the watchtower."])
+    results = index.search("dragon watchtower", ["Lydia - 1/summary", "Lydia - 1/log"], 2)
+    assert [text for _, _, text in results] == ["The dragon burned the watchtower.", "Lydia fought a dragon near Whiterun."]
+
+def test_save_only_writes_changed_sources(tmp_path):
+    index_folder = str(tmp_path / "memory_index")
+    index = bm25_index()
+    index.set_source("Lydia - 1/summary", "a", ["Lydia fought a dragon."])
+    index.set_source("Faendal - 2/summary", "b", ["Faendal taught archery."])
+    index.save(index_folder)
+    faendal_file = bm25_index.get_source_file(index_folder, "Faendal - 2/summary")
+    os.utime(faendal_file, (0, 0))
+
+    index.add_passages("Lydia - 1/summary", "c", ["Lydia carried the burdens."])
+    index.save(index_folder)
+    assert os.path.getmtime(faendal_file) == 0
+
+    loaded = bm25_index.load(index_folder)
+    assert len(loaded) == 3
+    assert loaded.get_signature("Lydia - 1/summary") == "c"
+    assert loaded.get_passage_count("Lydia - 1/summary") == 2
+
+def test_removed_sources_are_deleted(tmp_path):
+    index_folder = str(tmp_path / "memory_index")
+    index = bm25_index()
+    index.set_source("Lydia - 1/summary", "a", ["Lydia fought a dragon."])
+    index.save(index_folder)
+    index.remove_source("Lydia - 1/summary")
+    index.save(index_folder)
+    assert len(bm25_index.load(index_folder)) == 0
+
+def test_unreadable_sources_are_left_out(tmp_path):
+    index_folder = str(tmp_path / "memory_index")
+    index = bm25_index()
+    index.set_source("Lydia - 1/summary", "a", ["Lydia fought a dragon."])
+    index.set_source("Faendal - 2/summary", "b", ["Faendal taught archery."])
+    index.save(index_folder)
+    with open(bm25_index.get_source_file(index_folder, "Faendal - 2/summary"), 'w', encoding='utf-8') as f:
+        f.write("{")
+
+    loaded = bm25_index.load(index_folder)
+    assert loaded.get_signature("Lydia - 1/summary") == "a"
+    assert loaded.get_signature("Faendal - 2/summary") is None
+    assert len(loaded) == 1
+
+def test_search_leaves_out_passages_without_query_terms():
+    index = bm25_index()
+    index.set_source("Lydia - 1/summary", "a", ["Lydia fought a dragon.", "Lydia bought bread."])
+    results = index.search("dragon", ["Lydia - 1/summary"], 5)
+    assert [text for _, _, text in results] == ["Lydia fought a dragon."]
+
+def test_search_orders_ties_by_source_and_newest_first():
+    index = bm25_index()
+    index.set_source("Lydia - 1/summary", "a", ["Dragon.", "Dragon!"])
+    index.add_passages("Lydia - 1/log", "2", ["Dragon?"] * 40)
+    results = index.search("dragon", ["Lydia - 1/summary", "Lydia - 1/log"], 3)
+    assert [(source, text) for _, source, text in results] == [("Lydia - 1/summary", "Dragon!"), ("Lydia - 1/summary", "Dragon."), ("Lydia - 1/log", "Dragon?")]
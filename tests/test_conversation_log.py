@@ -0,0 +1,71 @@
+import json
+import os
+import pytest
+from src.character_manager import Character
+from src.conversation.conversation_log import conversation_log
+from src.games.equipment import Equipment
+
+WORLD_ID = "world"
+
+def make_character(name: str) -> Character:
+    return Character("000001", "000002", name, 0, "Nord", False, "", False, False, 0, False, "", "", "", "", "", Equipment({}), {})
+
+@pytest.fixture
+def game_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_log, "game_path", str(tmp_path))
+    return tmp_path
+
+def write_legacy_file(game_path, name: str, text: str) -> str:
+    folder = game_path / WORLD_ID / name
+    folder.mkdir(parents=True)
+    legacy_file = folder / f"{name}.json"
+    legacy_file.write_text(text, encoding='utf-8')
+    return str(legacy_file)
+
+def test_saved_conversations_are_loaded_in_order(game_path):
+    character = make_character("Lydia")
+    conversation_log.save_conversation_log(character, [{"role": "user", "content": "Hello"}], WORLD_ID)
+    conversation_log.save_conversation_log(character, [{"role": "assistant", "content": "Greetings"}], WORLD_ID)
+    assert [m["content"] for m in conversation_log.load_conversation_log(character, WORLD_ID)] == ["Hello", "Greetings"]
+    assert conversation_log.get_conversation_log_length(character, WORLD_ID) == 2
+
+def test_legacy_file_is_converted(game_path):
+    character = make_character("Faendal")
+    legacy_file = write_legacy_file(game_path, "Faendal", json.dumps([[{"role": "user", "content": "Old"}]]))
+    assert [m["content"] for m in conversation_log.load_conversation_log(character, WORLD_ID)] == ["Old"]
+    assert not os.path.exists(legacy_file)
+    assert os.path.exists(legacy_file + '.bak')
+
+def test_malformed_legacy_file_is_converted_once_it_is_fixed(game_path):
+    character = make_character("Camilla")
+    legacy_file = write_legacy_file(game_path, "Camilla", '[[{"role": "user", "content": "Old"}]')
+    version = conversation_log.get_version()
+    conversation_log.save_conversation_log(character, [{"role": "user", "content": "New"}], WORLD_ID)
+    assert os.path.exists(legacy_file)
+    assert [m["content"] for m in conversation_log.load_conversation_log(character, WORLD_ID)] == ["New"]
+
+    with open(legacy_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps([[{"role": "user", "content": "Old"}]]))
+    assert [m["content"] for m in conversation_log.load_conversation_log(character, WORLD_ID)] == ["Old", "New"]
+    assert conversation_log.get_conversation_log_length(character, WORLD_ID) == 2
+    assert conversation_log.get_version() > version
+    assert not os.path.exists(legacy_file)
+
+def test_load_conversation_log_since_reads_only_new_conversations(game_path):
+    character = make_character("Hulda")
+    assert conversation_log.load_conversation_log_since(character, WORLD_ID, 0) == ([], 0)
+    conversation_log.save_conversation_log(character, [{"role": "user", "content": "First"}], WORLD_ID)
+    messages, size = conversation_log.load_conversation_log_since(character, WORLD_ID, 0)
+    assert [m["content"] for m in messages] == ["First"]
+
+    conversation_log.save_conversation_log(character, [{"role": "user", "content": "Second"}], WORLD_ID)
+    messages, new_size = conversation_log.load_conversation_log_since(character, WORLD_ID, size)
+    assert [m["content"] for m in messages] == ["Second"]
+    assert conversation_log.load_conversation_log_since(character, WORLD_ID, new_size) == ([], new_size)
+
+def test_load_conversation_log_since_rejects_positions_within_a_conversation(game_path):
+    character = make_character("Ysolda")
+    conversation_log.save_conversation_log(character, [{"role": "user", "content": "First"}], WORLD_ID)
+    _, size = conversation_log.load_conversation_log_since(character, WORLD_ID, 0)
+    assert conversation_log.load_conversation_log_since(character, WORLD_ID, size - 3) is None
+    assert conversation_log.load_conversation_log_since(character, WORLD_ID, size + 10) is None
@@ -0,0 +1,12 @@
+from src.llm.message_thread import message_thread
+from src.llm.messages import user_message
+
+def test_set_system_prompt_keeps_the_other_messages():
+    thread = message_thread("Old prompt")
+    thread.add_message(user_message("Hello", "Player"))
+    thread.count_tokens(lambda m: len(m.text))
+    thread.set_system_prompt("New prompt with memories")
+    assert thread.get_openai_messages()[0] == {"role": "system", "content": "New prompt with memories"}
+    assert len(thread) == 2
+    # the changed system_message is measured again
+    assert thread.count_tokens(lambda m: len(m.text)) == len("New prompt with memories") + len("Hello")
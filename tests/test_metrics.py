@@ -0,0 +1,20 @@
+from src.metrics import metrics
+
+def test_histogram_is_rendered_with_cumulative_buckets():
+    metrics.reset()
+    metrics.observe(metrics.INTERRUPTION, 0.02)
+    metrics.observe(metrics.INTERRUPTION, 3.0)
+    lines = metrics.render().splitlines()
+    assert "# TYPE mantella_interruption_seconds histogram" in lines
+    assert 'mantella_interruption_seconds_bucket{le="0.025"} 1' in lines
+    assert 'mantella_interruption_seconds_bucket{le="5"} 2' in lines
+    assert 'mantella_interruption_seconds_bucket{le="+Inf"} 2' in lines
+    assert "mantella_interruption_seconds_count 2" in lines
+    metrics.reset()
+
+def test_counter_is_rendered_with_labels():
+    metrics.reset()
+    metrics.increment(metrics.LLM_RESPONSES, backend="test")
+    metrics.increment(metrics.LLM_RESPONSES, backend="test")
+    assert 'mantella_llm_responses_total{backend="test"} 2' in metrics.render().splitlines()
+    metrics.reset()
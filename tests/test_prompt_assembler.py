@@ -0,0 +1,29 @@
+from src.conversation.prompt_assembler import prompt_assembler
+
+def count_words(text: str) -> int:
+    return len(text.split()) # every line of the tests costs its words plus one for the line break
+
+def assemble_summaries(text: str, token_budget: int) -> str:
+    assembler = prompt_assembler("{conversation_summaries}", count_words)
+    assembler.add_section(["conversation_summaries"], text, 1, split_paragraphs=True)
+    prompt, _ = assembler.assemble(token_budget)
+    return prompt
+
+def test_section_that_fits_is_kept_in_full():
+    text = "Summaries:\nfirst event\nsecond event"
+    assert assemble_summaries(text, 100) == text
+
+def test_truncation_drops_the_oldest_lines_first():
+    text = "Summaries:\nfirst event\nsecond event\nthird event\nfourth event"
+    assert assemble_summaries(text, 7) == "Summaries:\nthird event\nfourth event"
+
+def test_truncation_keeps_the_digest():
+    text = "Summaries:\nthe digest\n\nfirst event\nsecond event\nthird event"
+    assert assemble_summaries(text, 6) == "Summaries:\nthe digest\n\nthird event"
+
+def test_digest_that_does_not_fit_is_dropped_like_an_old_line():
+    text = "Summaries:\na very long digest of older events\n\nfirst event\nsecond event"
+    assert assemble_summaries(text, 7) == "Summaries:\nfirst event\nsecond event"
+
+def test_section_is_dropped_if_only_the_heading_fits():
+    assert assemble_summaries("Summaries:\nfirst event", 1) == ""
@@ -0,0 +1,98 @@
+import threading
+import time
+from src.llm.sentence import sentence
+from src.llm.sentence_queue import sentence_queue
+
+def make_sentence(text: str) -> sentence:
+    return sentence(None, text, "", 0) # type: ignore[arg-type]
+
+def start_get(queue: sentence_queue, results: list, timeout: float | None = None) -> threading.Thread:
+    thread = threading.Thread(target=lambda: results.append(queue.get_next_sentence(timeout)), daemon=True)
+    thread.start()
+    return thread
+
+def test_get_returns_none_if_nothing_is_to_come():
+    queue = sentence_queue()
+    assert queue.get_next_sentence() is None
+
+def test_put_at_front_is_returned_first():
+    queue = sentence_queue()
+    queue.put(make_sentence("second"))
+    queue.put(make_sentence("third"))
+    queue.put_at_front(make_sentence("first"))
+    assert len(queue) == 3
+    assert queue.peek().sentence == "first"
+    assert [queue.get_next_sentence().sentence for _ in range(3)] == ["first", "second", "third"]
+    assert len(queue) == 0
+    assert queue.peek() is None
+
+def test_get_times_out():
+    queue = sentence_queue()
+    queue.is_more_to_come = True
+    start = time.perf_counter()
+    assert queue.get_next_sentence(timeout=0.1) is None
+    assert time.perf_counter() - start >= 0.1
+
+def test_clear_wakes_waiting_gets():
+    queue = sentence_queue()
+    queue.is_more_to_come = True
+    results: list = []
+    threads = [start_get(queue, results) for _ in range(3)]
+    time.sleep(0.05)
+    queue.clear()
+    for thread in threads:
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+    assert results == [None, None, None]
+
+def test_waiting_get_receives_last_sentence():
+    # the end of the response must never be seen before the last sentence, otherwise the last sentence is left for the next get
+    for _ in range(300):
+        queue = sentence_queue()
+        queue.is_more_to_come = True
+        results: list = []
+        thread = start_get(queue, results, timeout=1)
+        queue.put_last(make_sentence(""))
+        thread.join(timeout=1)
+        assert len(results) == 1 and results[0] is not None and results[0].sentence == ""
+        assert len(queue) == 0
+        assert queue.get_next_sentence() is None
+
+def test_concurrent_producers_and_consumers():
+    producer_count = 4
+    consumer_count = 4
+    sentences_per_producer = 5000
+    queue = sentence_queue()
+    queue.is_more_to_come = True
+    received: list[list[str]] = [[] for _ in range(consumer_count)]
+
+    def produce(producer: int):
+        for i in range(sentences_per_producer):
+            if i % 100 == 0:
+                queue.put_at_front(make_sentence(f"{producer}-{i}"))
+            else:
+                queue.put(make_sentence(f"{producer}-{i}"))
+
+    def consume(consumer: int):
+        while True:
+            next_sentence = queue.get_next_sentence(timeout=5)
+            if next_sentence is None:
+                return
+            received[consumer].append(next_sentence.sentence)
+
+    producers = [threading.Thread(target=produce, args=(p,)) for p in range(producer_count)]
+    consumers = [threading.Thread(target=consume, args=(c,)) for c in range(consumer_count)]
+    for thread in producers + consumers:
+        thread.start()
+    for thread in producers:
+        thread.join()
+    queue.put_last(make_sentence("last"))
+    for thread in consumers:
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+
+    all_received = [text for texts in received for text in texts]
+    expected = {f"{p}-{i}" for p in range(producer_count) for i in range(sentences_per_producer)} | {"last"}
+    assert len(all_received) == len(expected)
+    assert set(all_received) == expected
+    assert len(queue) == 0
@@ -0,0 +1,100 @@
+import random
+import pytest
+from src.llm.sentence_segmenter import sentence_segmenter
+from benchmarks.segmenter_benchmark import rescan_segment
+
+def feed_all(segmenter: sentence_segmenter, tokens: list[str]) -> list[str]:
+    return [sentence for sentence in (segmenter.feed(token) for token in tokens) if sentence is not None]
+
+def test_feed_returns_nothing_until_a_sentence_ends():
+    segmenter = sentence_segmenter()
+    assert segmenter.feed("Hello") is None
+    assert segmenter.feed(" there") is None
+    assert segmenter.feed(". How") == "Hello there."
+    assert segmenter.buffer == " How"
+
+def test_feed_splits_at_the_last_sentence_end_of_a_token():
+    segmenter = sentence_segmenter()
+    assert segmenter.feed("Yes. No! Maybe") == "Yes. No!"
+    assert segmenter.buffer == " Maybe"
+
+def test_feed_waits_for_the_closing_asterisk():
+    segmenter = sentence_segmenter()
+    assert segmenter.feed("*Nods. Smiles") is None
+    assert segmenter.feed(".*") == "*Nods. Smiles.*"
+    assert segmenter.buffer == ""
+
+def test_feed_keeps_the_closing_bracket_with_the_sentence():
+    segmenter = sentence_segmenter()
+    assert segmenter.feed("(Whispers") is None
+    assert segmenter.feed(".)") == "(Whispers.)"
+
+def test_feed_splits_after_abbreviations():
+    # an abbreviation ends a sentence like any other period, the same as before sentence_segmenter
+    tokens = ["Ask", " Mr", ".", " Smith", " about", " it", "."]
+    assert feed_all(sentence_segmenter(), tokens) == ["Ask Mr.", " Smith about it."]
+    assert feed_all(sentence_segmenter(), tokens) == rescan_segment(tokens)
+
+def test_feed_splits_numbers_depending_on_the_tokens():
+    # a decimal point ends a sentence like any other period, whether the number is streamed in one token or in two
+    tokens = ["It", " costs", " 3", ".5", " septims", "."]
+    assert feed_all(sentence_segmenter(), tokens) == ["It costs 3.", "5 septims."]
+    tokens = ["It", " costs", " 3.5", " septims", "."]
+    assert feed_all(sentence_segmenter(), tokens) == ["It costs 3.", "5 septims."]
+    assert feed_all(sentence_segmenter(), tokens) == rescan_segment(tokens)
+
+def test_feed_ignores_sentence_ends_after_the_max_length():
+    segmenter = sentence_segmenter(max_sentence_length=10)
+    assert segmenter.feed("a" * 12 + ".") is None
+    assert segmenter.feed(" b.") is None
+
+def test_feed_matches_rescanning_the_buffer():
+    alphabet = 'abc de.f*g:h!?) ,。？'
+    rng = random.Random(1)
+    for _ in range(2000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 400)))
+        tokens: list[str] = []
+        i = 0
+        while i < len(text):
+            token_length = rng.randint(1, 6)
+            tokens.append(text[i:i + token_length])
+            i += token_length
+        assert feed_all(sentence_segmenter(), tokens) == rescan_segment(tokens), tokens
+
+def test_push_front_is_processed_with_the_next_token():
+    segmenter = sentence_segmenter()
+    segmenter.feed("Later")
+    segmenter.push_front("Lydia: Follow me.")
+    assert segmenter.buffer == "Lydia: Follow me.Later"
+    assert segmenter.feed(".") == "Lydia: Follow me.Later."
+
+def test_limit_length_keeps_short_sentences():
+    segmenter = sentence_segmenter()
+    assert segmenter.limit_length("Short sentence.") == "Short sentence."
+    assert segmenter.buffer == ""
+
+@pytest.mark.parametrize("sentence", [
+    "Hello, " * 40,
+    "word " * 60,
+    "a" * 300, # no comma or space to split at, used to loop forever
+    "a" * 147 + " b", # the only space is past the max length
+    "é" * 140 + " ", # two bytes per character
+    "漢" * 100, # three bytes per character and no space
+])
+def test_limit_length_splits_at_the_max_byte_length(sentence: str):
+    segmenter = sentence_segmenter()
+    segmenter.push_front(" rest")
+    shortened = segmenter.limit_length(sentence)
+    assert 0 < len(shortened.encode('utf-8')) <= sentence_segmenter.MAX_SENTENCE_LENGTH
+    # the cut-off text comes back in order, ahead of the text that has not been returned yet
+    assert shortened + segmenter.buffer == sentence + " rest"
+
+def test_limit_length_prefers_commas():
+    segmenter = sentence_segmenter(max_sentence_length=20)
+    assert segmenter.limit_length("One two, three four five six") == "One two,"
+    assert segmenter.buffer == " three four five six"
+
+def test_split_speaker_keyword():
+    assert sentence_segmenter.split_speaker_keyword("*Lydia: Follow me.") == ("Lydia", "Follow me.")
+    assert sentence_segmenter.split_speaker_keyword("Lydia： Follow me.") == ("Lydia", "Follow me.")
+    assert sentence_segmenter.split_speaker_keyword("Follow me.") is None
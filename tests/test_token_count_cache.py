@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+from src.llm.client_base import ClientBase
+from src.llm.token_count_cache import token_count_cache
+from src.metrics import metrics
+
+class counting_encoding:
+    """Stands in for a tiktoken.Encoding. Every word is a token, and every call to encode is counted
+    """
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.encode_calls = 0
+
+    def encode(self, text: str) -> list[str]:
+        self.encode_calls += 1
+        return text.split()
+
+def test_cached_counts_are_not_encoded_again():
+    cache = token_count_cache(10)
+    encoding = counting_encoding("cl100k_base")
+    assert cache.count_tokens(encoding, "one two three") == 3
+    assert cache.count_tokens(encoding, "one two three") == 3
+    assert encoding.encode_calls == 1
+    assert len(cache) == 1
+
+def test_entries_are_keyed_by_encoding_and_text():
+    cache = token_count_cache(10)
+    first_encoding = counting_encoding("cl100k_base")
+    second_encoding = counting_encoding("o200k_base")
+    cache.count_tokens(first_encoding, "one two")
+    cache.count_tokens(second_encoding, "one two")
+    cache.count_tokens(first_encoding, "one two three")
+    assert (first_encoding.encode_calls, second_encoding.encode_calls) == (2, 1)
+    assert len(cache) == 3
+
+def test_least_recently_used_entry_is_evicted():
+    cache = token_count_cache(2)
+    encoding = counting_encoding("cl100k_base")
+    cache.count_tokens(encoding, "first")
+    cache.count_tokens(encoding, "second")
+    cache.count_tokens(encoding, "first") # makes "second" the least recently used entry
+    cache.count_tokens(encoding, "third")
+    assert len(cache) == 2
+    assert encoding.encode_calls == 3
+
+    cache.count_tokens(encoding, "first")
+    assert encoding.encode_calls == 3
+    cache.count_tokens(encoding, "second")
+    assert encoding.encode_calls == 4
+
+def test_hits_and_misses_are_counted_in_the_metrics():
+    metrics.reset()
+    cache = token_count_cache(10)
+    encoding = counting_encoding("cl100k_base")
+    cache.count_tokens(encoding, "one")
+    cache.count_tokens(encoding, "one")
+    cache.count_tokens(encoding, "two")
+    lines = metrics.render().splitlines()
+    assert "mantella_token_count_cache_hits_total 1" in lines
+    assert "mantella_token_count_cache_misses_total 2" in lines
+    metrics.reset()
+
+def test_clients_share_the_token_count_cache():
+    ClientBase.token_counts.clear()
+    first_client = SimpleNamespace(_encoding=counting_encoding("cl100k_base"))
+    second_client = SimpleNamespace(_encoding=counting_encoding("cl100k_base"))
+    assert ClientBase.calculate_tokens_from_text(first_client, "a shared prompt") == 3
+    assert ClientBase.calculate_tokens_from_text(second_client, "a shared prompt") == 3
+    assert (first_client._encoding.encode_calls, second_client._encoding.encode_calls) == (1, 0)
+    ClientBase.token_counts.clear()